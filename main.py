@@ -1,16 +1,28 @@
+from typing import Any, Dict, List
+
 from fastapi import FastAPI
+from pydantic import BaseModel
 from uvicorn import run as app_run
 from fastapi.responses import Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.responses import RedirectResponse
 
-from sensor.pipeline.training_pipeline import TrainPipeline
+from sensor.pipeline.training_job import TrainingJobManager
 from sensor.pipeline.prediction_pipeline import PredictionPipeline
-from sensor.logger import logging
+from sensor.ml.model.model_cache import ModelCache
+from sensor.ml.model.micro_batcher import MicroBatcher
+from sensor.cloud_storage.upload_queue import upload_queue
+from sensor.logger import logging, request_id_var
 from sensor.constant.application import *
+from sensor.constant.env_variable import MICRO_BATCHING_ENV_KEY
+import argparse
+import os
+import uuid
 
 
 app = FastAPI()
+micro_batcher = MicroBatcher() if os.getenv(MICRO_BATCHING_ENV_KEY, "false").lower() == "true" else None
 origins = ["*"]
 
 app.add_middleware(
@@ -22,19 +34,68 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def set_request_id(request, call_next):
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    token = request_id_var.set(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        request_id_var.reset(token)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+@app.on_event("startup")
+def warm_model_cache():
+    try:
+        ModelCache.refresh()
+    except Exception as e:
+        logging.info("Model cache could not be warmed at startup: %s", e)
+    ModelCache.start_background_refresh()
+
+@app.on_event("startup")
+async def start_micro_batcher():
+    if micro_batcher is not None:
+        micro_batcher.start()
+
+@app.on_event("startup")
+def start_upload_queue():
+    upload_queue.start()
+
+@app.on_event("shutdown")
+def stop_upload_queue():
+    upload_queue.stop()
+
+@app.on_event("shutdown")
+def stop_model_cache():
+    ModelCache.stop_background_refresh()
+
+@app.on_event("shutdown")
+async def stop_micro_batcher():
+    if micro_batcher is not None:
+        await micro_batcher.stop()
+
 @app.get("/", tags=["authentication"])
 async def index():
     return RedirectResponse(url="/docs")
 
 @app.get("/train")
-async def train_route():
+async def train_route(full_refresh: bool = False):
     try:
+        job_id = TrainingJobManager().submit(full_refresh=full_refresh)
+        if job_id is None:
+            return Response("Training pipeline is already running.", status_code=409)
+        return {"job_id": job_id, "status_url": f"/train/{job_id}"}
+    except Exception as e:
+        return Response(f"Error Occurred! {e}")
 
-        train_pipeline = TrainPipeline()
-        if train_pipeline.is_pipeline_running:
-            return Response("Training pipeline is already running.")
-        train_pipeline.run_pipeline()
-        return Response("Training successful !!")
+@app.get("/train/{job_id}")
+async def train_status_route(job_id: str):
+    try:
+        job_status = TrainingJobManager().get_status(job_id)
+        if job_status is None:
+            return Response(f"Training job {job_id} not found", status_code=404)
+        return job_status
     except Exception as e:
         return Response(f"Error Occurred! {e}")
 
@@ -47,6 +108,42 @@ async def predict_route(path):
     except Exception as e:
         return Response(f"Error Occurred! {e}")
 
+class PredictionRequest(BaseModel):
+    records: List[Dict[str, Any]]
+
+@app.post("/predict")
+async def predict_records_route(request: PredictionRequest):
+    try:
+        prediction_pipeline = PredictionPipeline()
+        try:
+            input_df = await run_in_threadpool(prediction_pipeline.prepare_input_records, request.records)
+        except Exception as e:
+            # records which do not match the schema
+            return Response(f"Invalid input! {e}", status_code=400)
+        if micro_batcher is None:
+            y_pred = await run_in_threadpool(prediction_pipeline.predict_input_dataframe, input_df)
+        else:
+            y_pred = await micro_batcher.predict(input_df)
+        predictions = prediction_pipeline.get_predicted_labels(y_pred)
+        return {"predictions": predictions, "count": len(predictions)}
+    except Exception as e:
+        # no model could be loaded yet, or the model or the infrastructure failed
+        status_code = 503 if ModelCache.get_model_timestamp() is None else 500
+        return Response(f"Error Occurred! {e}", status_code=status_code)
+
+def train(full_refresh:bool=False):
+    try:
+        job_manager = TrainingJobManager()
+        job_id = job_manager.submit(full_refresh=full_refresh)
+        if job_id is None:
+            print("Training pipeline is already running.")
+            return
+        print(f"Training job {job_id} started")
+        job_status = job_manager.wait(job_id)
+        print(f"Training job {job_id} {job_status['status']}")
+    except Exception as e:
+        print(e)
+
 def main():
     try:
         path:str = r"https://raw.githubusercontent.com/LijiAlex/Datasets/main/sensor5898273.csv"
@@ -55,9 +152,22 @@ def main():
         print(msg)
     except Exception as e:
         print(e)
+    finally:
+        # without the API no worker runs, the queued uploads are finished before exiting
+        upload_queue.drain()
 
 
 if __name__=="__main__":
+    parser = argparse.ArgumentParser(description="Sensor fault detection")
+    parser.add_argument("--train", action="store_true", help="run the training pipeline instead of serving the API")
+    parser.add_argument("--full-refresh", action="store_true",
+                        help="with --train, export the whole collection instead of the documents added since the last run")
+    args = parser.parse_args()
+    if args.full_refresh and not args.train:
+        parser.error("--full-refresh requires --train")
     # main()
     # set_env_variable(env_file_path)
-    app_run(app, host=APP_HOST, port=APP_PORT)
+    if args.train:
+        train(full_refresh=args.full_refresh)
+    else:
+        app_run(app, host=APP_HOST, port=APP_PORT)
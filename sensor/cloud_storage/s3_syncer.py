@@ -1,20 +1,245 @@
+import hashlib
+import json
 import os, sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+
+from sensor.constant.s3_bucket import (S3_SYNC_MANIFEST_DIR, S3_SYNC_MAX_WORKERS, S3_MULTIPART_THRESHOLD,
+                                       S3_MULTIPART_CHUNKSIZE, S3_MULTIPART_MAX_CONCURRENCY)
 from sensor.exception import SensorException
+from sensor.logger import logging
+
+_client = None
+_client_lock = threading.Lock()
+# one lock per manifest file, uploads and downloads of a folder share its manifest
+_manifest_locks = {}
+_manifest_locks_lock = threading.Lock()
+
+
+def get_s3_client():
+    """
+    Process wide S3 client, its connection pool is sized for the file and multipart concurrency
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = boto3.client("s3", config=Config(
+                max_pool_connections=S3_SYNC_MAX_WORKERS * S3_MULTIPART_MAX_CONCURRENCY,
+                retries={"max_attempts": 5, "mode": "standard"}))
+        return _client
+
+
+def get_manifest_lock(manifest_file_path:str)->threading.Lock:
+    with _manifest_locks_lock:
+        return _manifest_locks.setdefault(os.path.abspath(manifest_file_path), threading.Lock())
+
+
+def parse_s3_url(aws_bucket_url:str):
+    """
+    return: bucket and key prefix of s3://bucket/prefix
+    """
+    if not aws_bucket_url.startswith("s3://"):
+        raise Exception(f"Invalid S3 url {aws_bucket_url}")
+    bucket, _, prefix = aws_bucket_url[len("s3://"):].partition("/")
+    return bucket, prefix.strip("/")
+
+
+class S3Sync:
+    """
+    Syncs a local folder with an S3 prefix in process, one file per worker thread and large files
+    in concurrent multipart parts. The size, modification time and ETag of every synced file are
+    kept in a local manifest:
+        s3_sync_manifest/<sha256 of folder and url>.json     {relative path: {size, mtime_ns, etag}}
+    so that uploads skip unchanged files without any S3 call and downloads skip objects whose
+    ETag did not change after a single listing.
+    Like `aws s3 sync`, nothing is deleted on either side.
+    """
+    def __init__(self, client=None, manifest_dir:str=S3_SYNC_MANIFEST_DIR, max_workers:int=S3_SYNC_MAX_WORKERS,
+                 transfer_config:TransferConfig=None):
+        """
+        client: boto3 S3 client, or any object with the same upload_file, download_file, head_object
+                and get_paginator methods; the shared client when None
+        """
+        self.client = client
+        self.manifest_dir = manifest_dir
+        self.max_workers = max_workers
+        self.transfer_config = transfer_config or TransferConfig(
+            multipart_threshold=S3_MULTIPART_THRESHOLD, multipart_chunksize=S3_MULTIPART_CHUNKSIZE,
+            max_concurrency=S3_MULTIPART_MAX_CONCURRENCY)
+
+    def get_client(self):
+        if self.client is None:
+            self.client = get_s3_client()
+        return self.client
+
+    def get_manifest_file_path(self, folder:str, aws_bucket_url:str)->str:
+        key = hashlib.sha256(f"{os.path.abspath(folder)}\n{aws_bucket_url}".encode()).hexdigest()
+        return os.path.join(self.manifest_dir, f"{key}.json")
+
+    def read_manifest(self, manifest_file_path:str)->dict:
+        """
+        return: the manifest, empty when missing or unreadable so that the next sync rebuilds it
+        """
+        if not os.path.exists(manifest_file_path):
+            return {}
+        try:
+            with open(manifest_file_path) as manifest_file:
+                manifest = json.load(manifest_file)
+            return manifest if isinstance(manifest, dict) else {}
+        except (OSError, ValueError) as e:
+            logging.info("Ignoring unreadable S3 sync manifest %s: %s", manifest_file_path, e)
+            return {}
+
+    def write_manifest(self, manifest_file_path:str, manifest:dict):
+        os.makedirs(os.path.dirname(manifest_file_path), exist_ok=True)
+        # a temporary file per writer, renamed over the manifest in one step
+        with tempfile.NamedTemporaryFile("w", dir=os.path.dirname(manifest_file_path), suffix=".tmp",
+                                         delete=False) as manifest_file:
+            json.dump(manifest, manifest_file, indent=1, sort_keys=True)
+        os.replace(manifest_file.name, manifest_file_path)
+
+    def update_manifest(self, manifest_file_path:str, entries:dict):
+        """
+        Merge the entries into the manifest as it is on disk, under the lock of the manifest, so
+        that concurrent syncs of the folder keep each other's entries
+        """
+        with get_manifest_lock(manifest_file_path):
+            manifest = self.read_manifest(manifest_file_path)
+            manifest.update(entries)
+            self.write_manifest(manifest_file_path, manifest)
+
+    @staticmethod
+    def get_file_state(file_path:str)->dict:
+        stat = os.stat(file_path)
+        return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    @staticmethod
+    def is_unchanged(entry:dict, file_path:str)->bool:
+        if entry is None or not os.path.exists(file_path):
+            return False
+        state = S3Sync.get_file_state(file_path)
+        return entry["size"] == state["size"] and entry["mtime_ns"] == state["mtime_ns"]
+
+    @staticmethod
+    def list_local_files(folder:str)->list:
+        relative_paths = []
+        for dir_path, _, file_names in os.walk(folder):
+            for file_name in file_names:
+                relative_paths.append(os.path.relpath(os.path.join(dir_path, file_name), folder).replace(os.sep, "/"))
+        return sorted(relative_paths)
+
+    def list_objects(self, bucket:str, prefix:str)->dict:
+        """
+        return: {key relative to the prefix: {size, etag}}
+        """
+        objects = {}
+        key_prefix = f"{prefix}/" if prefix else ""
+        for page in self.get_client().get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=key_prefix):
+            for item in page.get("Contents", []):
+                if item["Key"].endswith("/"):
+                    continue
+                objects[item["Key"][len(key_prefix):]] = {"size": item["Size"], "etag": item["ETag"]}
+        return objects
+
+    def run_transfers(self, transfer, relative_paths:list, manifest_file_path:str, action:str):
+        """
+        Run transfer(relative path) -> manifest entry on the worker threads. The manifest is
+        updated with every completed transfer before the failures, if any, are raised.
+        """
+        entries = {}
+        errors = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {relative_path: executor.submit(transfer, relative_path) for relative_path in relative_paths}
+            for relative_path, future in futures.items():
+                try:
+                    entries[relative_path] = future.result()
+                except Exception as e:
+                    errors[relative_path] = e
+        if len(entries) > 0:
+            self.update_manifest(manifest_file_path, entries)
+        if len(errors) > 0:
+            details = "; ".join(f"{relative_path}: {error}" for relative_path, error in sorted(errors.items()))
+            raise Exception(f"Failed to {action} {len(errors)} of {len(relative_paths)} files: {details}")
+
+    def sync_folder_to_s3(self, folder:str, aws_bucket_url:str)->int:
+        """
+        Upload the new and modified files of the folder
+        return: number of uploaded files
+        """
+        try:
+            bucket, prefix = parse_s3_url(aws_bucket_url)
+            manifest_file_path = self.get_manifest_file_path(folder, aws_bucket_url)
+            manifest = self.read_manifest(manifest_file_path)
+            to_upload = [relative_path for relative_path in self.list_local_files(folder)
+                         if not self.is_unchanged(manifest.get(relative_path), os.path.join(folder, relative_path))]
+            logging.info("Uploading %s files from [%s] to [%s]", len(to_upload), folder, aws_bucket_url)
+            client = self.get_client()
+
+            def upload(relative_path:str)->dict:
+                file_path = os.path.join(folder, relative_path)
+                key = f"{prefix}/{relative_path}" if prefix else relative_path
+                state = self.get_file_state(file_path)
+                client.upload_file(Filename=file_path, Bucket=bucket, Key=key, Config=self.transfer_config)
+                return dict(state, etag=client.head_object(Bucket=bucket, Key=key)["ETag"])
+
+            self.run_transfers(upload, to_upload, manifest_file_path, "upload")
+            return len(to_upload)
+        except Exception as e:
+            raise SensorException(e, sys)
+
+    def sync_folder_from_s3(self, folder:str, aws_bucket_url:str)->int:
+        """
+        Download the objects under the url which are missing or changed locally
+        return: number of downloaded files
+        """
+        try:
+            bucket, prefix = parse_s3_url(aws_bucket_url)
+            manifest_file_path = self.get_manifest_file_path(folder, aws_bucket_url)
+            manifest = self.read_manifest(manifest_file_path)
+            objects = self.list_objects(bucket, prefix)
+            to_download = [relative_path for relative_path, item in sorted(objects.items())
+                           if manifest.get(relative_path, {}).get("etag") != item["etag"]
+                           or not self.is_unchanged(manifest[relative_path], os.path.join(folder, relative_path))]
+            logging.info("Downloading %s of %s objects from [%s] to [%s]", len(to_download), len(objects), aws_bucket_url, folder)
+            client = self.get_client()
+
+            def download(relative_path:str)->dict:
+                file_path = os.path.join(folder, relative_path)
+                os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+                # downloaded next to the target and renamed, readers never see a partial file
+                tmp_file_path = f"{file_path}.s3tmp"
+                key = f"{prefix}/{relative_path}" if prefix else relative_path
+                try:
+                    client.download_file(Bucket=bucket, Key=key, Filename=tmp_file_path, Config=self.transfer_config)
+                    os.replace(tmp_file_path, file_path)
+                finally:
+                    if os.path.exists(tmp_file_path):
+                        os.remove(tmp_file_path)
+                return dict(self.get_file_state(file_path), etag=objects[relative_path]["etag"])
+
+            self.run_transfers(download, to_download, manifest_file_path, "download")
+            return len(to_download)
+        except Exception as e:
+            raise SensorException(e, sys)
+
+
+_default_syncer = S3Sync()
+
 
 # sync the contents of folder to s3
 def sync_folder_to_s3(folder,aws_bucket_url):
-    try:            
-        command = f"aws s3 sync {folder} {aws_bucket_url}"
-        os.system(command)
+    try:
+        return _default_syncer.sync_folder_to_s3(folder, aws_bucket_url)
     except Exception as e:
         raise SensorException(e,sys)
 
 def sync_folder_from_s3(folder,aws_bucket_url):
     try:
-        command = f"aws s3 sync {aws_bucket_url} {folder}"
-        os.system(command)
+        return _default_syncer.sync_folder_from_s3(folder, aws_bucket_url)
     except Exception as e:
         raise SensorException(e,sys)
-
-
-
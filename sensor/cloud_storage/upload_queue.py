@@ -0,0 +1,248 @@
+import hashlib
+import os, sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import yaml
+
+from sensor.cloud_storage.s3_syncer import sync_folder_to_s3
+from sensor.constant.s3_bucket import (S3_UPLOAD_QUEUE_DIR, S3_UPLOAD_QUEUE_MAX_CONCURRENCY, S3_UPLOAD_QUEUE_MAX_ATTEMPTS,
+                                       S3_UPLOAD_QUEUE_RETRY_BASE_SECONDS, S3_UPLOAD_QUEUE_SCAN_INTERVAL_SECONDS,
+                                       S3_UPLOAD_QUEUE_DRAIN_TIMEOUT_SECONDS)
+from sensor.exception import SensorException
+from sensor.logger import logging
+
+PENDING_DIR = "pending"
+RUNNING_DIR = "running"
+FAILED_DIR = "failed"
+
+
+def _is_process_alive(pid:int)->bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class S3UploadQueue:
+    """
+    Uploads of local folders to S3 run by a background worker. Every task is a file on disk so
+    that pending uploads survive restarts and can be queued by any process on the host:
+        s3_upload_queue/pending/<task key>.yaml          waiting, or waiting for a retry
+        s3_upload_queue/running/<task key>.<pid>.yaml    claimed by the worker of the process
+        s3_upload_queue/failed/<task key>.yaml           given up after max_attempts
+    The task key is derived from the folder and the url, so a folder queued again while it is
+    waiting is uploaded once, and never by two workers at the same time.
+    """
+    def __init__(self, queue_dir:str=S3_UPLOAD_QUEUE_DIR, upload=sync_folder_to_s3,
+                 max_concurrency:int=S3_UPLOAD_QUEUE_MAX_CONCURRENCY, max_attempts:int=S3_UPLOAD_QUEUE_MAX_ATTEMPTS,
+                 retry_base_seconds:float=S3_UPLOAD_QUEUE_RETRY_BASE_SECONDS,
+                 scan_interval_seconds:float=S3_UPLOAD_QUEUE_SCAN_INTERVAL_SECONDS):
+        """
+        upload: callable(folder, aws_bucket_url) raising on failure
+        """
+        self.queue_dir = queue_dir
+        self.upload = upload
+        self.max_concurrency = max_concurrency
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+        self.scan_interval_seconds = scan_interval_seconds
+        self._wake_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._slots = threading.Semaphore(max_concurrency)
+        self._worker_thread = None
+        self._executor = None
+
+    def get_task_dir(self, state:str)->str:
+        return os.path.join(self.queue_dir, state)
+
+    @staticmethod
+    def get_task_key(folder:str, aws_bucket_url:str)->str:
+        return hashlib.sha256(f"{os.path.abspath(folder)}\n{aws_bucket_url}".encode()).hexdigest()[:32]
+
+    @staticmethod
+    def write_task(file_path:str, task:dict):
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        # a temporary file per writer thread, renamed over the task in one step
+        tmp_file_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_file_path, "w") as task_file:
+            yaml.safe_dump(task, task_file)
+            task_file.flush()
+            os.fsync(task_file.fileno())
+        os.replace(tmp_file_path, file_path)
+
+    @staticmethod
+    def read_task(file_path:str)->dict:
+        with open(file_path) as task_file:
+            return yaml.safe_load(task_file)
+
+    def enqueue(self, folder:str, aws_bucket_url:str)->str:
+        """
+        Persist an upload of the folder and wake the worker. Returns once the task is on disk.
+        A task of the folder waiting for a retry is replaced, the new upload is due at once.
+        return: the url the folder will be uploaded to
+        """
+        try:
+            key = self.get_task_key(folder, aws_bucket_url)
+            pending_file_path = os.path.join(self.get_task_dir(PENDING_DIR), f"{key}.yaml")
+            self.write_task(pending_file_path, {"key": key, "folder": os.path.abspath(folder),
+                                                "aws_bucket_url": aws_bucket_url, "attempts": 0,
+                                                "queued_at": time.time(), "next_attempt_at": 0.0})
+            logging.info("Queued upload of [%s] to [%s]", folder, aws_bucket_url)
+            self._wake_event.set()
+            return aws_bucket_url
+        except Exception as e:
+            raise SensorException(e, sys)
+
+    def list_tasks(self, state:str)->list:
+        task_dir = self.get_task_dir(state)
+        if not os.path.isdir(task_dir):
+            return []
+        return sorted(os.path.join(task_dir, file_name) for file_name in os.listdir(task_dir)
+                      if file_name.endswith(".yaml"))
+
+    def get_running_keys(self)->set:
+        return {os.path.basename(file_path).split(".")[0] for file_path in self.list_tasks(RUNNING_DIR)}
+
+    def recover_orphaned_tasks(self):
+        """
+        Move back to pending the tasks claimed by processes which are gone
+        """
+        for file_path in self.list_tasks(RUNNING_DIR):
+            key, pid, _ = os.path.basename(file_path).split(".")
+            if _is_process_alive(int(pid)):
+                continue
+            pending_file_path = os.path.join(self.get_task_dir(PENDING_DIR), f"{key}.yaml")
+            if os.path.exists(pending_file_path):
+                os.remove(file_path)
+            else:
+                os.replace(file_path, pending_file_path)
+            logging.info("Recovered upload task %s of dead process %s", key, pid)
+
+    def claim(self, pending_file_path:str):
+        """
+        return: path of the task in running, None if another worker claimed it first
+        """
+        key = os.path.basename(pending_file_path).split(".")[0]
+        running_file_path = os.path.join(self.get_task_dir(RUNNING_DIR), f"{key}.{os.getpid()}.yaml")
+        os.makedirs(self.get_task_dir(RUNNING_DIR), exist_ok=True)
+        try:
+            os.rename(pending_file_path, running_file_path)
+        except FileNotFoundError:
+            return None
+        return running_file_path
+
+    def run_task(self, running_file_path:str):
+        try:
+            task = self.read_task(running_file_path)
+            task["attempts"] += 1
+            try:
+                self.upload(task["folder"], task["aws_bucket_url"])
+                os.remove(running_file_path)
+                logging.info("Uploaded [%s] to [%s]", task['folder'], task['aws_bucket_url'])
+                return
+            except Exception as e:
+                task["last_error"] = str(e)
+            if task["attempts"] >= self.max_attempts:
+                self.write_task(os.path.join(self.get_task_dir(FAILED_DIR), f"{task['key']}.yaml"), task)
+                os.remove(running_file_path)
+                logging.info("Upload of [%s] failed %s times, giving up: %s", task['folder'], task['attempts'], task['last_error'])
+                return
+            task["next_attempt_at"] = time.time() + self.retry_base_seconds * 2 ** (task["attempts"] - 1)
+            pending_file_path = os.path.join(self.get_task_dir(PENDING_DIR), f"{task['key']}.yaml")
+            if not os.path.exists(pending_file_path):
+                # queued again while running: the newer task already uploads the folder
+                self.write_task(pending_file_path, task)
+            os.remove(running_file_path)
+            logging.info("Upload of [%s] failed, attempt %s: %s", task['folder'], task['attempts'], task['last_error'])
+        except Exception as e:
+            logging.info("Upload task [%s] could not be processed: %s", running_file_path, e)
+        finally:
+            self._slots.release()
+            self._wake_event.set()
+
+    def dispatch(self):
+        """
+        Start the due pending tasks while upload slots are free
+        """
+        running_keys = self.get_running_keys()
+        now = time.time()
+        for pending_file_path in self.list_tasks(PENDING_DIR):
+            key = os.path.basename(pending_file_path).split(".")[0]
+            if key in running_keys:
+                continue
+            try:
+                if self.read_task(pending_file_path)["next_attempt_at"] > now:
+                    continue
+            except FileNotFoundError:
+                continue
+            if not self._slots.acquire(blocking=False):
+                return
+            running_file_path = self.claim(pending_file_path)
+            if running_file_path is None:
+                self._slots.release()
+                continue
+            running_keys.add(key)
+            self._executor.submit(self.run_task, running_file_path)
+
+    def _run_forever(self):
+        self.recover_orphaned_tasks()
+        while not self._stop_event.is_set():
+            self._wake_event.clear()
+            try:
+                self.dispatch()
+            except Exception as e:
+                logging.info("Upload queue dispatch failed: %s", e)
+            # woken by new tasks of this process, the scan picks up tasks of other processes and retries
+            self._wake_event.wait(self.scan_interval_seconds)
+
+    def start(self):
+        if self._worker_thread is not None and self._worker_thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="s3-upload")
+        self._worker_thread = threading.Thread(target=self._run_forever, name="s3-upload-queue", daemon=True)
+        self._worker_thread.start()
+        logging.info("S3 upload queue worker started with %s concurrent uploads", self.max_concurrency)
+
+    def stop(self, wait:bool=True):
+        """
+        Stop dispatching; with wait the uploads in progress are finished, the pending ones stay on disk
+        """
+        self._stop_event.set()
+        self._wake_event.set()
+        if self._worker_thread is not None:
+            self._worker_thread.join()
+            self._worker_thread = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+    def drain(self, timeout:float=S3_UPLOAD_QUEUE_DRAIN_TIMEOUT_SECONDS)->bool:
+        """
+        Run the worker until no task is pending or running. Called by the processes which queue
+        uploads without running a worker, such as the training job, before they exit.
+        timeout: seconds to wait, the tasks left stay on disk for the next worker
+        return: True if the queue was drained
+        """
+        owns_worker = self._worker_thread is None or not self._worker_thread.is_alive()
+        if owns_worker:
+            self.start()
+        deadline = time.monotonic() + timeout
+        try:
+            while len(self.list_tasks(PENDING_DIR)) > 0 or len(self.list_tasks(RUNNING_DIR)) > 0:
+                if time.monotonic() >= deadline:
+                    logging.info("Upload queue not drained after %s seconds", timeout)
+                    return False
+                time.sleep(min(self.scan_interval_seconds, 1))
+            return True
+        finally:
+            if owns_worker:
+                self.stop()
+
+
+upload_queue = S3UploadQueue()
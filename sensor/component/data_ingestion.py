@@ -1,4 +1,8 @@
 import os,sys
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from bson import ObjectId
 from pandas import DataFrame
 
 from sklearn.model_selection import train_test_split
@@ -8,7 +12,8 @@ from sensor.logger import logging
 from sensor.entity.config_entity import DataIngestionConfig
 from sensor.entity.artifact_entity import DataIngestionArtifact
 from sensor.data_access.sensor_data import SensorData
-from sensor.utils.main_utils import read_yaml_file
+from sensor.data_access.feature_store import FeatureStore
+from sensor.utils.main_utils import read_yaml_file, get_file_hash
 from sensor.constant.training_pipeline import SCHEMA_FILE_PATH
 class DataIngestion:
 
@@ -19,22 +24,109 @@ class DataIngestion:
         except Exception as e:
             raise SensorException(e,sys)
 
+    def export_partition(self, sensor_data:SensorData, feature_store:FeatureStore, part_index:int, query:dict)->dict:
+        """
+        Export one _id range of the collection as a part of the feature store
+        """
+        try:
+            dataframe = sensor_data.export_collection_as_dataframe(
+                collection_name=self.data_ingestion_config.collection_name, query=query, sort_by_id=True)
+            logging.info("Exported partition %s with %s records", part_index, len(dataframe))
+            return feature_store.write_part(part_index, dataframe)
+        except  Exception as e:
+            raise  SensorException(e,sys)
+
+    def export_partitions(self, sensor_data:SensorData, feature_store:FeatureStore, queries:list,
+                          first_part_index:int=0)->list:
+        """
+        Export _id ranges concurrently, each on its own pooled connection, as parts of the feature store
+        return: part entries in the order of the queries
+        """
+        try:
+            logging.info("Exporting %s partitions with %s workers", len(queries), self.data_ingestion_config.n_workers)
+            with ThreadPoolExecutor(max_workers=self.data_ingestion_config.n_workers) as executor:
+                futures = [executor.submit(self.export_partition, sensor_data, feature_store, first_part_index + i, query)
+                           for i, query in enumerate(queries)]
+                return [future.result() for future in futures]
+        except  Exception as e:
+            raise  SensorException(e,sys)
+
+    def sync_feature_store_snapshot(self)->FeatureStore:
+        """
+        Bring the cached feature store snapshot up to date with the collection. Only the documents
+        inserted after the watermark (largest _id already in the snapshot) are fetched and appended,
+        unless a full refresh is asked, there is no snapshot yet or the snapshot was built with
+        another schema.yaml: parts written before a schema change would lack its new columns.
+        ObjectIds are generated by the clients from their own clock, so they are not strictly ordered
+        across clients: a document inserted by a client whose clock lags behind can get an _id below
+        the watermark and be skipped, as are documents updated in place. The snapshot is therefore
+        also rebuilt once its last full export is older than snapshot_full_refresh_days.
+        """
+        try:
+            sensor_data = SensorData()
+            collection_name = self.data_ingestion_config.collection_name
+            n_partitions = self.data_ingestion_config.n_partitions
+            snapshot = FeatureStore(self.data_ingestion_config.snapshot_dir, self._schema_config)
+            columns = [name for column in self._schema_config["columns"] for name in column]
+
+            schema_hash = get_file_hash(SCHEMA_FILE_PATH)
+
+            watermark = None
+            full_refresh_at = None
+            if snapshot.exists() and not self.data_ingestion_config.full_refresh:
+                snapshot_metadata = snapshot.get_manifest()["metadata"]
+                full_refresh_at = snapshot_metadata.get("full_refresh_at")
+                full_refresh_age = None if full_refresh_at is None else datetime.now() - datetime.fromisoformat(full_refresh_at)
+                if snapshot_metadata.get("schema_hash") != schema_hash:
+                    logging.info("Schema changed since the feature store snapshot was built")
+                elif full_refresh_age is None or full_refresh_age > timedelta(days=self.data_ingestion_config.snapshot_full_refresh_days):
+                    logging.info("Feature store snapshot was last fully exported at %s", full_refresh_at)
+                else:
+                    watermark = snapshot_metadata.get("last_id")
+            until_id = sensor_data.get_last_id(collection_name)
+
+            if watermark is None:
+                logging.info("Full export of the collection into the feature store snapshot")
+                full_refresh_at = datetime.now().isoformat()
+                queries = sensor_data.get_id_partitions(collection_name, n_partitions, until_id=until_id)
+                snapshot.reset()
+                parts = self.export_partitions(sensor_data, snapshot, queries)
+            else:
+                queries = sensor_data.get_id_partitions(collection_name, n_partitions,
+                                                        after_id=ObjectId(watermark), until_id=until_id)
+                parts = snapshot.get_manifest()["parts"]
+                new_parts = self.export_partitions(sensor_data, snapshot, queries, len(parts))
+                parts = parts + new_parts
+                logging.info("Fetched %s records after watermark %s", sum([part['rows'] for part in new_parts]), watermark)
+
+            if isinstance(until_id, ObjectId):
+                watermark = str(until_id)
+            elif until_id is not None:
+                # only ObjectIds can be used as watermark, other _id types are always fully exported
+                watermark = None
+            metadata = {"last_id": watermark, "schema_hash": schema_hash, "full_refresh_at": full_refresh_at}
+            snapshot.commit(parts, columns, metadata)
+            if len(parts) > self.data_ingestion_config.snapshot_max_parts:
+                logging.info("Compacting feature store snapshot of %s parts", len(parts))
+                snapshot.write(snapshot.read(), metadata=metadata)
+            return snapshot
+        except  Exception as e:
+            raise  SensorException(e,sys)
+
     def export_data_into_feature_store(self) -> DataFrame:
         """
-        Export mongo db collection record as data frame into feature
+        Export mongo db collection record as data frame into feature.
+        The cached snapshot is brought up to date and copied into the feature store of the run.
+        Records are in _id order whatever the number of partitions.
         """
         try:
             logging.info("Exporting data from mongodb to feature store")
-            sensor_data = SensorData()
-            dataframe = sensor_data.export_collection_as_dataframe(collection_name=self.data_ingestion_config.collection_name)
+            snapshot = self.sync_feature_store_snapshot()
             feature_store_file_path = self.data_ingestion_config.feature_store_file_path 
-
-            #creating folder
-            dir_path = os.path.dirname(feature_store_file_path)
-            os.makedirs(dir_path,exist_ok=True)
-
-            dataframe.to_csv(feature_store_file_path,index=False,header=True)
-            return dataframe
+            if os.path.exists(feature_store_file_path):
+                shutil.rmtree(feature_store_file_path)
+            shutil.copytree(snapshot.dir_path, feature_store_file_path)
+            return FeatureStore(feature_store_file_path, self._schema_config).read()
         except  Exception as e:
             raise  SensorException(e,sys)
 
@@ -45,7 +137,8 @@ class DataIngestion:
 
         try:
             train_set, test_set = train_test_split(
-                dataframe, test_size=self.data_ingestion_config.train_test_split_ratio
+                dataframe, test_size=self.data_ingestion_config.train_test_split_ratio,
+                random_state=self.data_ingestion_config.random_state
             )
 
             logging.info("Performed train test split on the dataframe")
@@ -54,29 +147,23 @@ class DataIngestion:
                 "Exited split_data_as_train_test method of Data_Ingestion class"
             )
 
-            dir_path = os.path.dirname(self.data_ingestion_config.training_file_path)
-
-            os.makedirs(dir_path, exist_ok=True)
-
-            logging.info(f"Exporting train and test file path.")
+            logging.info("Exporting train and test file path.")
 
-            train_set.to_csv(
-                self.data_ingestion_config.training_file_path, index=False, header=True
-            )
+            rows_per_part = self.data_ingestion_config.rows_per_part
+            FeatureStore(self.data_ingestion_config.training_file_path, self._schema_config).write(train_set, rows_per_part)
 
-            test_set.to_csv(
-                self.data_ingestion_config.testing_file_path, index=False, header=True
-            )
+            FeatureStore(self.data_ingestion_config.testing_file_path, self._schema_config).write(test_set, rows_per_part)
 
-            logging.info(f"Exported train and test file path.")
+            logging.info("Exported train and test file path.")
         except Exception as e:
-            raise SensorData(e,sys)
+            raise SensorException(e,sys)
     
 
     def initiate_data_ingestion(self) -> DataIngestionArtifact:
         try:
             dataframe = self.export_data_into_feature_store()
-            dataframe = dataframe.drop(self._schema_config["drop_columns"],axis=1)
+            # drop columns are already left out by the export projection
+            dataframe = dataframe.drop(self._schema_config["drop_columns"],axis=1,errors="ignore")
             self.split_data_as_train_test(dataframe=dataframe)
             data_ingestion_artifact = DataIngestionArtifact(train_file_path=self.data_ingestion_config.training_file_path,
             test_file_path=self.data_ingestion_config.testing_file_path)
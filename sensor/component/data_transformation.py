@@ -1,7 +1,8 @@
-import sys
+import os, sys
+import shutil
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import pandas as pd
-from imblearn.combine import SMOTETomek
 from sklearn.impute import SimpleImputer
 from sklearn.preprocessing import RobustScaler
 from sklearn.pipeline import Pipeline
@@ -10,10 +11,12 @@ from sklearn.pipeline import Pipeline
 from sensor.constant.training_pipeline import TARGET_COLUMN
 from sensor.entity.artifact_entity import (DataTransformationArtifact, DataValidationArtifact,)
 from sensor.entity.config_entity import DataTransformationConfig
+from sensor.data_access.feature_store import FeatureStore, read_dataframe
 from sensor.exception import SensorException
 from sensor.logger import logging
+from sensor.ml.balancing.class_balancer import ClassBalancer, benchmark_balancing_strategies, CLASS_WEIGHT
 from sensor.ml.model.estimator import TargetValueMapping
-from sensor.utils.main_utils import save_numpy_array_data, save_object
+from sensor.utils.main_utils import save_numpy_array_data, save_object, write_yaml_file
 
 
 
@@ -47,49 +50,188 @@ class DataTransformation:
             raise SensorException(e, sys) from e
 
     
-    def initiate_data_transformation(self,) -> DataTransformationArtifact:
-        try:
-            logging.info("Load train, test dataframe")
-            train_df = pd.read_csv(self.data_validation_artifact.valid_train_file_path)
-            test_df = pd.read_csv(self.data_validation_artifact.valid_test_file_path)
-            preprocessor = self.get_data_transformer_object()
-            logging.info(f"Preprocessor object: {preprocessor.named_steps}")
+    def get_class_balancer(self)->ClassBalancer:
+        config = self.data_transformation_config
+        return ClassBalancer(config.balancing_strategy, random_state=config.random_state,
+                             k_neighbors=config.smote_k_neighbors, neighbors_algorithm=config.neighbors_algorithm,
+                             n_jobs=config.n_jobs)
+
+    @staticmethod
+    def split_input_target(dataframe:pd.DataFrame):
+        """
+        return: input features and target mapped as TargetValueMapping
+        """
+        input_feature_df = dataframe.drop(columns=[TARGET_COLUMN], axis=1)
+        target_feature_df = dataframe[TARGET_COLUMN].replace(TargetValueMapping().to_dict())
+        return input_feature_df, target_feature_df
 
-            logging.info(f"Map target feature as {TargetValueMapping().to_dict()}  and split into input and target features")
-            #training dataframe
-            input_feature_train_df = train_df.drop(columns=[TARGET_COLUMN], axis=1)
-            target_feature_train_df = train_df[TARGET_COLUMN]
-            target_feature_train_df = target_feature_train_df.replace( TargetValueMapping().to_dict())
+    @staticmethod
+    def save_features_labels(file_path:str, label_file_path:str, input_feature:np.ndarray, target_feature):
+        """
+        Save features as float32 and labels as int8 in separate arrays which can be memory-mapped
+        """
+        save_numpy_array_data(file_path, array=np.ascontiguousarray(input_feature, dtype=np.float32))
+        save_numpy_array_data(label_file_path, array=np.asarray(target_feature, dtype=np.int8))
+
+    def transform_and_resample(self, preprocessor_object:Pipeline, input_feature_df:pd.DataFrame,
+                               target_feature_df:pd.Series, file_path:str, label_file_path:str,
+                               resample:bool=True)->np.ndarray:
+        """
+        Transform, balance and save one dataset as arrays of features and labels
+        return: target after balancing
+        """
+        try:
+            transformed_input_feature = preprocessor_object.transform(input_feature_df)
+            input_feature_final, target_feature_final = transformed_input_feature, np.array(target_feature_df)
+            if resample:
+                input_feature_final, target_feature_final = self.get_class_balancer().fit_resample(
+                    transformed_input_feature, target_feature_df
+                )
+
+            self.save_features_labels(file_path, label_file_path, input_feature_final, target_feature_final)
+            return target_feature_final
+        except Exception as e:
+            raise SensorException(e, sys) from e
 
-            #testing dataframe
-            input_feature_test_df = test_df.drop(columns=[TARGET_COLUMN], axis=1)
-            target_feature_test_df = test_df[TARGET_COLUMN]
-            target_feature_test_df = target_feature_test_df.replace(TargetValueMapping().to_dict())
+    def benchmark_balancing_strategies(self, preprocessor_object:Pipeline, input_feature_train_df:pd.DataFrame,
+                                       target_feature_train_df, input_feature_test_df:pd.DataFrame,
+                                       target_feature_test_df)->str:
+        """
+        Time and score every balancing strategy with the fitted preprocessor, the report is written
+        next to the transformation artifacts
+        return: report file path
+        """
+        try:
+            logging.info("Benchmark the balancing strategies")
+            results = benchmark_balancing_strategies(
+                preprocessor_object.transform(input_feature_train_df), np.array(target_feature_train_df),
+                preprocessor_object.transform(input_feature_test_df), np.array(target_feature_test_df),
+                random_state=self.data_transformation_config.random_state, n_jobs=self.data_transformation_config.n_jobs)
+            write_yaml_file(self.data_transformation_config.benchmark_report_file_path, results)
+            return self.data_transformation_config.benchmark_report_file_path
+        except Exception as e:
+            raise SensorException(e, sys) from e
 
-            logging.info("Apply preprocessing object")
-            preprocessor_object = preprocessor.fit(input_feature_train_df)
-            transformed_input_train_feature = preprocessor_object.transform(input_feature_train_df)
-            transformed_input_test_feature =preprocessor_object.transform(input_feature_test_df)
+    def sample_rows(self, feature_store:FeatureStore):
+        """
+        Uniform sample of at most fit_sample_size rows read part by part from the feature store,
+        keeping the rows with the smallest random keys, and class counts of the whole store
+        return: sample dataframe, number of rows, number of positive rows
+        """
+        try:
+            sample_size = self.data_transformation_config.fit_sample_size
+            rng = np.random.default_rng(self.data_transformation_config.random_state)
+            sample, sample_keys = None, None
+            n_rows, n_positive = 0, 0
+            for part_df in feature_store.iter_parts():
+                _, target_feature_df = self.split_input_target(part_df)
+                n_rows += len(part_df)
+                n_positive += int(np.sum(np.array(target_feature_df) == 1))
+                keys = rng.random(len(part_df))
+                sample = part_df if sample is None else pd.concat([sample, part_df], ignore_index=True)
+                sample_keys = keys if sample_keys is None else np.concatenate([sample_keys, keys])
+                if len(sample) > sample_size:
+                    keep = np.sort(np.argpartition(sample_keys, sample_size)[:sample_size])
+                    sample, sample_keys = sample.iloc[keep].reset_index(drop=True), sample_keys[keep]
+            return sample, n_rows, n_positive
+        except Exception as e:
+            raise SensorException(e, sys) from e
 
-            smt = SMOTETomek(sampling_strategy="minority")
+    def transform_parts(self, preprocessor_object:Pipeline, feature_store:FeatureStore, dir_path:str,
+                        label_dir_path:str)->int:
+        """
+        Transform the feature store part by part into arrays of features and labels, named alike
+        in the two directories
+        return: number of parts
+        """
+        try:
+            for path in (dir_path, label_dir_path):
+                if os.path.exists(path):
+                    shutil.rmtree(path)
+            n_parts = 0
+            for part_index, part_df in enumerate(feature_store.iter_parts()):
+                input_feature_df, target_feature_df = self.split_input_target(part_df)
+                file_name = f"part-{part_index:05d}.npy"
+                self.save_features_labels(os.path.join(dir_path, file_name), os.path.join(label_dir_path, file_name),
+                                          preprocessor_object.transform(input_feature_df), target_feature_df)
+                n_parts += 1
+            return n_parts
+        except Exception as e:
+            raise SensorException(e, sys) from e
 
-            logging.info(f"Apply sample balance using {smt.__class__.__name__}")
-            input_feature_train_final, target_feature_train_final = smt.fit_resample(
-                transformed_input_train_feature, target_feature_train_df
+    def initiate_out_of_core_transformation(self) -> DataTransformationArtifact:
+        """
+        Transformation in bounded memory: a streaming pass samples the rows the preprocessor is
+        fitted on, a second one transforms the data part by part. Resampling needs the whole data,
+        so the classes are balanced through scale_pos_weight.
+        """
+        try:
+            train_file_path = self.data_validation_artifact.valid_train_file_path
+            test_file_path = self.data_validation_artifact.valid_test_file_path
+            if not (os.path.isdir(train_file_path) and os.path.isdir(test_file_path)):
+                raise Exception("Out-of-core transformation needs the validated data as feature stores")
+            train_store, test_store = FeatureStore(train_file_path), FeatureStore(test_file_path)
+            if self.data_transformation_config.balancing_strategy != CLASS_WEIGHT:
+                logging.info("Out-of-core transformation balances classes with %s instead of %s", CLASS_WEIGHT, self.data_transformation_config.balancing_strategy)
+
+            train_sample_df, n_rows, n_positive = self.sample_rows(train_store)
+            logging.info("Fit preprocessor on %s of %s train rows", len(train_sample_df), n_rows)
+            input_feature_sample_df, _ = self.split_input_target(train_sample_df)
+            preprocessor_object = self.get_data_transformer_object().fit(input_feature_sample_df)
+            save_object(self.data_transformation_config.transformed_object_file_path, preprocessor_object)
+
+            logging.info("Transform train and test data part by part")
+            config = self.data_transformation_config
+            self.transform_parts(preprocessor_object, train_store, config.transformed_train_dir, config.transformed_train_label_dir)
+            self.transform_parts(preprocessor_object, test_store, config.transformed_test_dir, config.transformed_test_label_dir)
+
+            return DataTransformationArtifact(
+                transformed_object_file_path=config.transformed_object_file_path,
+                transformed_train_file_path=config.transformed_train_dir,
+                transformed_test_file_path=config.transformed_test_dir,
+                transformed_train_label_file_path=config.transformed_train_label_dir,
+                transformed_test_label_file_path=config.transformed_test_label_dir,
+                scale_pos_weight=float(n_rows - n_positive) / max(n_positive, 1),
             )
+        except Exception as e:
+            raise SensorException(e, sys) from e
 
-            input_feature_test_final, target_feature_test_final = smt.fit_resample(
-                transformed_input_test_feature, target_feature_test_df
-            )
+    def initiate_data_transformation(self,) -> DataTransformationArtifact:
+        try:
+            if self.data_transformation_config.out_of_core:
+                return self.initiate_out_of_core_transformation()
+            logging.info("Load train, test dataframe")
+            train_df = read_dataframe(self.data_validation_artifact.valid_train_file_path)
+            test_df = read_dataframe(self.data_validation_artifact.valid_test_file_path)
+            preprocessor = self.get_data_transformer_object()
+            logging.info("Preprocessor object: %s", preprocessor.named_steps)
+
+            logging.info("Map target feature as %s  and split into input and target features", TargetValueMapping().to_dict())
+            input_feature_train_df, target_feature_train_df = self.split_input_target(train_df)
+            input_feature_test_df, target_feature_test_df = self.split_input_target(test_df)
 
-            train_arr = np.c_[input_feature_train_final, np.array(target_feature_train_final) ]
-            test_arr = np.c_[ input_feature_test_final, np.array(target_feature_test_final) ]
+            logging.info("Apply preprocessing object")
+            preprocessor_object = preprocessor.fit(input_feature_train_df)
 
-            logging.info("Save train and test numpy array")
-            #save numpy array data
-            save_numpy_array_data( self.data_transformation_config.transformed_train_file_path, array=train_arr, )
-            save_numpy_array_data( self.data_transformation_config.transformed_test_file_path,array=test_arr,)
-            save_object( self.data_transformation_config.transformed_object_file_path, preprocessor_object,)
+            benchmark_file_path = None
+            if self.data_transformation_config.benchmark_balancing:
+                benchmark_file_path = self.benchmark_balancing_strategies(
+                    preprocessor_object, input_feature_train_df, target_feature_train_df,
+                    input_feature_test_df, target_feature_test_df)
+
+            # once the preprocessor is fitted, train and test are transformed, balanced and saved concurrently
+            logging.info("Save train and test numpy array, balancing strategy %s", self.data_transformation_config.balancing_strategy)
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                train_future = executor.submit(self.transform_and_resample, preprocessor_object, input_feature_train_df,
+                                    target_feature_train_df, self.data_transformation_config.transformed_train_file_path,
+                                    self.data_transformation_config.transformed_train_label_file_path)
+                test_future = executor.submit(self.transform_and_resample, preprocessor_object, input_feature_test_df,
+                                    target_feature_test_df, self.data_transformation_config.transformed_test_file_path,
+                                    self.data_transformation_config.transformed_test_label_file_path,
+                                    self.data_transformation_config.resample_test)
+                save_object( self.data_transformation_config.transformed_object_file_path, preprocessor_object,)
+                target_feature_train_final = train_future.result()
+                test_future.result()
             
             
             #preparing artifact
@@ -97,6 +239,10 @@ class DataTransformation:
                 transformed_object_file_path=self.data_transformation_config.transformed_object_file_path,
                 transformed_train_file_path=self.data_transformation_config.transformed_train_file_path,
                 transformed_test_file_path=self.data_transformation_config.transformed_test_file_path,
+                transformed_train_label_file_path=self.data_transformation_config.transformed_train_label_file_path,
+                transformed_test_label_file_path=self.data_transformation_config.transformed_test_label_file_path,
+                scale_pos_weight=self.get_class_balancer().get_scale_pos_weight(target_feature_train_final),
+                balancing_benchmark_file_path=benchmark_file_path,
             )
             return data_transformation_artifact
         except Exception as e:
@@ -1,12 +1,16 @@
-from sensor.constant.training_pipeline import SCHEMA_FILE_PATH
-from sensor.entity.artifact_entity import DataIngestionArtifact, DataValidationArtifact
+from sensor.constant.training_pipeline import SCHEMA_FILE_PATH, DRIFT_DETECTION_N_JOBS
+from sensor.entity.artifact_entity import DataIngestionArtifact, DataValidationArtifact, DataDriftArtifact
 from sensor.entity.config_entity import DataValidationConfig
 from sensor.exception import SensorException
 from sensor.logger import logging
 from sensor.utils.main_utils import read_yaml_file,write_yaml_file
+from sensor.ml.drift.drift_baseline import DriftBaseline
+from sensor.data_access.feature_store import read_dataframe
+from sensor.ml.drift.ks_drift import ks_2samp_columns, get_drift_report
 
-from scipy.stats import ks_2samp
 from distutils import dir_util
+import dataclasses
+import numpy as np
 import pandas as pd
 import os,sys
 
@@ -27,8 +31,8 @@ class DataValidation:
     def validate_number_of_columns(self,dataframe:pd.DataFrame)->bool:
         try:
             number_of_columns = len(self._schema_config["columns"])
-            logging.info(f"Required number of columns: {number_of_columns}")
-            logging.info(f"Data frame has columns: {len(dataframe.columns)}")
+            logging.info("Required number of columns: %s", number_of_columns)
+            logging.info("Data frame has columns: %s", len(dataframe.columns))
             if len(dataframe.columns)==number_of_columns:
                 return True
             return False
@@ -47,32 +51,47 @@ class DataValidation:
                     numerical_column_present=False
                     missing_numerical_columns.append(num_column)
             
-            logging.info(f"Missing numerical columns: [{missing_numerical_columns}]")
+            logging.info("Missing numerical columns: [%s]", tuple(missing_numerical_columns))
             return numerical_column_present
         except Exception as e:
             raise SensorException(e,sys)      
 
-    def detect_dataset_drift(self,base_df,current_df,threshold=0.05)->bool:
+    @staticmethod
+    def get_drift_arrays(base_df:pd.DataFrame, current_df:pd.DataFrame, columns:list):
+        """
+        Columns of both dataframes as float arrays for the KS engine. Values of a non numerical
+        column, such as class, are replaced by their rank among the values of both dataframes: the
+        KS test only depends on the order of the values, so the p values are the ones of the raw values.
+        return: base array, current array, missing values as NaN
+        """
+        try:
+            base = np.empty((len(base_df), len(columns)), dtype=np.float64)
+            current = np.empty((len(current_df), len(columns)), dtype=np.float64)
+            for i, column in enumerate(columns):
+                base_values, current_values = base_df[column], current_df[column]
+                if pd.api.types.is_numeric_dtype(base_values) and pd.api.types.is_numeric_dtype(current_values):
+                    base[:, i] = base_values.to_numpy(dtype=np.float64)
+                    current[:, i] = current_values.to_numpy(dtype=np.float64)
+                    continue
+                base_values = base_values.astype(object).where(base_values.notna(), None)
+                current_values = current_values.astype(object).where(current_values.notna(), None)
+                categories = sorted({str(value) for value in pd.concat([base_values, current_values]).dropna()})
+                for values, array in ((base_values, base), (current_values, current)):
+                    codes = pd.Categorical(values.map(lambda value: None if value is None else str(value)),
+                                           categories=categories).codes.astype(np.float64)
+                    codes[codes < 0] = np.nan
+                    array[:, i] = codes
+            return base, current
+        except Exception as e:
+            raise SensorException(e,sys)
+
+    def detect_dataset_drift(self,base_df,current_df,threshold=0.05)->DataDriftArtifact:
         logging.info("Checking for data drift")
         try:
-            status=False
-            report = {}
-            data_drift_columns = []
-            for column in base_df.columns:
-                d1 = base_df[column]
-                d2  = current_df[column]
-                is_same_dist = ks_2samp(d1,d2)
-                if threshold<=is_same_dist.pvalue:
-                    is_found=False
-                else:
-                    is_found = True 
-                    data_drift_columns.append(column)
-                    status=True
-                report.update({column:{
-                    "p_value":float(is_same_dist.pvalue),
-                    "drift_status":is_found
-                    
-                    }})
+            columns = list(base_df.columns)
+            base, current = self.get_drift_arrays(base_df, current_df, columns)
+            _, p_values = ks_2samp_columns(base, current, n_jobs=DRIFT_DETECTION_N_JOBS)
+            status, report, data_drift_columns = get_drift_report(columns, p_values, threshold)
             
             drift_report_file_path = self.data_validation_config.drift_report_file_path
             
@@ -81,8 +100,9 @@ class DataValidation:
             os.makedirs(dir_path,exist_ok=True)
             write_yaml_file(file_path=drift_report_file_path,content=report,)
 
-            logging.info(f"Data drift: {status}, Data drift columns: {data_drift_columns}. Report generated at {drift_report_file_path}")
-            return status
+            logging.info("Data drift: %s, Data drift columns: %s. Report generated at %s", status, tuple(data_drift_columns), drift_report_file_path)
+            return DataDriftArtifact(drift_status=status, drift_report_file_path=drift_report_file_path,
+                                     data_drift_columns=data_drift_columns)
         except Exception as e:
             raise SensorException(e,sys)
    
@@ -94,8 +114,8 @@ class DataValidation:
             test_file_path = self.data_ingestion_artifact.test_file_path
 
             #Reading data from train and test file location
-            train_dataframe = pd.read_csv(train_file_path)
-            test_dataframe = pd.read_csv(test_file_path)
+            train_dataframe = read_dataframe(train_file_path, self._schema_config)
+            test_dataframe = read_dataframe(test_file_path, self._schema_config)
 
             #Validate number of columns
             logging.info("Validate no. of columns for train dataframe")
@@ -120,21 +140,46 @@ class DataValidation:
                 error_message=f"{error_message}Test dataframe does not contain all numerical columns.\n"
             
             if len(error_message)>0:
-                raise SensorException(error_message)
+                raise Exception(error_message)
 
-            # Check data drift
-            status = self.detect_dataset_drift(base_df=train_dataframe,current_df=test_dataframe)
+            # data drift is checked by initiate_drift_detection, it won't stop execution
 
-            # won't stop execution due to data drift
+            # baseline shipped with the model for drift detection at prediction time
+            DriftBaseline.from_dataframe(train_dataframe, self._schema_config["numerical_columns"],
+            sample_size=self.data_validation_config.drift_baseline_sample_size).save(
+                self.data_validation_config.drift_baseline_file_path)
 
             data_validation_artifact = DataValidationArtifact(
-                validation_status=status,
+                # drift status, set by with_drift_status once the drift detection completed
+                validation_status=None,
                 valid_train_file_path=self.data_ingestion_artifact.train_file_path,
                 valid_test_file_path=self.data_ingestion_artifact.test_file_path,
                 invalid_train_file_path=None,
                 invalid_test_file_path=None,
                 drift_report_file_path=self.data_validation_config.drift_report_file_path,
+                drift_baseline_file_path=self.data_validation_config.drift_baseline_file_path,
             )            
             return data_validation_artifact
         except Exception as e:
-            raise SensorException(e,sys)
\ No newline at end of file
+            raise SensorException(e,sys)
+
+    @staticmethod
+    def with_drift_status(data_validation_artifact:DataValidationArtifact,
+                          data_drift_artifact:DataDriftArtifact)->DataValidationArtifact:
+        """
+        Validation artifact whose validation_status is the drift status, as when drift was
+        detected within the validation
+        """
+        return dataclasses.replace(data_validation_artifact, validation_status=data_drift_artifact.drift_status)
+
+    def initiate_drift_detection(self)->DataDriftArtifact:
+        """
+        Compare the distribution of the test data with the one of the train data.
+        Independent of the validated data handed to the next stages, so it can run next to them.
+        """
+        try:
+            train_dataframe = read_dataframe(self.data_ingestion_artifact.train_file_path, self._schema_config)
+            test_dataframe = read_dataframe(self.data_ingestion_artifact.test_file_path, self._schema_config)
+            return self.detect_dataset_drift(base_df=train_dataframe,current_df=test_dataframe)
+        except Exception as e:
+            raise SensorException(e,sys)
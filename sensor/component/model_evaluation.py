@@ -8,6 +8,9 @@ from sensor.ml.metric.classification_metric import get_classification_score
 from sensor.ml.model.estimator import SensorModel
 from sensor.utils.main_utils import save_object,load_object,write_yaml_file
 from sensor.ml.model.estimator import ModelResolver
+from sensor.ml.model.model_bundle import load_sensor_model
+from sensor.ml.model.evaluation_cache import EvaluationCache
+from sensor.data_access.feature_store import read_dataframe
 from sensor.constant.training_pipeline import TARGET_COLUMN
 from sensor.ml.model.estimator import TargetValueMapping
 import pandas  as  pd
@@ -35,12 +38,12 @@ class ModelEvaluation:
             valid_test_file_path = self.data_validation_artifact.valid_test_file_path
 
             #valid train and test file dataframe
-            train_df = pd.read_csv(valid_train_file_path)
-            test_df = pd.read_csv(valid_test_file_path)
+            train_df = read_dataframe(valid_train_file_path)
+            test_df = read_dataframe(valid_test_file_path)
 
-            df = pd.concat([train_df,test_df])
-            y_true = df[TARGET_COLUMN]
-            y_true.replace(TargetValueMapping().to_dict(),inplace=True)
+            # evaluation matrix loaded once and shared by both models
+            df = pd.concat([train_df,test_df], ignore_index=True)
+            y_true = df[TARGET_COLUMN].replace(TargetValueMapping().to_dict()).to_numpy()
             df.drop(TARGET_COLUMN,axis=1,inplace=True)
 
             train_model_file_path = self.model_trainer_artifact.trained_model_file_path
@@ -50,41 +53,50 @@ class ModelEvaluation:
 
             model_exists = model_resolver.is_model_exists()
             if not model_exists:
-                logging.info(f"Latest model exists: {model_exists}")
+                logging.info("Latest model exists: %s", model_exists)
                 model_evaluation_artifact = ModelEvaluationArtifact(
                     is_model_accepted=is_model_accepted, 
                     improved_accuracy=None, 
                     best_model_path=None, 
                     trained_model_path=train_model_file_path, 
+                    trained_model_bundle_dir=self.model_trainer_artifact.trained_model_bundle_dir, 
                     train_model_metric_artifact=self.model_trainer_artifact.test_metric_artifact, 
                     best_model_metric_artifact=None)
                 return model_evaluation_artifact
 
             latest_model_path = model_resolver.get_latest_model_path()
-            logging.info(f"Latest model existing at {latest_model_path}")
+            logging.info("Latest model existing at %s", latest_model_path)
 
-            logging.info("Load latest model and trained model")
-            latest_model = load_object(file_path=latest_model_path)
+            logging.info("Load trained model")
             train_model = load_object(file_path=train_model_file_path)
-            
-            logging.info("Predict on both models")
+            logging.info("Predict on trained model")
             y_trained_pred = train_model.predict(df)
-            y_latest_pred  =latest_model.predict(df)
-
             logging.info("Trained metric")
             trained_metric = get_classification_score(y_true, y_trained_pred)
-            logging.info("Latest model metric")
-            latest_metric = get_classification_score(y_true, y_latest_pred)
+
+            # the latest model is a saved model which never changes, its metrics and predictions are cached
+            evaluation_cache = EvaluationCache(model_resolver.get_latest_model_timestamp())
+            row_hashes = EvaluationCache.get_row_hashes(df)
+            data_fingerprint = EvaluationCache.get_data_fingerprint(row_hashes, y_true)
+            latest_metric = evaluation_cache.get_metrics(data_fingerprint)
+            if latest_metric is None:
+                logging.info("Predict on latest model")
+                y_latest_pred = evaluation_cache.predict(lambda: load_sensor_model(latest_model_path), df, row_hashes)
+                logging.info("Latest model metric")
+                latest_metric = get_classification_score(y_true, y_latest_pred)
+                evaluation_cache.save_metrics(data_fingerprint, latest_metric)
+            else:
+                logging.info("Latest model metric from evaluation cache: %s", latest_metric)
 
             improved_accuracy = trained_metric.f1_score-latest_metric.f1_score
-            logging.info(f"Improved accuracy: {improved_accuracy}")
+            logging.info("Improved accuracy: %s", improved_accuracy)
             if self.model_eval_config.change_threshold < improved_accuracy:
                 #0.02 < 0.03
                 is_model_accepted=True
             else:
                 is_model_accepted=False
 
-            logging.info(f"Trained model accepted: {is_model_accepted}")
+            logging.info("Trained model accepted: %s", is_model_accepted)
 
             
             model_evaluation_artifact = ModelEvaluationArtifact(
@@ -92,6 +104,7 @@ class ModelEvaluation:
                     improved_accuracy=improved_accuracy, 
                     best_model_path=latest_model_path, 
                     trained_model_path=train_model_file_path, 
+                    trained_model_bundle_dir=self.model_trainer_artifact.trained_model_bundle_dir, 
                     train_model_metric_artifact=trained_metric, 
                     best_model_metric_artifact=latest_metric)
 
@@ -99,7 +112,7 @@ class ModelEvaluation:
 
             #save the report
             write_yaml_file(self.model_eval_config.report_file_path, model_eval_report)
-            logging.info(f"Evaluation report at: {self.model_eval_config.report_file_path}")
+            logging.info("Evaluation report at: %s", self.model_eval_config.report_file_path)
             return model_evaluation_artifact
             
         except Exception as e:
@@ -1,23 +1,26 @@
 
 from sensor.exception import SensorException
 from sensor.logger import logging
-from sensor.entity.artifact_entity import ModelPusherArtifact,ModelTrainerArtifact,ModelEvaluationArtifact
+from sensor.entity.artifact_entity import ModelPusherArtifact,ModelTrainerArtifact,ModelEvaluationArtifact,DataValidationArtifact
 from sensor.entity.config_entity import ModelEvaluationConfig,ModelPusherConfig
 import os,sys
 from sensor.ml.metric.classification_metric import get_classification_score
 from sensor.utils.main_utils import save_object,load_object,write_yaml_file
 
 import shutil
+import tempfile
 
 class ModelPusher:
 
     def __init__(self,
                 model_pusher_config:ModelPusherConfig,
-                model_eval_artifact:ModelEvaluationArtifact):
+                model_eval_artifact:ModelEvaluationArtifact,
+                data_validation_artifact:DataValidationArtifact):
 
         try:
             self.model_pusher_config = model_pusher_config
             self.model_eval_artifact = model_eval_artifact
+            self.data_validation_artifact = data_validation_artifact
         except  Exception as e:
             raise SensorException(e, sys)
     
@@ -30,16 +33,44 @@ class ModelPusher:
             model_file_path = self.model_pusher_config.model_file_path
             os.makedirs(os.path.dirname(model_file_path),exist_ok=True)
             shutil.copy(src=trained_model_path, dst=model_file_path)
-            logging.info(f"Copy {trained_model_path} to {model_file_path}")
+            logging.info("Copy %s to %s", trained_model_path, model_file_path)
 
-            #saved model dir
+            #saved model dir, filled in a staging dir next to saved_models and renamed into place in one step,
+            #so that readers of the latest model never see a partial copy
             saved_model_path = self.model_pusher_config.saved_model_path
-            os.makedirs(os.path.dirname(saved_model_path),exist_ok=True)
-            shutil.copy(src=trained_model_path, dst=saved_model_path)
-            logging.info(f"Copy {trained_model_path} to {saved_model_path}")
+            saved_model_dir = os.path.dirname(saved_model_path)
+            saved_models_dir = os.path.dirname(saved_model_dir)
+            os.makedirs(saved_models_dir,exist_ok=True)
+            #outside saved_models, whose entries are all model timestamps, on the same file system
+            staging_dir = tempfile.mkdtemp(prefix=".model_pusher-", dir=os.path.dirname(os.path.abspath(saved_models_dir)))
+            try:
+                os.chmod(staging_dir, 0o755)
+                get_staging_path = lambda path: os.path.join(staging_dir, os.path.relpath(path, saved_model_dir))
+                shutil.copy(src=trained_model_path, dst=get_staging_path(saved_model_path))
+                logging.info("Copy %s to %s", trained_model_path, saved_model_path)
+
+                #native model bundle
+                saved_model_bundle_dir = None
+                trained_model_bundle_dir = self.model_eval_artifact.trained_model_bundle_dir
+                if trained_model_bundle_dir is not None:
+                    saved_model_bundle_dir = self.model_pusher_config.saved_model_bundle_dir
+                    shutil.copytree(src=trained_model_bundle_dir, dst=get_staging_path(saved_model_bundle_dir))
+                    logging.info("Copy %s to %s", trained_model_bundle_dir, saved_model_bundle_dir)
+
+                #drift baseline next to the saved model
+                drift_baseline_path = self.data_validation_artifact.drift_baseline_file_path
+                saved_drift_baseline_path = self.model_pusher_config.saved_drift_baseline_path
+                shutil.copy(src=drift_baseline_path, dst=get_staging_path(saved_drift_baseline_path))
+                logging.info("Copy %s to %s", drift_baseline_path, saved_drift_baseline_path)
+
+                os.rename(staging_dir, saved_model_dir)
+            finally:
+                if os.path.exists(staging_dir):
+                    shutil.rmtree(staging_dir)
 
             #prepare artifact
-            model_pusher_artifact = ModelPusherArtifact(saved_model_path=saved_model_path, model_file_path=model_file_path)
+            model_pusher_artifact = ModelPusherArtifact(saved_model_path=saved_model_path, model_file_path=model_file_path,
+            saved_drift_baseline_path=saved_drift_baseline_path, saved_model_bundle_dir=saved_model_bundle_dir)
             return model_pusher_artifact
         except  Exception as e:
             raise SensorException(e, sys)
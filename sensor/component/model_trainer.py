@@ -1,13 +1,17 @@
 import os,sys
-from xgboost import XGBClassifier
+from dataclasses import asdict
+import numpy as np
+from sklearn.model_selection import train_test_split
 
 from sensor.utils.main_utils import load_numpy_array_data
 from sensor.exception import SensorException
 from sensor.logger import logging
 from sensor.entity.artifact_entity import DataTransformationArtifact,ModelTrainerArtifact
 from sensor.entity.config_entity import ModelTrainerConfig
-from sensor.ml.metric.classification_metric import get_classification_score
 from sensor.ml.model.estimator import SensorModel
+from sensor.ml.model.hyperparameter_search import SuccessiveHalvingSearch
+from sensor.ml.model.training_engine import XGBoostTrainingEngine, NumpyChunkIter
+from sensor.ml.model.model_bundle import ModelBundle
 from sensor.utils.main_utils import save_object,load_object
 
 class ModelTrainer:
@@ -20,48 +24,109 @@ class ModelTrainer:
         except Exception as e:
             raise SensorException(e,sys)
 
-    def perform_hyper_paramter_tunig(self):...
-    
+    def perform_hyper_paramter_tunig(self, y_train:np.ndarray):
+        """
+        Successive halving search on a validation split of the transformed train data
+        return: best parameters with the number of boosting rounds, leaderboard
+        """
+        try:
+            config = self.model_trainer_config
+            train_index, valid_index = train_test_split(
+                np.arange(len(y_train)), test_size=config.validation_split_ratio,
+                random_state=config.random_state, stratify=y_train)
+            search = SuccessiveHalvingSearch(
+                search_space=config.search_space, n_configs=config.search_n_configs,
+                min_estimators=config.search_min_estimators, max_estimators=config.search_max_estimators,
+                eta=config.search_eta, early_stopping_rounds=config.early_stopping_rounds,
+                n_threads=config.trial_n_threads, time_budget_seconds=config.search_time_budget_seconds,
+                random_state=config.random_state,
+                fixed_params={"scale_pos_weight": self.data_transformation_artifact.scale_pos_weight,
+                              "tree_method": config.tree_method, "max_bin": config.max_bin})
+            best_trial = search.search(self.data_transformation_artifact.transformed_train_file_path,
+                                       self.data_transformation_artifact.transformed_train_label_file_path,
+                                       train_index, valid_index)
+            leaderboard = search.leaderboard[:config.leaderboard_size]
+            if best_trial is None:
+                logging.info("No hyper parameter search trial completed, using default parameters")
+                return {}, leaderboard
+            best_params = dict(best_trial["params"], n_estimators=best_trial["best_iteration"] + 1)
+            return best_params, leaderboard
+        except Exception as e:
+            raise SensorException(e,sys)
+
+    def get_training_engine(self, params:dict=None)->XGBoostTrainingEngine:
+        config = self.model_trainer_config
+        # weights the positive class when the data was not resampled
+        params = dict({"scale_pos_weight": self.data_transformation_artifact.scale_pos_weight}, **(params or {}))
+        return XGBoostTrainingEngine(params, tree_method=config.tree_method, n_threads=config.n_threads,
+                                     max_bin=config.max_bin, num_boost_round=config.max_boost_round,
+                                     early_stopping_rounds=config.early_stopping_rounds)
 
-    def train_model(self,x_train,y_train):
+    def train_model(self,x_train,y_train,x_test,y_test,params:dict=None):
+        """
+        return: fitted model, evaluation log of the train and test data, training seconds
+        """
         try:
-            xgb_clf = XGBClassifier()
-            xgb_clf.fit(x_train,y_train)
-            return xgb_clf
+            return self.get_training_engine(params).train(x_train, y_train, x_test, y_test)
         except Exception as e:
             raise e
+
+    def train_model_out_of_core(self):
+        """
+        Train on the transformed data parts, read one at a time by xgboost
+        return: same as train_model
+        """
+        try:
+            artifact = self.data_transformation_artifact
+            get_part_file_paths = lambda dir_path: [os.path.join(dir_path, file_name)
+                                                    for file_name in sorted(os.listdir(dir_path))]
+            cache_dir = self.model_trainer_config.external_memory_cache_dir
+            os.makedirs(cache_dir, exist_ok=True)
+            train_iter = NumpyChunkIter(get_part_file_paths(artifact.transformed_train_file_path),
+                                        get_part_file_paths(artifact.transformed_train_label_file_path),
+                                        cache_prefix=os.path.join(cache_dir, "train"))
+            test_iter = NumpyChunkIter(get_part_file_paths(artifact.transformed_test_file_path),
+                                       get_part_file_paths(artifact.transformed_test_label_file_path),
+                                       cache_prefix=os.path.join(cache_dir, "test"))
+            return self.get_training_engine().train_from_iterators(train_iter, test_iter)
+        except Exception as e:
+            raise SensorException(e,sys)
     
     def initiate_model_trainer(self)->ModelTrainerArtifact:
         try:
-            logging.info("Load train and test array and split into input and target features")
             train_file_path = self.data_transformation_artifact.transformed_train_file_path
             test_file_path = self.data_transformation_artifact.transformed_test_file_path
 
-            #loading training array and testing array
-            train_arr = load_numpy_array_data(train_file_path)
-            test_arr = load_numpy_array_data(test_file_path)
-
-            x_train, y_train, x_test, y_test = (
-                train_arr[:, :-1],
-                train_arr[:, -1],
-                test_arr[:, :-1],
-                test_arr[:, -1],
-            )            
+            if os.path.isdir(train_file_path):
+                # the search loads the whole train data in every worker, out-of-core runs train with the
+                # configured parameters
+                logging.info("Train the model out-of-core")
+                best_params, leaderboard = {}, []
+                model, evals_result, training_time = self.train_model_out_of_core()
+            else:
+                logging.info("Memory-map train and test features and labels")
+                x_train, y_train, x_test, y_test = (
+                    load_numpy_array_data(train_file_path, mmap_mode="r"),
+                    load_numpy_array_data(self.data_transformation_artifact.transformed_train_label_file_path, mmap_mode="r"),
+                    load_numpy_array_data(test_file_path, mmap_mode="r"),
+                    load_numpy_array_data(self.data_transformation_artifact.transformed_test_label_file_path, mmap_mode="r"),
+                )
 
-            logging.info("Train the model")
-            model = self.train_model(x_train, y_train)
-            y_train_pred = model.predict(x_train)
-            logging.info("Get train metric")
-            classification_train_metric =  get_classification_score(y_true=y_train, y_pred=y_train_pred)            
+                logging.info("Search hyper parameters")
+                best_params, leaderboard = self.perform_hyper_paramter_tunig(y_train)
+                logging.info("Train the model with %s", best_params)
+                model, evals_result, training_time = self.train_model(x_train, y_train, x_test, y_test, best_params)
+            best_iteration = model.get_booster().best_iteration
+            logging.info("Get train metric from the evaluation log")
+            classification_train_metric = XGBoostTrainingEngine.get_metric_artifact(evals_result, "train", best_iteration)
 
             if classification_train_metric.f1_score<=self.model_trainer_config.expected_accuracy:
                 raise Exception("Trained model is not good to provide expected accuracy")
             else:
-                logging.info(f"Model accuracy {classification_train_metric.f1_score} is greater than expected accuracy {self.model_trainer_config.expected_accuracy}")
+                logging.info("Model accuracy %s is greater than expected accuracy %s", classification_train_metric.f1_score, self.model_trainer_config.expected_accuracy)
             
-            logging.info("Get test metric")
-            y_test_pred = model.predict(x_test)
-            classification_test_metric = get_classification_score(y_true=y_test, y_pred=y_test_pred)
+            logging.info("Get test metric from the evaluation log")
+            classification_test_metric = XGBoostTrainingEngine.get_metric_artifact(evals_result, "eval", best_iteration)
 
 
             logging.info("Check for over fitting/underfitting")
@@ -71,7 +136,7 @@ class ModelTrainer:
             if diff>self.model_trainer_config.overfitting_underfitting_threshold:
                 raise Exception("Model is not good try to do more experimentation.")
             else:
-                logging.info(f"Model is good to go with accuracy difference of {round(diff*100,2)}%")
+                logging.info("Model is good to go with accuracy difference of %s%%", round(diff*100,2))
 
             preprocessor = load_object(file_path=self.data_transformation_artifact.transformed_object_file_path)
             
@@ -81,12 +146,19 @@ class ModelTrainer:
             logging.info("Create SensorModel by combining train and transformation model")
             sensor_model = SensorModel(preprocessor=preprocessor,model=model)
             save_object(self.model_trainer_config.trained_model_file_path, obj=sensor_model)
+            logging.info("Save native model bundle")
+            is_bundle_saved = ModelBundle.save(self.model_trainer_config.trained_model_bundle_dir, sensor_model,
+            metrics={"train": asdict(classification_train_metric), "test": asdict(classification_test_metric)})
 
             #model trainer artifact
 
             model_trainer_artifact = ModelTrainerArtifact(trained_model_file_path=self.model_trainer_config.trained_model_file_path, 
             train_metric_artifact=classification_train_metric,
-            test_metric_artifact=classification_test_metric)
+            test_metric_artifact=classification_test_metric,
+            trained_model_bundle_dir=self.model_trainer_config.trained_model_bundle_dir if is_bundle_saved else None,
+            best_params=best_params,
+            leaderboard=leaderboard,
+            training_time=training_time)
             return model_trainer_artifact
         except Exception as e:
             raise SensorException(e,sys)
\ No newline at end of file
@@ -1,31 +1,43 @@
-from sensor.constant.prediction_pipeline import SCHEMA_FILE_PATH
-from sensor.constant.training_pipeline import ARTIFACT_DIR, DATA_INGESTION_DIR_NAME, DATA_INGESTION_INGESTED_DIR, TRAIN_FILE_NAME, TARGET_COLUMN
+from sensor.constant.prediction_pipeline import SCHEMA_FILE_PATH, SAVED_MODEL_DIR
+from sensor.constant.training_pipeline import ARTIFACT_DIR, DATA_INGESTION_DIR_NAME, DATA_INGESTION_INGESTED_DIR, TRAIN_FILE_NAME, TRAIN_DATA_NAME, DRIFT_DETECTION_N_JOBS
 from sensor.exception import SensorException
 from sensor.logger import logging
 from sensor.utils.main_utils import read_yaml_file,write_yaml_file
 from sensor.utils.s3_utils import sync_artifact_dir_from_s3
 from sensor.entity.config_entity import PredictionPipelineConfig
+from sensor.ml.drift.drift_baseline import DriftBaseline
+from sensor.ml.drift.ks_drift import get_drift_report
+from sensor.data_access.feature_store import read_dataframe
+from sensor.ml.model.estimator import ModelResolver
 
-from scipy.stats import ks_2samp
 from distutils import dir_util
 import pandas as pd
 import os,sys
+import threading
 
 class PredictionDataValidation:
+    # baselines built from the training data for models saved without one, by model baseline path
+    _fallback_baselines = {}
+    _fallback_lock = threading.Lock()
 
-    def __init__(self, input_df, prediction_pipeline_config: PredictionPipelineConfig):
+    def __init__(self, input_df, prediction_pipeline_config: PredictionPipelineConfig, schema_config:dict=None,
+                 model_timestamp=None):
+        """
+        model_timestamp: saved_models/<timestamp> of the model scoring the data, the latest saved model when None
+        """
         try:
             self.prediction_pipeline_config = prediction_pipeline_config
-            self._schema_config = read_yaml_file(SCHEMA_FILE_PATH)
+            self._schema_config = schema_config if schema_config is not None else read_yaml_file(SCHEMA_FILE_PATH)
             self.input_df = input_df
+            self.model_timestamp = model_timestamp
         except Exception as e:
             raise  SensorException(e,sys)
     
     def validate_number_of_columns(self,dataframe:pd.DataFrame)->bool:
         try:
             number_of_columns = len(self._schema_config["columns"]) - 1 # subtract target feature column in prediction pipeline
-            logging.info(f"Required number of columns: {number_of_columns}")
-            logging.info(f"Data frame has columns: {len(dataframe.columns)}")
+            logging.info("Required number of columns: %s", number_of_columns)
+            logging.info("Data frame has columns: %s", len(dataframe.columns))
             if len(dataframe.columns)==number_of_columns:
                 return True
             return False
@@ -44,34 +56,17 @@ class PredictionDataValidation:
                     numerical_column_present=False
                     missing_numerical_columns.append(num_column)
             
-            logging.info(f"Missing numerical columns: [{missing_numerical_columns}]")
+            logging.info("Missing numerical columns: [%s]", tuple(missing_numerical_columns))
             return numerical_column_present
         except Exception as e:
             raise SensorException(e,sys)      
 
-    def detect_dataset_drift(self,base_df,current_df,threshold=0.05)->bool:
+    def detect_dataset_drift(self,drift_baseline:DriftBaseline,current_df,threshold=0.05)->bool:
         logging.info("Checking for data drift")
         try:
-            status=False
-            report = {}
-            data_drift_columns = []
-            base_data_columns = list(base_df.columns)
-            base_data_columns.remove(TARGET_COLUMN)
-            for column in base_data_columns:
-                d1 = base_df[column]
-                d2  = current_df[column]
-                is_same_dist = ks_2samp(d1,d2)
-                if threshold<=is_same_dist.pvalue:
-                    is_found=False
-                else:
-                    is_found = True 
-                    data_drift_columns.append(column)
-                    status=True
-                report.update({column:{
-                    "p_value":float(is_same_dist.pvalue),
-                    "drift_status":is_found                    
-                    }})
-            
+            _, p_values = drift_baseline.ks_test(current_df, n_jobs=DRIFT_DETECTION_N_JOBS)
+            status, report, data_drift_columns = get_drift_report(drift_baseline.columns, p_values, threshold)
+
             drift_report_file_path = self.prediction_pipeline_config.drift_report_file_path
             
             #Create directory
@@ -79,7 +74,7 @@ class PredictionDataValidation:
             os.makedirs(dir_path,exist_ok=True)
             write_yaml_file(file_path=drift_report_file_path,content=report,)
 
-            logging.info(f"Data drift: {status}, Data drift columns: {data_drift_columns}. Report generated at {drift_report_file_path}")
+            logging.info("Data drift: %s, Data drift columns: %s. Report generated at %s", status, tuple(data_drift_columns), drift_report_file_path)
             return status
         except Exception as e:
             raise SensorException(e,sys)
@@ -90,12 +85,38 @@ class PredictionDataValidation:
             artifact_list.sort(reverse=True)
             latest_artifact_dir = artifact_list[0]
             latest_artifact_dir_path = os.path.join(ARTIFACT_DIR, latest_artifact_dir)
-            train_file = os.path.join(latest_artifact_dir_path, DATA_INGESTION_DIR_NAME, DATA_INGESTION_INGESTED_DIR, TRAIN_FILE_NAME)
-            return pd.read_csv(train_file)
+            ingested_dir = os.path.join(latest_artifact_dir_path, DATA_INGESTION_DIR_NAME, DATA_INGESTION_INGESTED_DIR)
+            train_file = os.path.join(ingested_dir, TRAIN_DATA_NAME)
+            if not os.path.exists(train_file):
+                train_file = os.path.join(ingested_dir, TRAIN_FILE_NAME)
+            return read_dataframe(train_file, self._schema_config)
         except Exception as e:
             raise SensorException(e,sys)   
 
-    def initiate_data_validation(self):
+    def get_drift_baseline(self)->DriftBaseline:
+        """
+        Drift baseline saved next to the model scoring the data, loaded once per process.
+        Models pushed before baselines existed fall back to a baseline of the latest training
+        data built once per model and kept in memory.
+        """
+        try:
+            model_resolver = ModelResolver(model_dir=SAVED_MODEL_DIR)
+            if self.model_timestamp is None:
+                drift_baseline_path = model_resolver.get_latest_drift_baseline_path()
+            else:
+                drift_baseline_path = model_resolver.get_drift_baseline_path(self.model_timestamp)
+            if os.path.exists(drift_baseline_path):
+                return DriftBaseline.load(drift_baseline_path)
+            with PredictionDataValidation._fallback_lock:
+                if drift_baseline_path not in PredictionDataValidation._fallback_baselines:
+                    logging.info("Drift baseline not found at %s. Building it from latest training data", drift_baseline_path)
+                    PredictionDataValidation._fallback_baselines[drift_baseline_path] = DriftBaseline.from_dataframe(
+                        self.get_base_dataframe(), self._schema_config["numerical_columns"])
+                return PredictionDataValidation._fallback_baselines[drift_baseline_path]
+        except Exception as e:
+            raise SensorException(e,sys)
+
+    def initiate_data_validation(self, check_drift:bool=True):
         try:
             error_message = ""
             
@@ -112,9 +133,12 @@ class PredictionDataValidation:
                 error_message=f"{error_message}Input dataframe does not contain all numerical columns.\n"
             
             if len(error_message)>0:
-                raise SensorException(error_message)
+                raise Exception(error_message)
+            if not check_drift:
+                # schema checks only, nothing is written for in-memory batches
+                return True
             # Check data drift
-            status = self.detect_dataset_drift(base_df=self.get_base_dataframe(),current_df=self.input_df)                       
+            status = self.detect_dataset_drift(drift_baseline=self.get_drift_baseline(),current_df=self.input_df)                       
             return status
         except Exception as e:
             raise SensorException(e,sys)
\ No newline at end of file
@@ -1,2 +1,4 @@
 DATABASE_NAME = "ineuron"
-COLLECTION_NAME = "sensor"
\ No newline at end of file
+COLLECTION_NAME = "sensor"
+# documents fetched per round trip when exporting a collection
+MONGO_CURSOR_BATCH_SIZE = 10000
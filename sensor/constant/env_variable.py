@@ -1,4 +1,9 @@
 MONGODB_URL_KEY = "MONGO_DB_URL"
 AWS_ACCESS_KEY_ID_ENV_KEY = "AWS_ACCESS_KEY_ID"
 AWS_SECRET_ACCESS_KEY_ENV_KEY = "AWS_SECRET_ACCESS_KEY"
-REGION_NAME = "us-east-1"
\ No newline at end of file
+REGION_NAME = "us-east-1"
+# set to "true" to enable micro batching of concurrent prediction requests
+MICRO_BATCHING_ENV_KEY = "SENSOR_MICRO_BATCHING"
+# logging: "json" for JSON lines instead of text, and the log level
+LOG_FORMAT_ENV_KEY = "SENSOR_LOG_FORMAT"
+LOG_LEVEL_ENV_KEY = "SENSOR_LOG_LEVEL"
@@ -5,4 +5,14 @@ PREDICTION_ARTIFACT_DIR: str = "prediction_artifact"
 PREDICTION_INPUT_FOLDER = "input"
 PREDICTION_OUTPUT_FOLDER = "output"
 PREDICTION_DRIFT_REPORT_FOLDER = "drift-report"
-PREDICTION_DRIFT_REPORT_NAME = "report.yaml"
\ No newline at end of file
+PREDICTION_DRIFT_REPORT_NAME = "report.yaml"
+# seconds between checks for a newer saved model by the resident model cache
+MODEL_CACHE_REFRESH_INTERVAL_SECONDS: int = 300
+
+# streaming prediction: rows per chunk and the input size from which it is used
+PREDICTION_CHUNK_SIZE: int = 50000
+PREDICTION_STREAMING_THRESHOLD_BYTES: int = 100 * 1024 * 1024
+
+# micro batching of concurrent in-body prediction requests
+MICRO_BATCH_MAX_SIZE: int = 4096
+MICRO_BATCH_MAX_WAIT_MS: float = 5
@@ -1,2 +1,17 @@
 TRAINING_BUCKET_NAME = "sensor-training"
 PREDICTION_BUCKET_NAME = "sensor-prediction"
+
+S3_SYNC_MANIFEST_DIR = "s3_sync_manifest"
+S3_SYNC_MAX_WORKERS = 8
+S3_MULTIPART_THRESHOLD = 8 * 1024 * 1024
+S3_MULTIPART_CHUNKSIZE = 8 * 1024 * 1024
+S3_MULTIPART_MAX_CONCURRENCY = 4
+
+# background upload queue of artifact folders
+S3_UPLOAD_QUEUE_DIR = "s3_upload_queue"
+S3_UPLOAD_QUEUE_MAX_CONCURRENCY = 2
+S3_UPLOAD_QUEUE_MAX_ATTEMPTS = 8
+S3_UPLOAD_QUEUE_RETRY_BASE_SECONDS = 5
+S3_UPLOAD_QUEUE_SCAN_INTERVAL_SECONDS = 10
+# processes exiting after queueing uploads wait at most this long for them
+S3_UPLOAD_QUEUE_DRAIN_TIMEOUT_SECONDS = 900
@@ -12,12 +12,31 @@ FILE_NAME: str = "sensor.csv"
 TRAIN_FILE_NAME: str = "train.csv"
 TEST_FILE_NAME: str = "test.csv"
 
+# columnar feature store directories handed between the training stages
+FEATURE_STORE_NAME: str = "sensor"
+TRAIN_DATA_NAME: str = "train"
+TEST_DATA_NAME: str = "test"
+FEATURE_STORE_MANIFEST_FILE_NAME: str = "manifest.yaml"
+FEATURE_STORE_FORMAT_VERSION: int = 1
+
 PREPROCSSING_OBJECT_FILE_NAME = "preprocessing.pkl"
 MODEL_FILE_NAME = "model.pkl"
+
+# native model bundle written next to model.pkl
+MODEL_BUNDLE_DIR_NAME = "model_bundle"
+MODEL_BUNDLE_MANIFEST_FILE_NAME = "manifest.yaml"
+MODEL_BUNDLE_BOOSTER_FILE_NAME = "booster.ubj"
+MODEL_BUNDLE_PREPROCESSOR_FILE_NAME = "preprocessor.npz"
+MODEL_BUNDLE_FORMAT_VERSION = 1
 SCHEMA_FILE_PATH = os.path.join("config", "schema.yaml")
 SCHEMA_DROP_COLS = "drop_columns"
 
 
+# training stages running concurrently when they do not depend on each other
+TRAINING_PIPELINE_MAX_WORKERS: int = 4
+TRAINING_PIPELINE_REPORT_FILE_NAME: str = "pipeline_report.yaml"
+ARTIFACT_SYNC_STAGE_NAME: str = "artifact_sync"
+
 """
 Data Ingestion related constant start with DATA_INGESTION VAR NAME
 """
@@ -26,6 +45,16 @@ DATA_INGESTION_DIR_NAME: str = "data_ingestion"
 DATA_INGESTION_FEATURE_STORE_DIR: str = "feature_store"
 DATA_INGESTION_INGESTED_DIR: str = "ingested"
 DATA_INGESTION_TRAIN_TEST_SPLIT_RATIO: float = 0.2
+DATA_INGESTION_RANDOM_STATE: int = 42
+# rows of each part of the train and test feature stores, the chunks of out-of-core training
+DATA_INGESTION_ROWS_PER_PART: int = 100000
+DATA_INGESTION_N_PARTITIONS: int = 8
+DATA_INGESTION_N_WORKERS: int = 4
+# feature store snapshot kept across runs, only new documents are fetched from mongo db
+DATA_INGESTION_SNAPSHOT_DIR: str = "feature_store_snapshot"
+DATA_INGESTION_SNAPSHOT_MAX_PARTS: int = 64
+# the snapshot is rebuilt from scratch when its last full export is older than this
+DATA_INGESTION_SNAPSHOT_FULL_REFRESH_DAYS: int = 7
 
 """
 Data Validation realted contant start with DATA_VALIDATION VAR NAME
@@ -35,7 +64,11 @@ DATA_VALIDATION_DIR_NAME: str = "data_validation"
 DATA_VALIDATION_VALID_DIR: str = "validated"
 DATA_VALIDATION_INVALID_DIR: str = "invalid"
 DATA_VALIDATION_DRIFT_REPORT_DIR: str = "drift_report"
+DATA_DRIFT_STAGE_NAME: str = "data_drift"
 DATA_VALIDATION_DRIFT_REPORT_FILE_NAME: str = "report.yaml"
+DRIFT_BASELINE_FILE_NAME: str = "drift_baseline.npz"
+DRIFT_BASELINE_SAMPLE_SIZE: int = 2000
+DRIFT_DETECTION_N_JOBS: int = 4
 
 """
 Data Transformation ralated constant start with DATA_TRANSFORMATION VAR NAME
@@ -44,6 +77,23 @@ Data Transformation ralated constant start with DATA_TRANSFORMATION VAR NAME
 DATA_TRANSFORMATION_DIR_NAME: str = "data_transformation"
 DATA_TRANSFORMATION_TRANSFORMED_DATA_DIR: str = "transformed"
 DATA_TRANSFORMATION_TRANSFORMED_OBJECT_DIR: str = "transformed_object"
+# transformed data is stored as float32 features and int8 labels in separate arrays
+DATA_TRANSFORMATION_FEATURES_NAME: str = "features"
+DATA_TRANSFORMATION_LABELS_NAME: str = "labels"
+DATA_TRANSFORMATION_RANDOM_STATE: int = 42
+# one of smote_tomek, smote, undersample, class_weight
+DATA_TRANSFORMATION_BALANCING_STRATEGY: str = "smote_tomek"
+DATA_TRANSFORMATION_RESAMPLE_TEST: bool = True
+DATA_TRANSFORMATION_SMOTE_K_NEIGHBORS: int = 5
+DATA_TRANSFORMATION_NEIGHBORS_ALGORITHM: str = "kd_tree"
+DATA_TRANSFORMATION_N_JOBS: int = 4
+DATA_TRANSFORMATION_BENCHMARK_REPORT_NAME: str = "balancing_benchmark.yaml"
+# time and score every balancing strategy during the transformation, written to the benchmark report
+DATA_TRANSFORMATION_BENCHMARK_BALANCING: bool = False
+# out-of-core mode: preprocessor fitted on a uniform row sample, data transformed part by part,
+# classes balanced through scale_pos_weight
+DATA_TRANSFORMATION_OUT_OF_CORE: bool = False
+DATA_TRANSFORMATION_FIT_SAMPLE_SIZE: int = 50000
 
 """
 Model Trainer ralated constant start with MODE TRAINER VAR NAME
@@ -54,10 +104,50 @@ MODEL_TRAINER_TRAINED_MODEL_DIR: str = "trained_model"
 MODEL_TRAINER_TRAINED_MODEL_NAME: str = "model.pkl"
 MODEL_TRAINER_EXPECTED_SCORE: float = 0.6
 MODEL_TRAINER_OVER_FIITING_UNDER_FITTING_THRESHOLD: float = 0.05
+# successive halving hyper parameter search, each parameter is sampled from its list of values
+MODEL_TRAINER_SEARCH_SPACE: dict = {
+    "max_depth": [3, 4, 5, 6, 8],
+    "learning_rate": [0.03, 0.05, 0.1, 0.2, 0.3],
+    "subsample": [0.6, 0.8, 1.0],
+    "colsample_bytree": [0.6, 0.8, 1.0],
+    "min_child_weight": [1, 3, 5],
+    "reg_lambda": [0.5, 1.0, 2.0, 5.0],
+}
+MODEL_TRAINER_SEARCH_N_CONFIGS: int = 27
+MODEL_TRAINER_SEARCH_MIN_ESTIMATORS: int = 30
+MODEL_TRAINER_SEARCH_MAX_ESTIMATORS: int = 270
+MODEL_TRAINER_SEARCH_ETA: int = 3
+MODEL_TRAINER_SEARCH_TIME_BUDGET_SECONDS: int = 1800
+MODEL_TRAINER_TRIAL_N_THREADS: int = 2
+MODEL_TRAINER_EARLY_STOPPING_ROUNDS: int = 20
+MODEL_TRAINER_VALIDATION_SPLIT_RATIO: float = 0.2
+MODEL_TRAINER_RANDOM_STATE: int = 42
+MODEL_TRAINER_LEADERBOARD_SIZE: int = 10
+# training engine of the final model
+MODEL_TRAINER_TREE_METHOD: str = "hist"
+MODEL_TRAINER_MAX_BIN: int = 256
+MODEL_TRAINER_N_THREADS: int = os.cpu_count() or 1
+MODEL_TRAINER_MAX_BOOST_ROUND: int = 1000
+MODEL_TRAINER_EXTERNAL_MEMORY_CACHE_DIR: str = "xgboost_cache"
 
 MODEL_EVALUATION_DIR_NAME: str = "model_evaluation"
 MODEL_EVALUATION_CHANGED_THRESHOLD_SCORE: float = 0.02
 MODEL_EVALUATION_REPORT_NAME= "report.yaml"
+# predictions and metrics of the saved models, kept across training runs
+EVALUATION_CACHE_DIR: str = "evaluation_cache"
 
 MODEL_PUSHER_DIR_NAME = "model_pusher"
 MODEL_PUSHER_SAVED_MODEL_DIR = SAVED_MODEL_DIR
+
+"""
+Training job related constant start with TRAINING_JOB VAR NAME
+"""
+TRAINING_JOB_DIR: str = "training_jobs"
+TRAINING_JOB_LOCK_FILE_NAME: str = "training.lock"
+
+"""
+Stage cache related constant start with STAGE_CACHE VAR NAME
+"""
+STAGE_CACHE_DIR: str = "stage_cache"
+# bump to invalidate every cached stage when the stage code changes its outputs
+STAGE_CACHE_VERSION: int = 8
@@ -0,0 +1,200 @@
+import os, sys
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from sensor.constant.training_pipeline import (SCHEMA_FILE_PATH, FEATURE_STORE_MANIFEST_FILE_NAME,
+    FEATURE_STORE_FORMAT_VERSION)
+from sensor.exception import SensorException
+from sensor.logger import logging
+from sensor.utils.main_utils import read_yaml_file, write_yaml_file
+
+# largest integer below which every integer is exactly representable as float32
+FLOAT32_EXACT_INT_LIMIT = 2 ** 24
+
+
+class FeatureStore:
+    """
+    Columnar store of a dataframe in a directory:
+        manifest.yaml              columns, their schema type and the list of parts
+        part-00000/<column>.npy    one typed array per column and per part
+    Column types come from config/schema.yaml. "int" columns are kept as float32 when every value
+    is exactly representable, else float64, missing values being NaN. "category" columns are kept
+    as integer codes with the categories of the part in <column>.categories.npy.
+    """
+
+    def __init__(self, dir_path:str, schema_config:dict=None):
+        try:
+            self.dir_path = dir_path
+            self._schema_config = schema_config if schema_config is not None else read_yaml_file(SCHEMA_FILE_PATH)
+            self.column_types = {name: column_type
+                                 for column in self._schema_config["columns"] for name, column_type in column.items()}
+        except Exception as e:
+            raise SensorException(e, sys)
+
+    @property
+    def manifest_file_path(self)->str:
+        return os.path.join(self.dir_path, FEATURE_STORE_MANIFEST_FILE_NAME)
+
+    def exists(self)->bool:
+        return os.path.exists(self.manifest_file_path)
+
+    def get_manifest(self)->dict:
+        try:
+            return read_yaml_file(self.manifest_file_path)
+        except Exception as e:
+            raise SensorException(e, sys)
+
+    def get_column_type(self, column:str, series:pd.Series)->str:
+        """
+        Schema type of the column, columns missing from the schema are numeric when they can be parsed as numbers
+        """
+        if column in self.column_types:
+            return self.column_types[column]
+        try:
+            pd.to_numeric(series)
+            return "float"
+        except (ValueError, TypeError):
+            return "category"
+
+    def write_part(self, part_index:int, dataframe:pd.DataFrame)->dict:
+        """
+        Write one part of the store. Parts only become visible once listed by commit()
+        return: part entry for commit()
+        """
+        try:
+            part_name = f"part-{part_index:05d}"
+            part_dir = os.path.join(self.dir_path, part_name)
+            if os.path.exists(part_dir):
+                shutil.rmtree(part_dir)
+            os.makedirs(part_dir, exist_ok=True)
+            for column in dataframe.columns:
+                series = dataframe[column]
+                column_file_path = os.path.join(part_dir, f"{column}.npy")
+                if self.get_column_type(column, series) == "category":
+                    codes, categories = pd.factorize(series, sort=True)
+                    np.save(column_file_path, codes.astype(np.min_scalar_type(-max(len(categories), 1))))
+                    np.save(os.path.join(part_dir, f"{column}.categories.npy"), np.asarray(categories, dtype=str))
+                else:
+                    values = pd.to_numeric(series).to_numpy(dtype=np.float64)
+                    finite_values = values[np.isfinite(values)]
+                    if (np.all(finite_values == np.round(finite_values))
+                            and np.all(np.abs(finite_values) <= FLOAT32_EXACT_INT_LIMIT)):
+                        values = values.astype(np.float32)
+                    np.save(column_file_path, values)
+            return {"name": part_name, "rows": len(dataframe)}
+        except Exception as e:
+            raise SensorException(e, sys)
+
+    def commit(self, parts:list, columns:list, metadata:dict=None):
+        """
+        Publish the manifest listing the parts of the store, in order
+        metadata: free form information published together with the parts
+        """
+        try:
+            manifest = {
+                "format_version": FEATURE_STORE_FORMAT_VERSION,
+                "columns": [{"name": column, "type": self.column_types.get(column)} for column in columns],
+                "parts": parts,
+                "rows": int(sum([part["rows"] for part in parts])),
+                "metadata": metadata or {},
+            }
+            tmp_file_path = f"{self.manifest_file_path}.tmp"
+            write_yaml_file(tmp_file_path, manifest)
+            os.replace(tmp_file_path, self.manifest_file_path)
+        except Exception as e:
+            raise SensorException(e, sys)
+
+    def reset(self):
+        """
+        Remove every part of the store
+        """
+        try:
+            if os.path.exists(self.dir_path):
+                shutil.rmtree(self.dir_path)
+            os.makedirs(self.dir_path, exist_ok=True)
+        except Exception as e:
+            raise SensorException(e, sys)
+
+    def write(self, dataframe:pd.DataFrame, rows_per_part:int=None, metadata:dict=None):
+        """
+        Replace the content of the store with the dataframe
+        """
+        try:
+            self.reset()
+            rows_per_part = rows_per_part or max(len(dataframe), 1)
+            parts = [self.write_part(part_index, dataframe.iloc[start:start + rows_per_part])
+                     for part_index, start in enumerate(range(0, max(len(dataframe), 1), rows_per_part))]
+            self.commit(parts, list(dataframe.columns), metadata)
+            logging.info("Feature store written at %s with %s rows in %s parts", self.dir_path, len(dataframe), len(parts))
+        except Exception as e:
+            raise SensorException(e, sys)
+
+    def append(self, dataframe:pd.DataFrame):
+        """
+        Add the dataframe as a new part of the store
+        """
+        try:
+            if not self.exists():
+                self.write(dataframe)
+                return
+            manifest = self.get_manifest()
+            columns = [column["name"] for column in manifest["columns"]]
+            part = self.write_part(len(manifest["parts"]), dataframe[columns])
+            self.commit(manifest["parts"] + [part], columns, manifest.get("metadata"))
+            logging.info("Appended %s rows to feature store %s", len(dataframe), self.dir_path)
+        except Exception as e:
+            raise SensorException(e, sys)
+
+    def read_part(self, part_name:str, columns:list=None, mmap_mode:str=None)->pd.DataFrame:
+        try:
+            manifest_columns = [column["name"] for column in self.get_manifest()["columns"]]
+            return self._read_part(part_name, columns or manifest_columns, mmap_mode)
+        except Exception as e:
+            raise SensorException(e, sys)
+
+    def _read_part(self, part_name:str, columns:list, mmap_mode:str=None)->pd.DataFrame:
+        part_dir = os.path.join(self.dir_path, part_name)
+        data = {}
+        for column in columns:
+            values = np.load(os.path.join(part_dir, f"{column}.npy"), mmap_mode=mmap_mode)
+            categories_file_path = os.path.join(part_dir, f"{column}.categories.npy")
+            if os.path.exists(categories_file_path):
+                categories = np.load(categories_file_path)
+                values = pd.Categorical.from_codes(values, categories.astype(object)).astype(object)
+            data[column] = values
+        return pd.DataFrame(data, columns=columns)
+
+    def iter_parts(self, columns:list=None, mmap_mode:str=None):
+        """
+        Yield the parts of the store one dataframe at a time
+        """
+        try:
+            manifest = self.get_manifest()
+            columns = columns or [column["name"] for column in manifest["columns"]]
+            for part in manifest["parts"]:
+                yield self._read_part(part["name"], columns, mmap_mode)
+        except Exception as e:
+            raise SensorException(e, sys)
+
+    def read(self, columns:list=None)->pd.DataFrame:
+        try:
+            parts = list(self.iter_parts(columns))
+            if len(parts) == 1:
+                return parts[0]
+            return pd.concat(parts, ignore_index=True)
+        except Exception as e:
+            raise SensorException(e, sys)
+
+
+def read_dataframe(file_path:str, schema_config:dict=None)->pd.DataFrame:
+    """
+    Read a feature store directory, or a csv file written by earlier versions of the pipeline
+    """
+    try:
+        if os.path.isdir(file_path):
+            return FeatureStore(file_path, schema_config).read()
+        return pd.read_csv(file_path)
+    except Exception as e:
+        raise SensorException(e, sys)
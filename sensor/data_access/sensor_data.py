@@ -3,10 +3,14 @@ from typing import Optional
 
 import numpy as np
 import pandas as pd
+from bson import ObjectId
 
 from sensor.configuration.mongodb_db_connection import MongoDBClient
-from sensor.constant.database import DATABASE_NAME
+from sensor.constant.database import DATABASE_NAME, MONGO_CURSOR_BATCH_SIZE
+from sensor.constant.training_pipeline import SCHEMA_FILE_PATH
 from sensor.exception import SensorException
+from sensor.logger import logging
+from sensor.utils.main_utils import read_yaml_file
 
 
 class SensorData:
@@ -18,28 +22,143 @@ class SensorData:
         """
         try:
             self.mongo_client = MongoDBClient(database_name=DATABASE_NAME)
+            self._schema_config = read_yaml_file(SCHEMA_FILE_PATH)
         except Exception as e:
             raise SensorException(e, sys)
 
+    def get_collection(self, collection_name: str, database_name: Optional[str] = None):
+        if database_name is None:
+            return self.mongo_client.database[collection_name]
+        return self.mongo_client.client[database_name][collection_name]
+
+    def get_projection(self) -> dict:
+        """
+        Server side projection leaving out _id and the schema drop columns
+        """
+        projection = {"_id": 0}
+        projection.update({column: 0 for column in self._schema_config["drop_columns"]})
+        return projection
+
+    def get_last_id(self, collection_name: str, database_name: Optional[str] = None):
+        """
+        Largest _id of the collection, None when the collection is empty
+        """
+        try:
+            collection = self.get_collection(collection_name, database_name)
+            last = collection.find_one({}, {"_id": 1}, sort=[("_id", -1)])
+            return None if last is None else last["_id"]
+        except Exception as e:
+            raise SensorException(e, sys)
+
+    def get_id_partitions(self, collection_name: str, n_partitions: int, after_id=None, until_id=None,
+                          database_name: Optional[str] = None) -> list:
+        """
+        Split the documents with after_id < _id <= until_id into contiguous _id ranges. ObjectIds
+        start with their creation time, so ranges interpolated between the smallest and the largest
+        _id split the collection by insertion time.
+        after_id: exclusive lower bound, None for no bound
+        until_id: inclusive upper bound, None for no bound
+        return: list of queries, one per range, in _id order. Empty when there is no such document.
+        """
+        try:
+            collection = self.get_collection(collection_name, database_name)
+            id_bounds = {}
+            if after_id is not None:
+                id_bounds["$gt"] = after_id
+            if until_id is not None:
+                id_bounds["$lte"] = until_id
+            query = {"_id": id_bounds} if id_bounds else {}
+            first = collection.find_one(query, {"_id": 1}, sort=[("_id", 1)])
+            last = collection.find_one(query, {"_id": 1}, sort=[("_id", -1)])
+            if first is None:
+                return []
+            if n_partitions <= 1 or not isinstance(first["_id"], ObjectId) or not isinstance(last["_id"], ObjectId):
+                return [query]
+            low = int.from_bytes(first["_id"].binary, "big")
+            high = int.from_bytes(last["_id"].binary, "big")
+            boundaries = sorted(set([low + (high - low) * i // n_partitions for i in range(n_partitions)]))
+            boundaries = [ObjectId(boundary.to_bytes(12, "big")) for boundary in boundaries]
+            queries = [{"_id": {"$gte": start, "$lt": end}} for start, end in zip(boundaries[:-1], boundaries[1:])]
+            queries.append({"_id": {"$gte": boundaries[-1], "$lte": last["_id"]}})
+            return queries
+        except Exception as e:
+            raise SensorException(e, sys)
+
+    @staticmethod
+    def iter_batches(cursor, batch_size: int):
+        batch = []
+        for document in cursor:
+            batch.append(document)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if len(batch) > 0:
+            yield batch
+
     def export_collection_as_dataframe(
-        self, collection_name: str, database_name: Optional[str] = None) -> pd.DataFrame:
+        self, collection_name: str, database_name: Optional[str] = None, query: Optional[dict] = None,
+        batch_size: int = MONGO_CURSOR_BATCH_SIZE, sort_by_id: bool = False) -> pd.DataFrame:
         try:
             """
-            export entire collectin as dataframe:
+            export collectin as dataframe, streaming the cursor batch by batch into
+            preallocated typed columns. "na" values, and any other value of a numerical
+            column which is not a number, are read as NaN.
+            The frame has the columns of the documents, like a frame built from the raw documents:
+            fields missing from the schema are kept as object columns and schema columns found in
+            no document are left out, so that the column validation still sees the mismatch.
+            query: optional filter on the documents to export
+            sort_by_id: return the documents in _id order
             return pd.DataFrame of collection
             """
-            if database_name is None:
-                collection = self.mongo_client.database[collection_name]
-            else:
-                collection = self.mongo_client[database_name][collection_name]
-            df = pd.DataFrame(list(collection.find()))
+            collection = self.get_collection(collection_name, database_name)
+            query = query or {}
+            columns = [(name, column_type) for column in self._schema_config["columns"]
+                       for name, column_type in column.items()]
+            projected_out = set(self.get_projection())
 
-            if "_id" in df.columns.to_list():
-                df = df.drop(columns=["_id"], axis=1)
+            capacity = collection.count_documents(query) if query else collection.estimated_document_count()
+            capacity = max(capacity, 1)
+            data = {name: np.empty(capacity, dtype=object if column_type == "category" else np.float64)
+                    for name, column_type in columns}
+            seen_fields = set()
 
-            df.replace({"na": np.nan}, inplace=True)
+            cursor = collection.find(query, self.get_projection(), batch_size=batch_size)
+            if sort_by_id:
+                cursor = cursor.sort("_id", 1)
+            n_rows = 0
+            for batch in self.iter_batches(cursor, batch_size):
+                start, end = n_rows, n_rows + len(batch)
+                if end > capacity:
+                    # documents inserted after counting
+                    capacity = max(end, 2 * capacity)
+                    for name in data:
+                        data[name] = np.resize(data[name], capacity)
+                for document in batch:
+                    seen_fields.update(document)
+                for name in seen_fields.difference(data).difference(projected_out):
+                    # field missing from the schema, NaN for the rows already read
+                    data[name] = np.full(capacity, np.nan, dtype=object)
+                    columns.append((name, "category"))
+                for name, _ in columns:
+                    values = [document.get(name) for document in batch]
+                    values = [np.nan if value is None or value == "na" else value for value in values]
+                    if data[name].dtype == np.float64:
+                        # values of numerical columns which are not numbers are read as NaN, like "na"
+                        data[name][start:end] = pd.to_numeric(pd.Series(values, dtype=object),
+                                                              errors="coerce").to_numpy(dtype=np.float64)
+                    else:
+                        data[name][start:end] = np.array(values, dtype=object)
+                n_rows = end
 
-            return df
+            schema_columns = [name for column in self._schema_config["columns"] for name in column]
+            unexpected_columns = [name for name, _ in columns if name not in schema_columns]
+            missing_columns = [name for name in schema_columns if name not in seen_fields]
+            if n_rows > 0 and (unexpected_columns or missing_columns):
+                logging.info("Collection %s does not match the schema, unexpected fields: %s, missing fields: %s",
+                             collection_name, tuple(unexpected_columns), tuple(missing_columns))
+            # an empty range of a partitioned export keeps the schema columns
+            output_columns = [name for name, _ in columns if name in seen_fields or n_rows == 0]
+            return pd.DataFrame({name: data[name][:n_rows] for name in output_columns}, columns=output_columns)
 
         except Exception as e:
             raise SensorException(e, sys)
@@ -13,24 +13,40 @@ class DataValidationArtifact:
     invalid_train_file_path: str
     invalid_test_file_path: str
     drift_report_file_path: str
+    drift_baseline_file_path: str
+
+@dataclass
+class DataDriftArtifact:
+    drift_status: bool
+    drift_report_file_path: str
+    data_drift_columns: list
 
 @dataclass
 class DataTransformationArtifact:
     transformed_object_file_path: str
     transformed_train_file_path: str
     transformed_test_file_path: str
+    transformed_train_label_file_path: str
+    transformed_test_label_file_path: str
+    scale_pos_weight: float
+    balancing_benchmark_file_path: str = None
 
 @dataclass
 class ClassificationMetricArtifact:
     f1_score: float
     precision_score: float
     recall_score: float
+    cost: float = None
 
 @dataclass
 class ModelTrainerArtifact:
     trained_model_file_path: str
     train_metric_artifact: ClassificationMetricArtifact
     test_metric_artifact: ClassificationMetricArtifact
+    trained_model_bundle_dir: str
+    best_params: dict
+    leaderboard: list
+    training_time: float
 
 @dataclass
 class ModelEvaluationArtifact:
@@ -38,10 +54,13 @@ class ModelEvaluationArtifact:
     improved_accuracy: float
     best_model_path: str
     trained_model_path: str
+    trained_model_bundle_dir: str
     train_model_metric_artifact: ClassificationMetricArtifact
     best_model_metric_artifact: ClassificationMetricArtifact
 
 @dataclass
 class ModelPusherArtifact:
     saved_model_path:str
-    model_file_path:str
\ No newline at end of file
+    model_file_path:str
+    saved_drift_baseline_path:str
+    saved_model_bundle_dir:str
\ No newline at end of file
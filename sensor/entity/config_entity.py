@@ -5,11 +5,15 @@ from sensor.constant import training_pipeline, s3_bucket, prediction_pipeline
 
 class TrainingPipelineConfig:
 
-    def __init__(self,timestamp=datetime.now()):
+    def __init__(self,timestamp=datetime.now(), full_refresh:bool=False):
+        """
+        full_refresh: export the whole collection instead of the documents added since the last run
+        """
         timestamp = timestamp.strftime("%m_%d_%Y_%H_%M_%S")
         self.pipeline_name: str = training_pipeline.PIPELINE_NAME
         self.artifact_dir: str = os.path.join(training_pipeline.ARTIFACT_DIR, timestamp)
         self.timestamp: str = timestamp
+        self.full_refresh: bool = full_refresh
 
 class DataIngestionConfig:
     def __init__(self,training_pipeline_config:TrainingPipelineConfig):
@@ -17,31 +21,47 @@ class DataIngestionConfig:
             training_pipeline_config.artifact_dir, training_pipeline.DATA_INGESTION_DIR_NAME
         )
         self.feature_store_file_path: str = os.path.join(
-            self.data_ingestion_dir, training_pipeline.DATA_INGESTION_FEATURE_STORE_DIR, training_pipeline.FILE_NAME
+            self.data_ingestion_dir, training_pipeline.DATA_INGESTION_FEATURE_STORE_DIR, training_pipeline.FEATURE_STORE_NAME
         )
         self.training_file_path: str = os.path.join(
-            self.data_ingestion_dir, training_pipeline.DATA_INGESTION_INGESTED_DIR, training_pipeline.TRAIN_FILE_NAME
+            self.data_ingestion_dir, training_pipeline.DATA_INGESTION_INGESTED_DIR, training_pipeline.TRAIN_DATA_NAME
         )
         self.testing_file_path: str = os.path.join(
-            self.data_ingestion_dir, training_pipeline.DATA_INGESTION_INGESTED_DIR, training_pipeline.TEST_FILE_NAME
+            self.data_ingestion_dir, training_pipeline.DATA_INGESTION_INGESTED_DIR, training_pipeline.TEST_DATA_NAME
         )
         self.train_test_split_ratio: float = training_pipeline.DATA_INGESTION_TRAIN_TEST_SPLIT_RATIO
+        self.random_state: int = training_pipeline.DATA_INGESTION_RANDOM_STATE
+        self.rows_per_part: int = training_pipeline.DATA_INGESTION_ROWS_PER_PART
         self.collection_name: str = training_pipeline.DATA_INGESTION_COLLECTION_NAME
+        self.n_partitions: int = training_pipeline.DATA_INGESTION_N_PARTITIONS
+        self.n_workers: int = training_pipeline.DATA_INGESTION_N_WORKERS
+        self.snapshot_dir: str = os.path.join(
+            training_pipeline.DATA_INGESTION_SNAPSHOT_DIR, training_pipeline.FEATURE_STORE_NAME
+        )
+        self.snapshot_max_parts: int = training_pipeline.DATA_INGESTION_SNAPSHOT_MAX_PARTS
+        self.snapshot_full_refresh_days: int = training_pipeline.DATA_INGESTION_SNAPSHOT_FULL_REFRESH_DAYS
+        self.full_refresh: bool = training_pipeline_config.full_refresh
 
 class DataValidationConfig:    
     def __init__(self,training_pipeline_config:TrainingPipelineConfig):
         self.data_validation_dir: str = os.path.join( training_pipeline_config.artifact_dir, training_pipeline.DATA_VALIDATION_DIR_NAME)
         self.valid_data_dir: str = os.path.join(self.data_validation_dir, training_pipeline.DATA_VALIDATION_VALID_DIR)
         self.invalid_data_dir: str = os.path.join(self.data_validation_dir, training_pipeline.DATA_VALIDATION_INVALID_DIR)
-        self.valid_train_file_path: str = os.path.join(self.valid_data_dir, training_pipeline.TRAIN_FILE_NAME)
-        self.valid_test_file_path: str = os.path.join(self.valid_data_dir, training_pipeline.TEST_FILE_NAME)
-        self.invalid_train_file_path: str = os.path.join(self.invalid_data_dir, training_pipeline.TRAIN_FILE_NAME)
-        self.invalid_test_file_path: str = os.path.join(self.invalid_data_dir, training_pipeline.TEST_FILE_NAME)
+        self.valid_train_file_path: str = os.path.join(self.valid_data_dir, training_pipeline.TRAIN_DATA_NAME)
+        self.valid_test_file_path: str = os.path.join(self.valid_data_dir, training_pipeline.TEST_DATA_NAME)
+        self.invalid_train_file_path: str = os.path.join(self.invalid_data_dir, training_pipeline.TRAIN_DATA_NAME)
+        self.invalid_test_file_path: str = os.path.join(self.invalid_data_dir, training_pipeline.TEST_DATA_NAME)
         self.drift_report_file_path: str = os.path.join(
             self.data_validation_dir,
             training_pipeline.DATA_VALIDATION_DRIFT_REPORT_DIR,
             training_pipeline.DATA_VALIDATION_DRIFT_REPORT_FILE_NAME,
         )
+        self.drift_baseline_file_path: str = os.path.join(
+            self.data_validation_dir,
+            training_pipeline.DATA_VALIDATION_DRIFT_REPORT_DIR,
+            training_pipeline.DRIFT_BASELINE_FILE_NAME,
+        )
+        self.drift_baseline_sample_size: int = training_pipeline.DRIFT_BASELINE_SAMPLE_SIZE
 
 class ModelTrainerConfig:
     def __init__(self,training_pipeline_config:TrainingPipelineConfig):
@@ -52,8 +72,29 @@ class ModelTrainerConfig:
             self.model_trainer_dir, training_pipeline.MODEL_TRAINER_TRAINED_MODEL_DIR, 
             training_pipeline.MODEL_FILE_NAME
         )
+        self.trained_model_bundle_dir: str = os.path.join(
+            self.model_trainer_dir, training_pipeline.MODEL_TRAINER_TRAINED_MODEL_DIR,
+            training_pipeline.MODEL_BUNDLE_DIR_NAME
+        )
         self.expected_accuracy: float = training_pipeline.MODEL_TRAINER_EXPECTED_SCORE
         self.overfitting_underfitting_threshold = training_pipeline.MODEL_TRAINER_OVER_FIITING_UNDER_FITTING_THRESHOLD
+        self.search_space: dict = training_pipeline.MODEL_TRAINER_SEARCH_SPACE
+        self.search_n_configs: int = training_pipeline.MODEL_TRAINER_SEARCH_N_CONFIGS
+        self.search_min_estimators: int = training_pipeline.MODEL_TRAINER_SEARCH_MIN_ESTIMATORS
+        self.search_max_estimators: int = training_pipeline.MODEL_TRAINER_SEARCH_MAX_ESTIMATORS
+        self.search_eta: int = training_pipeline.MODEL_TRAINER_SEARCH_ETA
+        self.search_time_budget_seconds: int = training_pipeline.MODEL_TRAINER_SEARCH_TIME_BUDGET_SECONDS
+        self.trial_n_threads: int = training_pipeline.MODEL_TRAINER_TRIAL_N_THREADS
+        self.early_stopping_rounds: int = training_pipeline.MODEL_TRAINER_EARLY_STOPPING_ROUNDS
+        self.validation_split_ratio: float = training_pipeline.MODEL_TRAINER_VALIDATION_SPLIT_RATIO
+        self.random_state: int = training_pipeline.MODEL_TRAINER_RANDOM_STATE
+        self.leaderboard_size: int = training_pipeline.MODEL_TRAINER_LEADERBOARD_SIZE
+        self.tree_method: str = training_pipeline.MODEL_TRAINER_TREE_METHOD
+        self.max_bin: int = training_pipeline.MODEL_TRAINER_MAX_BIN
+        self.n_threads: int = training_pipeline.MODEL_TRAINER_N_THREADS
+        self.max_boost_round: int = training_pipeline.MODEL_TRAINER_MAX_BOOST_ROUND
+        self.external_memory_cache_dir: str = os.path.join(
+            self.model_trainer_dir, training_pipeline.MODEL_TRAINER_EXTERNAL_MEMORY_CACHE_DIR)
 
 
 class DataTransformationConfig:
@@ -63,8 +104,35 @@ class DataTransformationConfig:
             training_pipeline.TRAIN_FILE_NAME.replace("csv", "npy"),)
         self.transformed_test_file_path: str = os.path.join(self.data_transformation_dir,  training_pipeline.DATA_TRANSFORMATION_TRANSFORMED_DATA_DIR,
             training_pipeline.TEST_FILE_NAME.replace("csv", "npy"), )
+        self.transformed_train_label_file_path: str = os.path.join(self.data_transformation_dir,
+            training_pipeline.DATA_TRANSFORMATION_TRANSFORMED_DATA_DIR,
+            f"{training_pipeline.TRAIN_DATA_NAME}_{training_pipeline.DATA_TRANSFORMATION_LABELS_NAME}.npy")
+        self.transformed_test_label_file_path: str = os.path.join(self.data_transformation_dir,
+            training_pipeline.DATA_TRANSFORMATION_TRANSFORMED_DATA_DIR,
+            f"{training_pipeline.TEST_DATA_NAME}_{training_pipeline.DATA_TRANSFORMATION_LABELS_NAME}.npy")
         self.transformed_object_file_path: str = os.path.join( self.data_transformation_dir, training_pipeline.DATA_TRANSFORMATION_TRANSFORMED_OBJECT_DIR,
             training_pipeline.PREPROCSSING_OBJECT_FILE_NAME,)
+        self.random_state: int = training_pipeline.DATA_TRANSFORMATION_RANDOM_STATE
+        self.balancing_strategy: str = training_pipeline.DATA_TRANSFORMATION_BALANCING_STRATEGY
+        self.resample_test: bool = training_pipeline.DATA_TRANSFORMATION_RESAMPLE_TEST
+        self.smote_k_neighbors: int = training_pipeline.DATA_TRANSFORMATION_SMOTE_K_NEIGHBORS
+        self.neighbors_algorithm: str = training_pipeline.DATA_TRANSFORMATION_NEIGHBORS_ALGORITHM
+        self.n_jobs: int = training_pipeline.DATA_TRANSFORMATION_N_JOBS
+        self.benchmark_report_file_path: str = os.path.join(
+            self.data_transformation_dir, training_pipeline.DATA_TRANSFORMATION_BENCHMARK_REPORT_NAME)
+        self.benchmark_balancing: bool = training_pipeline.DATA_TRANSFORMATION_BENCHMARK_BALANCING
+        self.out_of_core: bool = training_pipeline.DATA_TRANSFORMATION_OUT_OF_CORE
+        self.fit_sample_size: int = training_pipeline.DATA_TRANSFORMATION_FIT_SAMPLE_SIZE
+        # out-of-core mode writes the features and labels as one array per part in these directories
+        transformed_data_dir = os.path.join(self.data_transformation_dir, training_pipeline.DATA_TRANSFORMATION_TRANSFORMED_DATA_DIR)
+        self.transformed_train_dir: str = os.path.join(transformed_data_dir, training_pipeline.TRAIN_DATA_NAME,
+            training_pipeline.DATA_TRANSFORMATION_FEATURES_NAME)
+        self.transformed_train_label_dir: str = os.path.join(transformed_data_dir, training_pipeline.TRAIN_DATA_NAME,
+            training_pipeline.DATA_TRANSFORMATION_LABELS_NAME)
+        self.transformed_test_dir: str = os.path.join(transformed_data_dir, training_pipeline.TEST_DATA_NAME,
+            training_pipeline.DATA_TRANSFORMATION_FEATURES_NAME)
+        self.transformed_test_label_dir: str = os.path.join(transformed_data_dir, training_pipeline.TEST_DATA_NAME,
+            training_pipeline.DATA_TRANSFORMATION_LABELS_NAME)
 
 class ModelEvaluationConfig:
 
@@ -88,6 +156,14 @@ class ModelPusherConfig:
             training_pipeline.SAVED_MODEL_DIR,
             f"{timestamp}",
             training_pipeline.MODEL_FILE_NAME)
+        self.saved_model_bundle_dir=os.path.join(
+            training_pipeline.SAVED_MODEL_DIR,
+            f"{timestamp}",
+            training_pipeline.MODEL_BUNDLE_DIR_NAME)
+        self.saved_drift_baseline_path=os.path.join(
+            training_pipeline.SAVED_MODEL_DIR,
+            f"{timestamp}",
+            training_pipeline.DRIFT_BASELINE_FILE_NAME)
 
 class PredictionPipelineConfig:
     def __init__(self, timestamp=datetime.now()):
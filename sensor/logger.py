@@ -1,20 +1,132 @@
+import atexit
+import contextvars
+import json
 import logging
 import os
-
+import queue
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from sensor.constant.env_variable import LOG_FORMAT_ENV_KEY, LOG_LEVEL_ENV_KEY
 
 LOG_DIR = "development_logs"
 CURRENT_TIME_STAMP = f"{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}"
 LOG_FILE_NAME = f"log_{CURRENT_TIME_STAMP}.log"
 LOG_FILE_PATH = os.path.join(LOG_DIR, LOG_FILE_NAME)
+LOG_FILE_MAX_BYTES = 50 * 1024 * 1024
+LOG_FILE_BACKUP_COUNT = 10
+LOG_FORMAT = '[%(filename)s:%(lineno)d - %(levelname)s -%(message)s'
+
+# ids of the current HTTP request and pipeline run, added to every record
+request_id_var = contextvars.ContextVar("request_id", default=None)
+run_id_var = contextvars.ContextVar("run_id", default=None)
+
+
+class ContextFilter(logging.Filter):
+    """
+    Copy the request and run ids of the logging thread's context onto the record
+    """
+    def filter(self, record:logging.LogRecord)->bool:
+        record.request_id = request_id_var.get()
+        record.run_id = run_id_var.get()
+        return True
+
+
+class LazyVars:
+    """
+    Log argument standing for the attributes of an object, e.g. a config. Nothing is built
+    when the record is filtered out by its level; a record which is emitted renders it
+    before being queued, the object being mutable.
+    """
+    __slots__ = ("obj",)
+
+    def __init__(self, obj):
+        self.obj = obj
+
+    def __str__(self)->str:
+        return str(tuple(sorted(vars(self.obj).items())))
+
+
+class LazyQueueHandler(QueueHandler):
+    """
+    Queue handler leaving the formatting to the listener thread. The stock handler formats
+    the whole record before enqueueing it; here the message is only rendered up front when
+    an argument is mutable and could change before the listener gets to it. Callers pass
+    tuples instead of lists or dicts to keep costly arguments lazy, and LazyVars for the
+    attributes of an object so that nothing is built for a filtered out level.
+    """
+    IMMUTABLE_TYPES = (str, int, float, bool, bytes, type(None))
+
+    @classmethod
+    def is_immutable(cls, value)->bool:
+        if isinstance(value, (tuple, frozenset)):
+            return all(cls.is_immutable(item) for item in value)
+        return isinstance(value, cls.IMMUTABLE_TYPES)
+
+    def prepare(self, record:logging.LogRecord)->logging.LogRecord:
+        args = record.args
+        # a lone dict argument is kept by LogRecord as the args themselves, it is rendered too
+        if not isinstance(record.msg, str) or (args and (isinstance(args, dict) or not self.is_immutable(args))):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line
+    """
+    def format(self, record:logging.LogRecord)->str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "file": record.filename,
+            "line": record.lineno,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+            "run_id": getattr(record, "run_id", None),
+        }
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def get_formatter(log_format:str)->logging.Formatter:
+    if log_format == "json":
+        return JsonFormatter()
+    return logging.Formatter(LOG_FORMAT)
+
+
+def configure_logging(log_file_path:str=LOG_FILE_PATH, log_format:str=None, level:str=None)->QueueListener:
+    """
+    Route the root logger through a queue: callers only enqueue the record, a listener thread
+    formats it and writes it to a size rotated file.
+    log_format: "text" or "json", read from SENSOR_LOG_FORMAT when None
+    return: the started listener, stopped at exit so that queued records are flushed
+    """
+    log_format = log_format or os.getenv(LOG_FORMAT_ENV_KEY, "text").lower()
+    level = level or os.getenv(LOG_LEVEL_ENV_KEY, "INFO").upper()
+    os.makedirs(os.path.dirname(log_file_path), exist_ok=True)
+
+    file_handler = RotatingFileHandler(log_file_path, mode="a", maxBytes=LOG_FILE_MAX_BYTES,
+                                       backupCount=LOG_FILE_BACKUP_COUNT)
+    file_handler.setFormatter(get_formatter(log_format))
+    log_queue = queue.SimpleQueue()
+    queue_handler = LazyQueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
 
-os.makedirs(LOG_DIR, exist_ok= True)
+    root_logger = logging.getLogger()
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(queue_handler)
+    root_logger.setLevel(level)
 
-logging.basicConfig(
-    filename= LOG_FILE_PATH,
-    filemode= "a",
-    format='[%(filename)s:%(lineno)d - %(levelname)s -%(message)s',
-    level= logging.INFO
-)
+    listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
 
 
+log_listener = configure_logging()
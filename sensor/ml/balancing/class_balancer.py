@@ -0,0 +1,113 @@
+import sys
+import time
+
+import numpy as np
+from imblearn.combine import SMOTETomek
+from imblearn.over_sampling import SMOTE
+from imblearn.under_sampling import RandomUnderSampler
+from sklearn.neighbors import NearestNeighbors
+from xgboost import XGBClassifier
+
+from sensor.exception import SensorException
+from sensor.logger import logging
+from sensor.ml.metric.classification_metric import get_classification_score
+
+SMOTE_TOMEK = "smote_tomek"
+SMOTE_TREE = "smote"
+UNDERSAMPLE = "undersample"
+CLASS_WEIGHT = "class_weight"
+BALANCING_STRATEGIES = (SMOTE_TOMEK, SMOTE_TREE, UNDERSAMPLE, CLASS_WEIGHT)
+
+
+class ClassBalancer:
+    """
+    Balance the classes of a dataset with one of the strategies:
+        smote_tomek    SMOTE oversampling then Tomek links cleaning, exact neighbour search
+        smote          SMOTE oversampling with a kd-tree / ball-tree neighbour search
+        undersample    random undersampling of the majority class
+        class_weight   no resampling, the positive class is weighted through scale_pos_weight
+    """
+    def __init__(self, strategy:str, random_state:int=None, k_neighbors:int=5,
+                 neighbors_algorithm:str="kd_tree", n_jobs:int=1):
+        if strategy not in BALANCING_STRATEGIES:
+            raise Exception(f"Unknown balancing strategy {strategy}, expected one of {BALANCING_STRATEGIES}")
+        self.strategy = strategy
+        self.random_state = random_state
+        self.k_neighbors = k_neighbors
+        self.neighbors_algorithm = neighbors_algorithm
+        self.n_jobs = n_jobs
+
+    def get_sampler(self):
+        """
+        return: imblearn sampler of the strategy, None for class weighting
+        """
+        if self.strategy == SMOTE_TOMEK:
+            return SMOTETomek(sampling_strategy="minority", random_state=self.random_state)
+        if self.strategy == SMOTE_TREE:
+            nearest_neighbors = NearestNeighbors(n_neighbors=self.k_neighbors + 1,
+                                                 algorithm=self.neighbors_algorithm, n_jobs=self.n_jobs)
+            return SMOTE(sampling_strategy="minority", k_neighbors=nearest_neighbors, random_state=self.random_state)
+        if self.strategy == UNDERSAMPLE:
+            return RandomUnderSampler(sampling_strategy="majority", random_state=self.random_state)
+        return None
+
+    def fit_resample(self, x:np.ndarray, y:np.ndarray):
+        """
+        return: balanced x and y, unchanged for class weighting
+        """
+        try:
+            sampler = self.get_sampler()
+            if sampler is None:
+                return x, np.asarray(y)
+            logging.info("Apply sample balance using %s", sampler.__class__.__name__)
+            x_resampled, y_resampled = sampler.fit_resample(x, y)
+            return x_resampled, np.asarray(y_resampled)
+        except Exception as e:
+            raise SensorException(e, sys)
+
+    def get_scale_pos_weight(self, y:np.ndarray)->float:
+        """
+        XGBoost scale_pos_weight for data balanced by this strategy: negative / positive count
+        for class weighting, 1 when the classes were resampled
+        """
+        if self.strategy != CLASS_WEIGHT:
+            return 1.0
+        n_positive = int(np.sum(np.asarray(y) == 1))
+        return float(len(y) - n_positive) / max(n_positive, 1)
+
+
+def benchmark_balancing_strategies(x_train:np.ndarray, y_train:np.ndarray, x_test:np.ndarray, y_test:np.ndarray,
+                                   strategies:tuple=BALANCING_STRATEGIES, random_state:int=None, n_jobs:int=1)->list:
+    """
+    Resample the preprocessed train data with every strategy, fit a default XGBClassifier and score it
+    on the test data left as is.
+    return: one row per strategy with resampling and fit times, train rows and test scores
+    """
+    try:
+        results = []
+        for strategy in strategies:
+            balancer = ClassBalancer(strategy, random_state=random_state, n_jobs=n_jobs)
+            start = time.perf_counter()
+            x_resampled, y_resampled = balancer.fit_resample(x_train, y_train)
+            resample_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            model = XGBClassifier(scale_pos_weight=balancer.get_scale_pos_weight(y_resampled), n_jobs=n_jobs)
+            model.fit(x_resampled, y_resampled)
+            fit_seconds = time.perf_counter() - start
+
+            test_metric = get_classification_score(y_true=y_test, y_pred=model.predict(x_test))
+            results.append({
+                "strategy": strategy,
+                "resample_seconds": round(resample_seconds, 3),
+                "fit_seconds": round(fit_seconds, 3),
+                "train_rows": int(len(y_resampled)),
+                "f1_score": float(test_metric.f1_score),
+                "precision_score": float(test_metric.precision_score),
+                "recall_score": float(test_metric.recall_score),
+                "cost": float(test_metric.cost),
+            })
+            logging.info("Balancing benchmark: %s", results[-1])
+        return results
+    except Exception as e:
+        raise SensorException(e, sys)
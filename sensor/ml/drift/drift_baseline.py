@@ -0,0 +1,86 @@
+import os, sys
+import threading
+
+import numpy as np
+import pandas as pd
+
+from sensor.constant.training_pipeline import DRIFT_BASELINE_SAMPLE_SIZE
+from sensor.exception import SensorException
+from sensor.logger import logging
+from sensor.ml.drift.ks_drift import ks_2samp_columns
+
+
+class DriftBaseline:
+    """
+    Compact per-column summary of the training data used for drift detection at prediction time.
+    Every column is kept as at most sample_size sorted quantiles of its non missing values,
+    together with the number of values it summarizes, in one NaN padded
+    (sample_size x n_columns) block.
+    """
+    _cache = {}
+    _cache_lock = threading.Lock()
+
+    def __init__(self, columns:list, quantiles:np.ndarray, counts:np.ndarray):
+        self.columns = list(columns)
+        self.quantiles = quantiles
+        self.counts = counts
+
+    @classmethod
+    def from_dataframe(cls, dataframe:pd.DataFrame, columns:list, sample_size:int=DRIFT_BASELINE_SAMPLE_SIZE):
+        """
+        sample_size: maximum number of quantiles kept per column, None keeps every value
+        """
+        try:
+            sketches = []
+            counts = np.zeros(len(columns), dtype=np.int64)
+            for i, column in enumerate(columns):
+                values = dataframe[column].to_numpy(dtype=np.float64)
+                values = np.sort(values[~np.isnan(values)])
+                counts[i] = len(values)
+                if sample_size is not None and len(values) > sample_size:
+                    values = np.quantile(values, np.linspace(0, 1, sample_size))
+                sketches.append(values)
+            block_size = max([len(sketch) for sketch in sketches], default=0)
+            quantiles = np.full((block_size, len(columns)), np.nan)
+            for i, sketch in enumerate(sketches):
+                quantiles[:len(sketch), i] = sketch
+            return cls(columns, quantiles, counts)
+        except Exception as e:
+            raise SensorException(e,sys)
+
+    def save(self, file_path:str):
+        try:
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            np.savez_compressed(file_path, columns=np.array(self.columns), quantiles=self.quantiles, counts=self.counts)
+            logging.info("Drift baseline saved at %s", file_path)
+        except Exception as e:
+            raise SensorException(e,sys)
+
+    @classmethod
+    def load(cls, file_path:str):
+        """
+        Load a saved baseline. Baselines are cached per file path for the life of the process
+        """
+        try:
+            with cls._cache_lock:
+                if file_path not in cls._cache:
+                    with np.load(file_path) as baseline_file:
+                        cls._cache[file_path] = cls(baseline_file["columns"].tolist(),
+                                                    baseline_file["quantiles"], baseline_file["counts"])
+                    logging.info("Drift baseline loaded from %s", file_path)
+                return cls._cache[file_path]
+        except Exception as e:
+            raise SensorException(e,sys)
+
+    def ks_test(self, current_df:pd.DataFrame, n_jobs:int=1):
+        """
+        Two sample Kolmogorov-Smirnov test of every baseline column against the current data.
+        The statistic is taken between the baseline sketch and the current data and the p value
+        uses the asymptotic distribution with the real number of training values.
+        return: statistics, p_values in the order of self.columns
+        """
+        try:
+            current = current_df[self.columns].to_numpy(dtype=np.float64)
+            return ks_2samp_columns(self.quantiles, current, base_sample_sizes=self.counts, n_jobs=n_jobs)
+        except Exception as e:
+            raise SensorException(e,sys)
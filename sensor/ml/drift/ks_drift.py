@@ -0,0 +1,98 @@
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from scipy.stats import ks_2samp, kstwo
+
+from sensor.exception import SensorException
+
+# same switch as scipy.stats.ks_2samp(method="auto") between the exact and the asymptotic p value
+MAX_EXACT_SAMPLE_SIZE = 10000
+COLUMN_GROUP_SIZE = 16
+
+
+def _ks_statistic_block(base:np.ndarray, current:np.ndarray):
+    """
+    Two sided KS statistic of every column of a block. Both samples of a column are sorted
+    together in one argsort over the block, missing values (NaN) are ignored.
+    return: statistics, base sample sizes, current sample sizes
+    """
+    n1 = np.count_nonzero(~np.isnan(base), axis=0)
+    n2 = np.count_nonzero(~np.isnan(current), axis=0)
+    values = np.concatenate([base, current], axis=0)
+    order = np.argsort(values, axis=0, kind="stable")
+    sorted_values = np.take_along_axis(values, order, axis=0)
+    is_valid = ~np.isnan(sorted_values)
+    from_base = order < base.shape[0]
+    # empirical cdf counts after every sorted value, exactly what searchsorted(side="right") gives
+    base_counts = np.cumsum(from_base & is_valid, axis=0)
+    current_counts = np.cumsum(~from_base & is_valid, axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cdf_diff = base_counts / n1 - current_counts / n2
+    # the cdf is only defined after the last of a group of tied values
+    last_of_ties = np.ones(sorted_values.shape, dtype=bool)
+    last_of_ties[:-1] = sorted_values[1:] != sorted_values[:-1]
+    cdf_diff = np.where(last_of_ties & is_valid, cdf_diff, 0.0)
+    statistic = np.maximum(np.clip(-np.min(cdf_diff, axis=0), 0, 1), np.max(cdf_diff, axis=0))
+    statistic[(n1 == 0) | (n2 == 0)] = 0.0
+    return statistic, n1, n2
+
+
+def ks_2samp_columns(base:np.ndarray, current:np.ndarray, base_sample_sizes:np.ndarray=None, n_jobs:int=1):
+    """
+    Vectorized two sample Kolmogorov-Smirnov test of every column of base against the same column of current.
+
+    base: 2-D array (n_base_rows x n_columns), NaN are ignored
+    current: 2-D array (n_current_rows x n_columns), NaN are ignored
+    base_sample_sizes: real number of values per column when base is a quantile sketch of the data.
+        p values then always use the asymptotic distribution with these sizes
+    n_jobs: number of threads working on groups of columns
+    return: statistics, p_values. p value is 1 for columns without values in either sample.
+        Without base_sample_sizes both match scipy.stats.ks_2samp on the non missing values.
+    """
+    try:
+        base = np.asarray(base, dtype=np.float64)
+        current = np.asarray(current, dtype=np.float64)
+        n_columns = base.shape[1]
+        groups = [slice(start, min(start + COLUMN_GROUP_SIZE, n_columns))
+                  for start in range(0, n_columns, COLUMN_GROUP_SIZE)]
+        if n_jobs > 1 and len(groups) > 1:
+            with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+                results = list(executor.map(lambda group: _ks_statistic_block(base[:, group], current[:, group]), groups))
+        else:
+            results = [_ks_statistic_block(base[:, group], current[:, group]) for group in groups]
+        statistic = np.concatenate([result[0] for result in results])
+        n1 = np.concatenate([result[1] for result in results]).astype(np.float64)
+        n2 = np.concatenate([result[2] for result in results]).astype(np.float64)
+
+        p_value = np.ones(n_columns)
+        is_testable = (n1 > 0) & (n2 > 0)
+        if base_sample_sizes is not None:
+            n1 = np.asarray(base_sample_sizes, dtype=np.float64)
+            is_asymp = is_testable
+        else:
+            is_asymp = is_testable & (np.maximum(n1, n2) > MAX_EXACT_SAMPLE_SIZE)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            effective_size = np.round(n1 * n2 / (n1 + n2))
+        p_value[is_asymp] = np.clip(kstwo.sf(statistic[is_asymp], effective_size[is_asymp]), 0, 1)
+        # small samples keep scipy's exact p value
+        for i in np.flatnonzero(is_testable & ~is_asymp):
+            x, y = base[:, i], current[:, i]
+            p_value[i] = ks_2samp(x[~np.isnan(x)], y[~np.isnan(y)]).pvalue
+        return statistic, p_value
+    except Exception as e:
+        raise SensorException(e,sys)
+
+
+def get_drift_report(columns:list, p_values:np.ndarray, threshold:float=0.05):
+    """
+    return: drift status, report {column: {p_value, drift_status}}, list of drifted columns
+    """
+    report = {}
+    data_drift_columns = []
+    for column, p_value in zip(columns, p_values):
+        is_found = not threshold <= p_value
+        if is_found:
+            data_drift_columns.append(column)
+        report[column] = {"p_value": float(p_value), "drift_status": bool(is_found)}
+    return len(data_drift_columns) > 0, report, data_drift_columns
@@ -2,18 +2,93 @@ from sensor.entity.artifact_entity import ClassificationMetricArtifact
 from sensor.exception import SensorException
 from sensor.logger import logging
 
-from sklearn.metrics import f1_score,precision_score,recall_score
+import numpy as np
 import os,sys
 
+# APS failure challenge cost: an unnecessary check costs 10, a missed failure 500
+FALSE_POSITIVE_COST = 10
+FALSE_NEGATIVE_COST = 500
+
+
+def get_confusion_matrix(y_true, y_pred)->np.ndarray:
+    """
+    Binary confusion matrices in a single np.bincount pass
+    y_true: labels, 0 or 1
+    y_pred: one vector of predicted labels, or a 2-D array with one vector per row
+    return: int64 array [[tn, fp], [fn, tp]], of shape (n_vectors, 2, 2) when y_pred is 2-D
+    """
+    try:
+        y_true = np.asarray(y_true).astype(np.int64, copy=False)
+        y_pred = np.asarray(y_pred)
+        is_single = y_pred.ndim == 1
+        y_pred = np.atleast_2d(y_pred).astype(np.int64, copy=False)
+        if y_pred.shape[1] != y_true.shape[0]:
+            raise Exception(f"Found {y_true.shape[0]} labels and {y_pred.shape[1]} predictions")
+        # cell of each prediction: 4 * vector + 2 * true label + predicted label
+        cells = 2 * y_true + y_pred + 4 * np.arange(y_pred.shape[0], dtype=np.int64)[:, np.newaxis]
+        confusion_matrix = np.bincount(cells.ravel(), minlength=4 * y_pred.shape[0]).reshape(-1, 2, 2)
+        return confusion_matrix[0] if is_single else confusion_matrix
+    except Exception as e:
+        raise SensorException(e,sys)
+
+
+def get_confusion_metrics(confusion_matrix:np.ndarray)->dict:
+    """
+    Precision, recall, f1 score and cost from confusion matrices, 0 when undefined
+    return: {metric: value}, arrays for a stack of matrices
+    """
+    confusion_matrix = np.asarray(confusion_matrix, dtype=np.float64)
+    fp, fn, tp = confusion_matrix[..., 0, 1], confusion_matrix[..., 1, 0], confusion_matrix[..., 1, 1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        precision = np.where(tp + fp > 0, tp / (tp + fp), 0.0)
+        recall = np.where(tp + fn > 0, tp / (tp + fn), 0.0)
+        f1 = np.where(2 * tp + fp + fn > 0, 2 * tp / (2 * tp + fp + fn), 0.0)
+    return {
+        "precision_score": precision,
+        "recall_score": recall,
+        "f1_score": f1,
+        "cost": FALSE_POSITIVE_COST * fp + FALSE_NEGATIVE_COST * fn,
+    }
+
+
 def get_classification_score(y_true,y_pred)->ClassificationMetricArtifact:
     try:
-        model_f1_score = f1_score(y_true, y_pred)
-        model_recall_score = recall_score(y_true, y_pred)
-        model_precision_score=precision_score(y_true,y_pred)
-        logging.info(f"f1 score : {model_f1_score}, recall : {model_recall_score}, precision: {model_precision_score}")
+        metrics = get_confusion_metrics(get_confusion_matrix(y_true, y_pred))
+        model_f1_score = float(metrics["f1_score"])
+        model_recall_score = float(metrics["recall_score"])
+        model_precision_score = float(metrics["precision_score"])
+        model_cost = float(metrics["cost"])
+        logging.info("f1 score : %s, recall : %s, precision: %s, cost: %s", model_f1_score, model_recall_score, model_precision_score, model_cost)
         classsification_metric =  ClassificationMetricArtifact(f1_score=model_f1_score,
-                    precision_score=model_precision_score, 
-                    recall_score=model_recall_score)
+                    precision_score=model_precision_score,
+                    recall_score=model_recall_score,
+                    cost=model_cost)
         return classsification_metric
     except Exception as e:
-        raise SensorException(e,sys)
\ No newline at end of file
+        raise SensorException(e,sys)
+
+
+def get_classification_scores(y_true, y_preds)->list:
+    """
+    Scores of many prediction vectors, e.g. several models or thresholds, from one confusion matrix pass
+    y_preds: 2-D array with one vector of predicted labels per row
+    """
+    try:
+        metrics = get_confusion_metrics(get_confusion_matrix(y_true, np.atleast_2d(y_preds)))
+        return [ClassificationMetricArtifact(f1_score=float(f1), precision_score=float(precision),
+                                             recall_score=float(recall), cost=float(cost))
+                for f1, precision, recall, cost in zip(metrics["f1_score"], metrics["precision_score"],
+                                                       metrics["recall_score"], metrics["cost"])]
+    except Exception as e:
+        raise SensorException(e,sys)
+
+
+def get_threshold_scores(y_true, y_proba, thresholds)->list:
+    """
+    Scores of the positive class probabilities cut at every threshold
+    """
+    try:
+        y_preds = np.asarray(y_proba)[np.newaxis, :] > np.asarray(thresholds, dtype=np.float64)[:, np.newaxis]
+        return get_classification_scores(y_true, y_preds)
+    except Exception as e:
+        raise SensorException(e,sys)
@@ -1,7 +1,13 @@
-from sensor.constant.training_pipeline import SAVED_MODEL_DIR,MODEL_FILE_NAME
+from sensor.constant.training_pipeline import (SAVED_MODEL_DIR,MODEL_FILE_NAME,DRIFT_BASELINE_FILE_NAME,
+    MODEL_BUNDLE_DIR_NAME,MODEL_BUNDLE_MANIFEST_FILE_NAME)
 from sensor.logger import logging
 
 import os
+import numpy as np
+import pandas as pd
+from sklearn.impute import SimpleImputer
+from sklearn.preprocessing import RobustScaler
+from xgboost import XGBClassifier
 
 class TargetValueMapping:
     def __init__(self):
@@ -21,11 +27,102 @@ class SensorModel:
         try:
             self.preprocessor = preprocessor
             self.model = model
+            self._compiled = None
         except Exception as e:
             raise e
+
+    def compile(self)->bool:
+        """
+        Prepare the fused NumPy inference path. It is available when the preprocessor is the
+        SimpleImputer -> RobustScaler pipeline of DataTransformation and the model a binary XGBClassifier.
+        return: True if the fast path is available
+        """
+        try:
+            self._compiled = False
+            steps = [step for _, step in getattr(self.preprocessor, "steps", [])]
+            if len(steps) != 2 or not isinstance(steps[0], SimpleImputer) or not isinstance(steps[1], RobustScaler):
+                return False
+            imputer, scaler = steps
+            if not (isinstance(imputer.missing_values, float) and np.isnan(imputer.missing_values)) or imputer.add_indicator:
+                return False
+            fill_values = np.asarray(imputer.statistics_, dtype=np.float64)
+            if np.isnan(fill_values).any():
+                # imputer drops columns without statistics
+                return False
+            if not isinstance(self.model, XGBClassifier) or self.model.objective != "binary:logistic":
+                return False
+            n_features = len(fill_values)
+            center = scaler.center_ if scaler.with_centering else np.zeros(n_features)
+            scale = scaler.scale_ if scaler.with_scaling else np.ones(n_features)
+            try:
+                iteration_range = (0, self.model.best_iteration + 1)
+            except AttributeError:
+                iteration_range = (0, 0)
+            self._compiled = {
+                "feature_names": getattr(imputer, "feature_names_in_", None),
+                "n_features": n_features,
+                "fill_values": fill_values,
+                "center": np.asarray(center, dtype=np.float64),
+                "scale": np.asarray(scale, dtype=np.float64),
+                "booster": self.model.get_booster(),
+                "iteration_range": iteration_range,
+            }
+            return True
+        except Exception as e:
+            raise e
+
+    def _fast_predict(self, x):
+        compiled = self._compiled
+        if isinstance(x, pd.DataFrame):
+            if compiled["feature_names"] is not None:
+                x = x[compiled["feature_names"]]
+            x_transform = x.to_numpy(dtype=np.float64, copy=True)
+        else:
+            x_transform = np.array(x, dtype=np.float64, order="C")
+        # same float64 arithmetic as SimpleImputer and RobustScaler, done in place
+        np.copyto(x_transform, compiled["fill_values"], where=np.isnan(x_transform))
+        x_transform -= compiled["center"]
+        x_transform /= compiled["scale"]
+        # the booster works on float32, casting once here gives it exactly the values it would use
+        x_transform = np.ascontiguousarray(x_transform, dtype=np.float32)
+        self.warm_up()
+        class_probs = compiled["booster"].inplace_predict(x_transform, iteration_range=compiled["iteration_range"])
+        y_hat = np.zeros(class_probs.shape[0], dtype=np.int64)
+        y_hat[class_probs > 0.5] = 1
+        return y_hat
     
+    def get_inference_params(self)->dict:
+        """
+        Parameters of the fast inference path, None when the model has no fast path
+        """
+        if getattr(self, "_compiled", None) is None:
+            self.compile()
+        return self._compiled or None
+
+    @classmethod
+    def from_inference_params(cls, inference_params:dict):
+        """
+        Build a model which only has the fast inference path, as loaded from a model bundle
+        """
+        sensor_model = cls(preprocessor=None, model=None)
+        sensor_model._compiled = inference_params
+        return sensor_model
+
+    def warm_up(self):
+        """
+        Read the booster of a model bundle, which is otherwise read on first use
+        """
+        compiled = getattr(self, "_compiled", None)
+        if compiled and compiled["booster"] is None:
+            compiled["booster"] = compiled["load_booster"]()
+
     def predict(self,x):
         try:
+            if getattr(self, "_compiled", None) is None:
+                # models pickled before the fast path existed are compiled on first use
+                self.compile()
+            if self._compiled:
+                return self._fast_predict(x)
             x_transform = self.preprocessor.transform(x)
             y_hat = self.model.predict(x_transform)
             return y_hat
@@ -42,17 +139,39 @@ class ModelResolver:
         except Exception as e:
             raise e
 
-    def get_latest_model_path(self,)->str:
+    def get_latest_model_timestamp(self,)->int:
         try:
             timestamps = list(map(int,os.listdir(self.model_dir)))
-            latest_timestamp = max(timestamps)
+            return max(timestamps)
+        except Exception as e:
+            raise e
+
+    def get_latest_model_path(self,)->str:
+        """
+        Model bundle directory of the latest model if it has one, else its pickle file
+        """
+        try:
+            latest_timestamp = self.get_latest_model_timestamp()
+            latest_model_bundle_dir = os.path.join(self.model_dir,f"{latest_timestamp}",MODEL_BUNDLE_DIR_NAME)
+            if os.path.exists(os.path.join(latest_model_bundle_dir,MODEL_BUNDLE_MANIFEST_FILE_NAME)):
+                return latest_model_bundle_dir
             latest_model_path= os.path.join(self.model_dir,f"{latest_timestamp}",MODEL_FILE_NAME)
             return latest_model_path
         except Exception as e:
             raise e
 
+    def get_drift_baseline_path(self, timestamp)->str:
+        return os.path.join(self.model_dir,f"{timestamp}",DRIFT_BASELINE_FILE_NAME)
+
+    def get_latest_drift_baseline_path(self,)->str:
+        try:
+            latest_timestamp = self.get_latest_model_timestamp()
+            return self.get_drift_baseline_path(latest_timestamp)
+        except Exception as e:
+            raise e
+
     def is_model_exists(self)->bool:
-        logging.info(f"Checking if model exists at {self.model_dir}")
+        logging.info("Checking if model exists at %s", self.model_dir)
         try:
             if not os.path.exists(self.model_dir):
                 return False
@@ -0,0 +1,94 @@
+import hashlib
+import os, sys
+from dataclasses import asdict
+
+import numpy as np
+import pandas as pd
+
+from sensor.constant.training_pipeline import EVALUATION_CACHE_DIR
+from sensor.entity.artifact_entity import ClassificationMetricArtifact
+from sensor.exception import SensorException
+from sensor.logger import logging
+from sensor.utils.main_utils import read_yaml_file, write_yaml_file
+
+
+class EvaluationCache:
+    """
+    Predictions and metrics of a saved model on evaluation data, kept across training runs:
+        evaluation_cache/<model timestamp>/predictions.npz               row hashes and predictions, by hash
+        evaluation_cache/<model timestamp>/metrics/<data fingerprint>.yaml
+    A saved model never changes, so its prediction on a row is looked up by the hash of the row
+    and only rows it has not seen yet are scored.
+    """
+    def __init__(self, model_timestamp:int, cache_dir:str=EVALUATION_CACHE_DIR):
+        self.model_dir = os.path.join(cache_dir, str(model_timestamp))
+        self.predictions_file_path = os.path.join(self.model_dir, "predictions.npz")
+
+    @staticmethod
+    def get_row_hashes(dataframe:pd.DataFrame)->np.ndarray:
+        return pd.util.hash_pandas_object(dataframe, index=False).to_numpy(dtype=np.uint64)
+
+    @staticmethod
+    def get_data_fingerprint(row_hashes:np.ndarray, y_true:np.ndarray)->str:
+        data_hash = hashlib.sha256(np.ascontiguousarray(row_hashes).tobytes())
+        data_hash.update(np.ascontiguousarray(y_true, dtype=np.int8).tobytes())
+        return data_hash.hexdigest()
+
+    def get_metrics_file_path(self, fingerprint:str)->str:
+        return os.path.join(self.model_dir, "metrics", f"{fingerprint}.yaml")
+
+    def get_metrics(self, fingerprint:str)->ClassificationMetricArtifact:
+        """
+        return: metrics of the model on the data of the fingerprint, None if not cached
+        """
+        try:
+            metrics_file_path = self.get_metrics_file_path(fingerprint)
+            if not os.path.exists(metrics_file_path):
+                return None
+            return ClassificationMetricArtifact(**read_yaml_file(metrics_file_path))
+        except Exception as e:
+            raise SensorException(e, sys)
+
+    def save_metrics(self, fingerprint:str, metric:ClassificationMetricArtifact):
+        try:
+            write_yaml_file(self.get_metrics_file_path(fingerprint),
+                            {name: None if value is None else float(value)
+                             for name, value in asdict(metric).items()})
+        except Exception as e:
+            raise SensorException(e, sys)
+
+    def load_predictions(self):
+        if not os.path.exists(self.predictions_file_path):
+            return np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.int8)
+        with np.load(self.predictions_file_path) as predictions_file:
+            return predictions_file["row_hashes"], predictions_file["predictions"]
+
+    def predict(self, load_model, dataframe:pd.DataFrame, row_hashes:np.ndarray)->np.ndarray:
+        """
+        Predictions of the model on the dataframe, only the rows missing from the cache are scored
+        load_model: callable returning the model, only called when some rows are missing
+        """
+        try:
+            cached_hashes, cached_predictions = self.load_predictions()
+            positions = np.searchsorted(cached_hashes, row_hashes)
+            positions = np.minimum(positions, max(len(cached_hashes) - 1, 0))
+            is_cached = (cached_hashes[positions] == row_hashes) if len(cached_hashes) > 0 \
+                else np.zeros(len(row_hashes), dtype=bool)
+
+            y_pred = np.empty(len(row_hashes), dtype=np.int8)
+            y_pred[is_cached] = cached_predictions[positions[is_cached]]
+            missing = np.flatnonzero(~is_cached)
+            logging.info("Evaluation cache: %s cached rows, %s rows to score", len(row_hashes) - len(missing), len(missing))
+            if len(missing) > 0:
+                y_pred[missing] = load_model().predict(dataframe.iloc[missing])
+                new_hashes, first_index = np.unique(row_hashes[missing], return_index=True)
+                all_hashes = np.concatenate([cached_hashes, new_hashes])
+                all_predictions = np.concatenate([cached_predictions, y_pred[missing][first_index]])
+                order = np.argsort(all_hashes, kind="stable")
+                os.makedirs(self.model_dir, exist_ok=True)
+                tmp_file_path = os.path.join(self.model_dir, "predictions.tmp.npz")
+                np.savez(tmp_file_path, row_hashes=all_hashes[order], predictions=all_predictions[order])
+                os.replace(tmp_file_path, self.predictions_file_path)
+            return y_pred
+        except Exception as e:
+            raise SensorException(e, sys)
@@ -0,0 +1,156 @@
+import math
+import multiprocessing
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy as np
+from sklearn.metrics import log_loss
+import xgboost as xgb
+
+from sensor.exception import SensorException
+from sensor.logger import logging
+from sensor.ml.metric.classification_metric import get_confusion_matrix, get_confusion_metrics
+from sensor.ml.model.training_engine import XGBoostTrainingEngine
+
+# data of the trials, loaded once per worker process
+_worker_data = {}
+
+
+def _init_worker(train_file_path:str, train_label_file_path:str, train_index:np.ndarray, valid_index:np.ndarray,
+                 n_threads:int=1):
+    """
+    Build the DMatrix of both splits once, every trial of every rung run by the worker reuses them
+    """
+    x, y = np.load(train_file_path, mmap_mode="r"), np.load(train_label_file_path, mmap_mode="r")
+    _worker_data["dtrain"] = xgb.DMatrix(x[train_index], label=y[train_index], nthread=n_threads)
+    _worker_data["dvalid"] = xgb.DMatrix(x[valid_index], label=y[valid_index], nthread=n_threads)
+    _worker_data["y_valid"] = np.asarray(y[valid_index])
+
+
+def run_trial(trial_id:int, params:dict, n_estimators:int, early_stopping_rounds:int, n_threads:int)->dict:
+    """
+    Fit one configuration with early stopping on the validation split
+    """
+    start = time.perf_counter()
+    engine = XGBoostTrainingEngine(dict(params, n_estimators=n_estimators), tree_method=params.get("tree_method", "hist"),
+                                   n_threads=n_threads, max_bin=params.get("max_bin", 256),
+                                   early_stopping_rounds=early_stopping_rounds)
+    booster = xgb.train(engine.get_native_params(), _worker_data["dtrain"], num_boost_round=engine.num_boost_round,
+                        evals=[(_worker_data["dvalid"], "valid")], early_stopping_rounds=early_stopping_rounds,
+                        verbose_eval=False)
+    y_valid = _worker_data["y_valid"]
+    y_proba = booster.predict(_worker_data["dvalid"], iteration_range=(0, booster.best_iteration + 1))
+    valid_metrics = get_confusion_metrics(get_confusion_matrix(y_valid, y_proba > 0.5))
+    return {
+        "trial": trial_id,
+        "params": params,
+        "n_estimators": n_estimators,
+        "best_iteration": int(booster.best_iteration),
+        "valid_logloss": float(log_loss(y_valid, y_proba, labels=[0, 1])),
+        "valid_f1": float(valid_metrics["f1_score"]),
+        "valid_cost": float(valid_metrics["cost"]),
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+class SuccessiveHalvingSearch:
+    """
+    Successive halving over XGBoost parameters sampled from a search space of choices.
+    Every rung fits the remaining configurations with eta times more boosting rounds than the
+    previous one and keeps the best 1/eta by validation log loss. Trials run on a pool of
+    processes, each limited to n_threads threads so that the cores are not oversubscribed.
+    Once the time budget is spent no trial is started, the queued ones are cancelled and the
+    search returns without waiting for the running ones, whose results are dropped.
+    """
+    def __init__(self, search_space:dict, n_configs:int, min_estimators:int, max_estimators:int, eta:int=3,
+                 early_stopping_rounds:int=20, n_threads:int=1, n_workers:int=None,
+                 time_budget_seconds:float=None, random_state:int=None, fixed_params:dict=None):
+        """
+        fixed_params: XGBoost parameters shared by every trial
+        """
+        self.search_space = search_space
+        self.fixed_params = fixed_params or {}
+        self.n_configs = n_configs
+        self.min_estimators = min_estimators
+        self.max_estimators = max_estimators
+        self.eta = eta
+        self.early_stopping_rounds = early_stopping_rounds
+        self.n_threads = n_threads
+        self.n_workers = n_workers or max(1, multiprocessing.cpu_count() // n_threads)
+        self.time_budget_seconds = time_budget_seconds
+        self.random_state = random_state
+        self.leaderboard = []
+
+    def sample_configs(self)->list:
+        rng = np.random.default_rng(self.random_state)
+        configs = []
+        for _ in range(self.n_configs):
+            configs.append({name: values[int(rng.integers(len(values)))] for name, values in sorted(self.search_space.items())})
+        return configs
+
+    def get_rungs(self)->list:
+        """
+        return: (number of configurations, boosting rounds) of every rung
+        """
+        n_rungs = max(1, int(math.floor(math.log(self.max_estimators / self.min_estimators, self.eta))) + 1)
+        rungs = []
+        for rung in range(n_rungs):
+            n_configs = max(1, self.n_configs // self.eta ** rung)
+            rungs.append((n_configs, min(self.max_estimators, self.min_estimators * self.eta ** rung)))
+        return rungs
+
+    def search(self, train_file_path:str, train_label_file_path:str, train_index:np.ndarray, valid_index:np.ndarray)->dict:
+        """
+        train_file_path, train_label_file_path: numpy arrays of the features and of the labels
+        return: best trial, None if the budget was spent before any trial completed
+        """
+        try:
+            deadline = None if self.time_budget_seconds is None else time.monotonic() + self.time_budget_seconds
+            configs = list(enumerate(self.sample_configs()))
+            best_trial = None
+            executor = ProcessPoolExecutor(max_workers=self.n_workers, mp_context=multiprocessing.get_context("spawn"),
+                                           initializer=_init_worker,
+                                           initargs=(train_file_path, train_label_file_path, train_index, valid_index,
+                                                     self.n_threads))
+            budget_spent = False
+            futures = []
+            try:
+                for rung, (n_configs, n_estimators) in enumerate(self.get_rungs()):
+                    if deadline is not None and time.monotonic() >= deadline:
+                        logging.info("Hyper parameter search time budget spent")
+                        budget_spent = True
+                        break
+                    configs = configs[:n_configs]
+                    logging.info("Rung %s: %s configurations with %s boosting rounds", rung, len(configs), n_estimators)
+                    futures = [executor.submit(run_trial, trial_id, dict(self.fixed_params, **params), n_estimators,
+                                               self.early_stopping_rounds, self.n_threads)
+                               for trial_id, params in configs]
+                    results = []
+                    pending = set(futures)
+                    while len(pending) > 0:
+                        timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+                        done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                        results.extend([dict(future.result(), rung=rung) for future in done])
+                        if len(done) == 0:
+                            logging.info("Hyper parameter search time budget spent, dropping %s trials", len(pending))
+                            budget_spent = True
+                            break
+                    if len(results) == 0:
+                        break
+                    results.sort(key=lambda result: result["valid_logloss"])
+                    self.leaderboard.extend(results)
+                    best_trial = results[0]
+                    configs = [(result["trial"], result["params"]) for result in results]
+                    configs = configs[:max(1, len(configs) // self.eta)]
+            finally:
+                # once the budget is spent the queued trials are cancelled and the running ones are not
+                # waited for, their workers are left to finish in the background
+                for future in futures:
+                    future.cancel()
+                executor.shutdown(wait=not budget_spent)
+            self.leaderboard.sort(key=lambda result: (-result["rung"], result["valid_logloss"]))
+            logging.info("Best hyper parameters: %s", best_trial)
+            return best_trial
+        except Exception as e:
+            raise SensorException(e, sys)
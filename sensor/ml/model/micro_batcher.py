@@ -0,0 +1,94 @@
+import asyncio
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from sensor.constant.prediction_pipeline import MICRO_BATCH_MAX_SIZE, MICRO_BATCH_MAX_WAIT_MS
+from sensor.exception import SensorException
+from sensor.logger import logging
+from sensor.ml.model.model_cache import ModelCache
+
+
+class MicroBatcher:
+    """
+    Combine the rows of concurrent prediction requests into one vectorized SensorModel.predict call.
+    A batch is closed when it holds max_batch_size rows or when max_wait_ms has passed since its
+    first request. Scoring runs on a single worker thread so the event loop is never blocked, and
+    requests arriving while a batch is scored are collected into the next one.
+    """
+    def __init__(self, max_batch_size:int=MICRO_BATCH_MAX_SIZE, max_wait_ms:float=MICRO_BATCH_MAX_WAIT_MS):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = None
+        self._collector = None
+        self._executor = None
+
+    def start(self):
+        """
+        Must be called from the running event loop
+        """
+        self._queue = asyncio.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="micro-batch")
+        self._collector = asyncio.get_running_loop().create_task(self._collect_batches())
+        logging.info("Micro batching started with max batch size %s and max wait %s ms", self.max_batch_size, self.max_wait * 1000)
+
+    async def stop(self):
+        if self._collector is not None:
+            self._collector.cancel()
+            try:
+                await self._collector
+            except asyncio.CancelledError:
+                pass
+            self._collector = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    async def predict(self, dataframe:pd.DataFrame)->np.ndarray:
+        """
+        Queue the rows of one request and wait for their predictions
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((dataframe, future))
+        return await future
+
+    async def _collect_batches(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            n_rows = len(batch[0][0])
+            deadline = loop.time() + self.max_wait
+            while n_rows < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                n_rows += len(item[0])
+            await self._predict_batch(batch)
+
+    @staticmethod
+    def _predict_combined(dataframes:list)->np.ndarray:
+        model = ModelCache.get_model()
+        return model.predict(pd.concat(dataframes, ignore_index=True))
+
+    async def _predict_batch(self, batch:list):
+        futures = [future for _, future in batch]
+        try:
+            dataframes = [dataframe for dataframe, _ in batch]
+            y_pred = await asyncio.get_running_loop().run_in_executor(
+                self._executor, self._predict_combined, dataframes)
+            offsets = np.cumsum([len(dataframe) for dataframe in dataframes])[:-1]
+            for future, request_pred in zip(futures, np.split(np.asarray(y_pred), offsets)):
+                if not future.done():
+                    future.set_result(request_pred)
+        except Exception as e:
+            error = SensorException(e, sys)
+            for future in futures:
+                if not future.done():
+                    future.set_exception(error)
@@ -0,0 +1,107 @@
+import os, sys
+from datetime import datetime
+
+import numpy as np
+import xgboost
+from xgboost import Booster
+
+from sensor.constant.training_pipeline import (SCHEMA_FILE_PATH, MODEL_BUNDLE_MANIFEST_FILE_NAME,
+    MODEL_BUNDLE_BOOSTER_FILE_NAME, MODEL_BUNDLE_PREPROCESSOR_FILE_NAME, MODEL_BUNDLE_FORMAT_VERSION)
+from sensor.exception import SensorException
+from sensor.logger import logging
+from sensor.ml.model.estimator import SensorModel
+from sensor.utils.main_utils import read_yaml_file, write_yaml_file, get_file_hash, load_object
+
+
+class ModelBundle:
+    """
+    Versioned on-disk format of a SensorModel:
+        manifest.yaml      format version, schema hash, metrics and file names
+        booster.ubj        XGBoost booster in its native binary format
+        preprocessor.npz   imputer fill values, scaler center and scale, feature names
+    """
+
+    @staticmethod
+    def save(bundle_dir:str, sensor_model:SensorModel, metrics:dict=None)->bool:
+        """
+        return: False when the model has no fast inference path and cannot be bundled
+        """
+        try:
+            inference_params = sensor_model.get_inference_params()
+            if inference_params is None:
+                logging.info("Model preprocessor is not supported by the model bundle format")
+                return False
+            os.makedirs(bundle_dir, exist_ok=True)
+            inference_params["booster"].save_model(os.path.join(bundle_dir, MODEL_BUNDLE_BOOSTER_FILE_NAME))
+            feature_names = inference_params["feature_names"]
+            np.savez(os.path.join(bundle_dir, MODEL_BUNDLE_PREPROCESSOR_FILE_NAME),
+                     fill_values=inference_params["fill_values"],
+                     center=inference_params["center"],
+                     scale=inference_params["scale"],
+                     feature_names=np.array([] if feature_names is None else list(feature_names), dtype=str))
+            manifest = {
+                "format_version": MODEL_BUNDLE_FORMAT_VERSION,
+                "created_at": datetime.now().isoformat(),
+                "schema_hash": get_file_hash(SCHEMA_FILE_PATH),
+                "xgboost_version": xgboost.__version__,
+                "n_features": int(inference_params["n_features"]),
+                "iteration_range": list(inference_params["iteration_range"]),
+                "booster_file": MODEL_BUNDLE_BOOSTER_FILE_NAME,
+                "preprocessor_file": MODEL_BUNDLE_PREPROCESSOR_FILE_NAME,
+                "metrics": metrics or {},
+            }
+            write_yaml_file(os.path.join(bundle_dir, MODEL_BUNDLE_MANIFEST_FILE_NAME), manifest)
+            logging.info("Model bundle saved at %s", bundle_dir)
+            return True
+        except Exception as e:
+            raise SensorException(e, sys)
+
+    @staticmethod
+    def load(bundle_dir:str)->SensorModel:
+        """
+        Read the manifest and preprocessing parameters. The booster is only read on the first prediction.
+        """
+        try:
+            manifest = read_yaml_file(os.path.join(bundle_dir, MODEL_BUNDLE_MANIFEST_FILE_NAME))
+            if manifest["format_version"] > MODEL_BUNDLE_FORMAT_VERSION:
+                raise Exception(f"Model bundle format version {manifest['format_version']} is not supported")
+            schema_hash = get_file_hash(SCHEMA_FILE_PATH)
+            if manifest["schema_hash"] != schema_hash:
+                logging.info("Model bundle %s was trained with a different schema", bundle_dir)
+            with np.load(os.path.join(bundle_dir, manifest["preprocessor_file"])) as preprocessor_file:
+                feature_names = preprocessor_file["feature_names"]
+                inference_params = {
+                    "feature_names": feature_names.astype(object) if len(feature_names) > 0 else None,
+                    "n_features": manifest["n_features"],
+                    "fill_values": preprocessor_file["fill_values"],
+                    "center": preprocessor_file["center"],
+                    "scale": preprocessor_file["scale"],
+                }
+            booster_file_path = os.path.join(bundle_dir, manifest["booster_file"])
+
+            def load_booster()->Booster:
+                booster = Booster()
+                booster.load_model(booster_file_path)
+                logging.info("Booster loaded from %s", booster_file_path)
+                return booster
+
+            inference_params.update({
+                "booster": None,
+                "load_booster": load_booster,
+                "iteration_range": tuple(manifest["iteration_range"]),
+            })
+            return SensorModel.from_inference_params(inference_params)
+        except Exception as e:
+            raise SensorException(e, sys)
+
+
+def load_sensor_model(model_path:str)->SensorModel:
+    """
+    Load a model bundle directory, or a dill pickled SensorModel for model.pkl files
+    """
+    try:
+        if os.path.isdir(model_path):
+            return ModelBundle.load(model_path)
+        return load_object(file_path=model_path)
+    except Exception as e:
+        raise SensorException(e, sys)
@@ -0,0 +1,101 @@
+import sys
+import threading
+
+from sensor.constant.prediction_pipeline import SAVED_MODEL_DIR, MODEL_CACHE_REFRESH_INTERVAL_SECONDS
+from sensor.exception import SensorException
+from sensor.logger import logging
+from sensor.ml.model.estimator import SensorModel, ModelResolver
+from sensor.ml.model.model_bundle import load_sensor_model
+from sensor.utils.s3_utils import sync_saved_model_dir_from_s3
+
+
+class ModelCache:
+    """
+    Process wide cache of the latest saved model keyed by its saved_models/<timestamp>.
+    The cached entry is a (timestamp, model) tuple which is replaced in a single
+    assignment, so in-flight requests keep the model they already hold while new
+    requests pick up the new one.
+    """
+    _entry = None
+    _refresh_lock = threading.Lock()
+    _refresh_thread = None
+    _stop_event = threading.Event()
+
+    @classmethod
+    def get_model(cls)->SensorModel:
+        return cls.get_entry()[1]
+
+    @classmethod
+    def get_entry(cls)->tuple:
+        """
+        return: (timestamp, model) of the cached model, read together so that both belong to the same model
+        """
+        try:
+            entry = cls._entry
+            if entry is None:
+                cls.refresh()
+                entry = cls._entry
+            if entry is None:
+                raise Exception("Model not available")
+            return entry
+        except Exception as e:
+            raise SensorException(e,sys)
+
+    @classmethod
+    def get_model_timestamp(cls):
+        entry = cls._entry
+        return None if entry is None else entry[0]
+
+    @classmethod
+    def refresh(cls, sync_from_s3:bool=True)->bool:
+        """
+        Load the latest saved model if it is newer than the cached one.
+        return: True if the cached model was swapped
+        """
+        try:
+            with cls._refresh_lock:
+                if sync_from_s3:
+                    logging.info("Syncing saved model from S3 bucket")
+                    sync_saved_model_dir_from_s3()
+                model_resolver = ModelResolver(model_dir=SAVED_MODEL_DIR)
+                if not model_resolver.is_model_exists():
+                    logging.info("Model not available")
+                    return False
+                latest_timestamp = model_resolver.get_latest_model_timestamp()
+                if cls._entry is not None and cls._entry[0] >= latest_timestamp:
+                    return False
+                best_model_path = model_resolver.get_latest_model_path()
+                model:SensorModel = load_sensor_model(best_model_path)
+                # swapped in fully loaded so that no request pays for reading the booster
+                model.warm_up()
+                cls._entry = (latest_timestamp, model)
+                logging.info("Model cache loaded model [%s]", best_model_path)
+                return True
+        except Exception as e:
+            raise SensorException(e,sys)
+
+    @classmethod
+    def _refresh_forever(cls, interval:int):
+        while not cls._stop_event.wait(interval):
+            try:
+                cls.refresh()
+            except Exception as e:
+                # keep serving the cached model, try again on the next tick
+                logging.info("Model cache refresh failed: %s", e)
+
+    @classmethod
+    def start_background_refresh(cls, interval:int=MODEL_CACHE_REFRESH_INTERVAL_SECONDS):
+        if cls._refresh_thread is not None and cls._refresh_thread.is_alive():
+            return
+        cls._stop_event.clear()
+        cls._refresh_thread = threading.Thread(target=cls._refresh_forever, args=(interval,),
+                                               name="model-cache-refresh", daemon=True)
+        cls._refresh_thread.start()
+        logging.info("Model cache background refresh started every %s seconds", interval)
+
+    @classmethod
+    def stop_background_refresh(cls):
+        cls._stop_event.set()
+        if cls._refresh_thread is not None:
+            cls._refresh_thread.join()
+            cls._refresh_thread = None
@@ -0,0 +1,155 @@
+import sys
+import time
+
+import numpy as np
+import xgboost as xgb
+from xgboost import XGBClassifier
+
+from sensor.entity.artifact_entity import ClassificationMetricArtifact
+from sensor.exception import SensorException
+from sensor.logger import logging
+from sensor.ml.metric.classification_metric import get_confusion_matrix, get_confusion_metrics
+
+# XGBClassifier parameters which are named differently by xgboost.train
+SKLEARN_TO_NATIVE_PARAMS = {"n_jobs": "nthread", "learning_rate": "eta", "reg_lambda": "lambda", "reg_alpha": "alpha"}
+# parameters owned by the engine, dropped from the given ones (the search trials carry some of them)
+ENGINE_PARAMS = ("tree_method", "max_bin", "n_jobs", "nthread", "objective", "eval_metric")
+
+
+def classification_metrics(predt:np.ndarray, dmatrix:xgb.DMatrix)->list:
+    """
+    Custom metric of xgboost.train logging precision, recall, f1 score and cost at the 0.5 threshold
+    """
+    metrics = get_confusion_metrics(get_confusion_matrix(dmatrix.get_label(), predt > 0.5))
+    return [("precision", float(metrics["precision_score"])), ("recall", float(metrics["recall_score"])),
+            ("f1", float(metrics["f1_score"])), ("cost", float(metrics["cost"]))]
+
+
+class NumpyChunkIter(xgb.DataIter):
+    """
+    Feeds xgboost one chunk at a time, each chunk being a memory-mapped array of features and
+    one of labels
+    """
+    def __init__(self, file_paths:list, label_file_paths:list, cache_prefix:str=None):
+        self.file_paths = list(file_paths)
+        self.label_file_paths = list(label_file_paths)
+        self._index = 0
+        super().__init__(cache_prefix=cache_prefix)
+
+    def next(self, input_data)->int:
+        if self._index == len(self.file_paths):
+            return 0
+        input_data(data=np.load(self.file_paths[self._index], mmap_mode="r"),
+                   label=np.load(self.label_file_paths[self._index], mmap_mode="r"))
+        self._index += 1
+        return 1
+
+    def reset(self):
+        self._index = 0
+
+
+class XGBoostTrainingEngine:
+    """
+    Trains a binary XGBoost model through xgboost.train with the hist tree method and an explicit
+    thread count. Each array is turned into a DMatrix once per engine, boosting stops early on the log loss
+    of the evaluation data, and the train and evaluation metrics are read from the evaluation log
+    instead of predicting again.
+    """
+    def __init__(self, params:dict=None, tree_method:str="hist", n_threads:int=1, max_bin:int=256,
+                 num_boost_round:int=1000, early_stopping_rounds:int=20):
+        """
+        params: XGBClassifier parameters, n_estimators being the number of boosting rounds
+        """
+        self.params = {name: value for name, value in (params or {}).items() if name not in ENGINE_PARAMS}
+        self.num_boost_round = self.params.pop("n_estimators", num_boost_round)
+        self.tree_method = tree_method
+        self.n_threads = n_threads
+        self.max_bin = max_bin
+        self.early_stopping_rounds = early_stopping_rounds
+        self._dmatrix_cache = {}
+
+    def get_dmatrix(self, name:str, x:np.ndarray, y:np.ndarray)->xgb.DMatrix:
+        """
+        DMatrix of the array, built once by engine and name
+        """
+        if name not in self._dmatrix_cache:
+            self._dmatrix_cache[name] = xgb.DMatrix(x, label=y, nthread=self.n_threads)
+        return self._dmatrix_cache[name]
+
+    def get_iterator_dmatrix(self, name:str, data_iter:xgb.DataIter, ref:xgb.DMatrix=None)->xgb.DMatrix:
+        """
+        DMatrix built from a data iterator without holding the whole data in memory: a quantile
+        DMatrix when xgboost has it, else an external memory DMatrix cached on disk under the
+        cache prefix of the iterator
+        """
+        if name not in self._dmatrix_cache:
+            if hasattr(xgb, "QuantileDMatrix"):
+                self._dmatrix_cache[name] = xgb.QuantileDMatrix(data_iter, max_bin=self.max_bin,
+                                                                nthread=self.n_threads, ref=ref)
+            else:
+                self._dmatrix_cache[name] = xgb.DMatrix(data_iter, nthread=self.n_threads)
+        return self._dmatrix_cache[name]
+
+    def get_native_params(self)->dict:
+        native_params = {SKLEARN_TO_NATIVE_PARAMS.get(name, name): value for name, value in self.params.items()}
+        native_params.update({
+            "objective": "binary:logistic",
+            "eval_metric": "logloss",
+            "tree_method": self.tree_method,
+            "max_bin": self.max_bin,
+            "nthread": self.n_threads,
+        })
+        return native_params
+
+    def train(self, x_train:np.ndarray, y_train:np.ndarray, x_eval:np.ndarray, y_eval:np.ndarray):
+        """
+        return: fitted XGBClassifier, evaluation log {"train"|"eval": {metric: [value by round]}}, training seconds
+        """
+        try:
+            return self.train_dmatrix(self.get_dmatrix("train", x_train, y_train), self.get_dmatrix("eval", x_eval, y_eval))
+        except Exception as e:
+            raise SensorException(e, sys)
+
+    def train_from_iterators(self, train_iter:xgb.DataIter, eval_iter:xgb.DataIter):
+        """
+        Out-of-core training, the data is read chunk by chunk from the iterators
+        return: same as train()
+        """
+        try:
+            dtrain = self.get_iterator_dmatrix("train", train_iter)
+            return self.train_dmatrix(dtrain, self.get_iterator_dmatrix("eval", eval_iter, ref=dtrain))
+        except Exception as e:
+            raise SensorException(e, sys)
+
+    def train_dmatrix(self, dtrain:xgb.DMatrix, deval:xgb.DMatrix):
+        try:
+            evals_result = {}
+            start = time.perf_counter()
+            booster = xgb.train(
+                self.get_native_params(), dtrain, num_boost_round=self.num_boost_round,
+                evals=[(dtrain, "train"), (deval, "eval")], evals_result=evals_result,
+                custom_metric=classification_metrics, verbose_eval=False,
+                # with a custom metric the built-in early stopping would watch its last value, the cost
+                callbacks=[xgb.callback.EarlyStopping(rounds=self.early_stopping_rounds, metric_name="logloss",
+                                                      data_name="eval", save_best=False)])
+            training_time = time.perf_counter() - start
+            logging.info("Trained %s rounds in %.2f seconds, best iteration %s", booster.num_boosted_rounds(), training_time, booster.best_iteration)
+
+            # wrapped so that the model is used and saved like a fitted XGBClassifier
+            model = XGBClassifier(n_estimators=booster.num_boosted_rounds(), tree_method=self.tree_method,
+                                  max_bin=self.max_bin, n_jobs=self.n_threads, objective="binary:logistic",
+                                  **self.params)
+            model._Booster = booster
+            model.classes_ = np.array([0, 1])
+            model.n_classes_ = 2
+            return model, evals_result, training_time
+        except Exception as e:
+            raise SensorException(e, sys)
+
+    @staticmethod
+    def get_metric_artifact(evals_result:dict, data_name:str, iteration:int)->ClassificationMetricArtifact:
+        metrics = evals_result[data_name]
+        return ClassificationMetricArtifact(f1_score=float(metrics["f1"][iteration]),
+                                            precision_score=float(metrics["precision"][iteration]),
+                                            recall_score=float(metrics["recall"][iteration]),
+                                            cost=float(metrics["cost"][iteration]))
@@ -0,0 +1,94 @@
+import contextvars
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from sensor.exception import SensorException
+from sensor.logger import logging
+
+
+@dataclass
+class StageNode:
+    name: str
+    function: object
+    inputs: list = field(default_factory=list)
+
+
+class DAGExecutor:
+    """
+    Runs stages as soon as the stages they take their inputs from are completed, independent
+    stages running concurrently on a thread pool. A stage function is called with the outputs
+    of its input stages, in the order they are declared.
+    The start, end and duration of every stage are kept in timeline.
+    """
+    def __init__(self, max_workers:int):
+        self.max_workers = max_workers
+        self.stages = {}
+        self.timeline = []
+        self._timeline_lock = threading.Lock()
+
+    def add_stage(self, name:str, function, inputs:list=None):
+        inputs = list(inputs or [])
+        for input_name in inputs:
+            if input_name not in self.stages:
+                raise Exception(f"Stage {name} depends on unknown stage {input_name}")
+        self.stages[name] = StageNode(name=name, function=function, inputs=inputs)
+
+    def _run_stage(self, stage:StageNode, outputs:dict):
+        started_at = datetime.now()
+        start = time.perf_counter()
+        status = "failed"
+        try:
+            output = stage.function(*[outputs[input_name] for input_name in stage.inputs])
+            status = "completed"
+            return output
+        finally:
+            with self._timeline_lock:
+                self.timeline.append({
+                    "stage": stage.name,
+                    "status": status,
+                    "inputs": stage.inputs,
+                    "started_at": started_at.isoformat(),
+                    "finished_at": datetime.now().isoformat(),
+                    "duration_seconds": round(time.perf_counter() - start, 3),
+                    "thread": threading.current_thread().name,
+                })
+
+    def run(self)->dict:
+        """
+        return: output of every stage by stage name. On the first failure no further stage is
+        started, the running ones are waited for and the error is raised.
+        """
+        try:
+            outputs = {}
+            pending = dict(self.stages)
+            running = {}
+            error = None
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="pipeline-stage") as executor:
+                while len(pending) > 0 or len(running) > 0:
+                    if error is None:
+                        for name in [name for name, stage in pending.items()
+                                     if all(input_name in outputs for input_name in stage.inputs)]:
+                            stage = pending.pop(name)
+                            logging.info("Starting stage %s", name)
+                            # run in a copy of the caller's context so that the stage logs carry its run id
+                            running[executor.submit(contextvars.copy_context().run, self._run_stage, stage,
+                                                    dict(outputs))] = name
+                    if len(running) == 0:
+                        break
+                    done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                    for future in done:
+                        name = running.pop(future)
+                        try:
+                            outputs[name] = future.result()
+                        except Exception as e:
+                            logging.info("Stage %s failed: %s", name, e)
+                            error = error or e
+            if error is not None:
+                raise error
+            return outputs
+        except Exception as e:
+            raise SensorException(e, sys)
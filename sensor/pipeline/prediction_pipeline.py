@@ -5,23 +5,36 @@ import numpy as np
 
 from sensor.entity.config_entity import PredictionPipelineConfig
 from sensor.component.prediction_data_validation import PredictionDataValidation
-from sensor.ml.model.estimator import SensorModel, ModelResolver, TargetValueMapping
+from sensor.ml.model.estimator import SensorModel, TargetValueMapping
+from sensor.ml.model.model_cache import ModelCache
 from sensor.exception import SensorException
-from sensor.logger import logging
+from sensor.logger import logging, LazyVars
 from sensor.constant import prediction_pipeline
-from sensor.utils.s3_utils import sync_saved_model_dir_from_s3, sync_prediction_artifact_dir_to_s3, get_predicted_s3_filepath
-from sensor.utils.main_utils import load_object
+from sensor.utils.s3_utils import queue_prediction_artifact_dir_to_s3, get_predicted_s3_filepath
 from sensor.utils.main_utils import read_yaml_file
 
 class PredictionPipeline:
-    def __init__(self, remote_input_file_path):
+    _cached_schema_config = None
+
+    def __init__(self, remote_input_file_path=None):
         self.prediction_pipeline_config = PredictionPipelineConfig()
         self.download_url = remote_input_file_path
-        self._schema_config = read_yaml_file(prediction_pipeline.SCHEMA_FILE_PATH)
+        # saved_models/<timestamp> of the model loaded by load_model, its drift baseline is next to it
+        self.model_timestamp = None
+        self._schema_config = self.get_schema_config()
 
-    def load_input_data(self)->pd.DataFrame:
+    @classmethod
+    def get_schema_config(cls)->dict:
         """
-        Read data from the specified file path
+        Schema is read once per process so that in-memory predictions never touch the filesystem
+        """
+        if cls._cached_schema_config is None:
+            cls._cached_schema_config = read_yaml_file(prediction_pipeline.SCHEMA_FILE_PATH)
+        return cls._cached_schema_config
+
+    def download_input_file(self)->str:
+        """
+        Download the input file from the specified url into the prediction artifact folder
         """
         try:
             # folder location to download file
@@ -32,30 +45,73 @@ class PredictionPipeline:
             self.data_file_name = os.path.basename(self.download_url)
             # complete path to download
             self.input_file_path = os.path.join(input_dir, self.data_file_name)            
-            logging.info(f"Downloading file [{self.download_url}]")
+            logging.info("Downloading file [%s]", self.download_url)
             # get file from url
             urllib.request.urlretrieve(self.download_url, self.input_file_path)
-            logging.info(f"Download completed. Input file at [{self.input_file_path}]") 
+            logging.info("Download completed. Input file at [%s]", self.input_file_path) 
+            return self.input_file_path
+        except Exception as e:
+            raise SensorException(e,sys)
+
+    def load_input_data(self)->pd.DataFrame:
+        """
+        Read data from the specified file path
+        """
+        try:
+            if not hasattr(self, "input_file_path"):
+                self.download_input_file()
             dataframe = pd.read_csv(self.input_file_path, index_col=False, na_values = "na", keep_default_na=True)
-            logging.info(f"Drop unnecessary columns") 
+            logging.info("Drop unnecessary columns") 
             dataframe = dataframe.drop(self._schema_config["drop_columns"],axis=1) 
-            dataframe = dataframe
           
             return dataframe
         except Exception as e:
             raise SensorException(e,sys)
 
+    def prepare_input_records(self, records:list)->pd.DataFrame:
+        """
+        Build and validate the input dataframe from in-memory records keyed by the schema columns
+        """
+        try:
+            dataframe = pd.DataFrame.from_records(records)
+            dataframe = dataframe.drop(columns=self._schema_config["drop_columns"], errors="ignore")
+            dataframe = dataframe.replace({"na": np.nan}).apply(pd.to_numeric)
+            PredictionDataValidation(dataframe, self.prediction_pipeline_config,
+            schema_config=self._schema_config).initiate_data_validation(check_drift=False)
+            return dataframe[self._schema_config["numerical_columns"]]
+        except Exception as e:
+            raise SensorException(e,sys)
+
+    def predict_records(self, records:list)->list:
+        """
+        Predict a batch of in-memory records without any download or disk round-trip
+        return: list of predicted class labels in the order of the records
+        """
+        try:
+            input_df = self.prepare_input_records(records)
+            return self.get_predicted_labels(self.predict_input_dataframe(input_df))
+        except Exception as e:
+            raise SensorException(e,sys)
+
+    def predict_input_dataframe(self, input_df:pd.DataFrame)->np.ndarray:
+        """
+        Predict a dataframe returned by prepare_input_records with the cached model
+        """
+        try:
+            model:SensorModel = self.load_model()
+            return model.predict(input_df)
+        except Exception as e:
+            raise SensorException(e,sys)
+
+    @staticmethod
+    def get_predicted_labels(y_pred)->list:
+        reverse_mapping = TargetValueMapping().reverse_mapping()
+        return [reverse_mapping[int(value)] for value in y_pred]
+
     def load_model(self)->SensorModel:
         try:
-            logging.info("Syncing saved model from S3 bucket")
-            sync_saved_model_dir_from_s3()
-            model_resolver = ModelResolver(model_dir=prediction_pipeline.SAVED_MODEL_DIR)
-            if not model_resolver.is_model_exists():
-                logging.info("Model not available")
-                raise Exception("Model not available")       
-            best_model_path = model_resolver.get_latest_model_path()
-            model:SensorModel = load_object(file_path=best_model_path)
-            logging.info("Best model loaded")
+            self.model_timestamp, model = ModelCache.get_entry()
+            logging.info("Best model [%s] taken from model cache", self.model_timestamp)
             return model
         except Exception as e:
             raise SensorException(e,sys)
@@ -80,19 +136,69 @@ class PredictionPipeline:
             # complete path to download
             self.output_file_path = os.path.join(output_dir, self.data_file_name)   
             output_df.to_csv(self.output_file_path, index=False)  
-            logging.info(f"Output written to {self.output_file_path}")                      
+            logging.info("Output written to %s", self.output_file_path)                      
         except Exception as e:
             raise SensorException(e,sys)
 
-    def run_pipeline(self):
+    def predict_in_chunks(self, chunk_size:int=prediction_pipeline.PREDICTION_CHUNK_SIZE, progress_callback=None)->bool:
+        """
+        Read, validate, score and append the input file chunk by chunk so that memory
+        stays bounded by chunk_size whatever the size of the input file.
+        Data drift is checked on the first chunk.
+        progress_callback: optional callable(chunk_number, rows_processed)
+        return: drift status of the first chunk
+        """
         try:
-            logging.info(f"Prediction pipeline started with config {self.prediction_pipeline_config.__dict__}")
-            input_df:pd.DataFrame = self.load_input_data()
-            status = PredictionDataValidation(input_df,self.prediction_pipeline_config).initiate_data_validation()
+            output_dir = self.prediction_pipeline_config.output_dir
+            os.makedirs(output_dir, exist_ok=True)
+            self.output_file_path = os.path.join(output_dir, self.data_file_name)
             model:SensorModel = self.load_model()
-            output_df:pd.DataFrame = self.predict_the_output(input_df, model)
-            self.save_result(output_df)
-            sync_prediction_artifact_dir_to_s3(prediction_artifact_dir = self.prediction_pipeline_config.prediction_artifact_dir, 
+            status = True
+            rows_processed = 0
+            reader = pd.read_csv(self.input_file_path, index_col=False, na_values = "na", keep_default_na=True,
+                                 chunksize=chunk_size)
+            for chunk_number, chunk in enumerate(reader, start=1):
+                chunk = chunk.drop(self._schema_config["drop_columns"],axis=1)
+                data_validation = PredictionDataValidation(chunk, self.prediction_pipeline_config,
+                                                           schema_config=self._schema_config,
+                                                           model_timestamp=self.model_timestamp)
+                if chunk_number == 1:
+                    status = data_validation.initiate_data_validation()
+                else:
+                    data_validation.initiate_data_validation(check_drift=False)
+                output_chunk = self.predict_the_output(chunk, model)
+                output_chunk.to_csv(self.output_file_path, index=False, mode="w" if chunk_number == 1 else "a",
+                                    header=chunk_number == 1)
+                rows_processed += len(output_chunk)
+                logging.info("Chunk %s scored. %s rows written to %s", chunk_number, rows_processed, self.output_file_path)
+                if progress_callback is not None:
+                    progress_callback(chunk_number, rows_processed)
+            return status
+        except Exception as e:
+            raise SensorException(e,sys)
+
+    def run_pipeline(self, streaming:bool=None):
+        """
+        streaming: score the input chunk by chunk. When None, streaming is used for input files
+        larger than PREDICTION_STREAMING_THRESHOLD_BYTES
+        """
+        try:
+            logging.info("Prediction pipeline started with config %s", LazyVars(self.prediction_pipeline_config))
+            self.download_input_file()
+            if streaming is None:
+                streaming = os.path.getsize(self.input_file_path) > prediction_pipeline.PREDICTION_STREAMING_THRESHOLD_BYTES
+            if streaming:
+                logging.info("Streaming prediction started")
+                status = self.predict_in_chunks()
+            else:
+                input_df:pd.DataFrame = self.load_input_data()
+                model:SensorModel = self.load_model()
+                status = PredictionDataValidation(input_df,self.prediction_pipeline_config,
+                schema_config=self._schema_config, model_timestamp=self.model_timestamp).initiate_data_validation()
+                output_df:pd.DataFrame = self.predict_the_output(input_df, model)
+                self.save_result(output_df)
+            # the results are on local disk, the upload to S3 is left to the background upload queue
+            queue_prediction_artifact_dir_to_s3(prediction_artifact_dir = self.prediction_pipeline_config.prediction_artifact_dir,
             time_stamp = self.prediction_pipeline_config.timestamp)
             s3_output_file = get_predicted_s3_filepath(time_stamp = self.prediction_pipeline_config.timestamp, 
             file_name = self.data_file_name)
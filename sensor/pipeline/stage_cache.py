@@ -0,0 +1,103 @@
+import json
+import os, sys
+from dataclasses import asdict, fields, is_dataclass
+from datetime import datetime
+import hashlib
+
+from sensor.constant.training_pipeline import ARTIFACT_DIR, SCHEMA_FILE_PATH, STAGE_CACHE_DIR, STAGE_CACHE_VERSION
+from sensor.entity import artifact_entity
+from sensor.exception import SensorException
+from sensor.logger import logging
+from sensor.utils.main_utils import read_yaml_file, write_yaml_file, get_file_hash, get_path_hash
+
+
+class StageCache:
+    """
+    Artifacts of completed training stages indexed by the fingerprint of their inputs:
+        stage_cache/<stage>/<fingerprint>.yaml
+    The fingerprint covers the content of the stage input files, the schema and the stage
+    parameters, i.e. its config without the paths into the artifact directory of the run.
+    A stage whose fingerprint was already recorded reuses the artifact of that run, so a
+    failed run picks up again from the first stage that did not complete.
+    """
+    def __init__(self, cache_dir:str=STAGE_CACHE_DIR):
+        self.cache_dir = cache_dir
+
+    @staticmethod
+    def get_stage_params(config)->dict:
+        """
+        Config values of a stage, leaving out the paths which change with every run
+        """
+        return {name: value for name, value in sorted(vars(config).items())
+                if not (isinstance(value, str) and value.startswith(ARTIFACT_DIR))}
+
+    def get_fingerprint(self, stage:str, config, input_file_paths:list)->str:
+        try:
+            content = {
+                "version": STAGE_CACHE_VERSION,
+                "stage": stage,
+                "schema": get_file_hash(SCHEMA_FILE_PATH),
+                "params": self.get_stage_params(config),
+                "inputs": [get_path_hash(file_path) for file_path in input_file_paths],
+            }
+            return hashlib.sha256(json.dumps(content, sort_keys=True, default=str).encode()).hexdigest()
+        except Exception as e:
+            raise SensorException(e, sys)
+
+    def get_entry_file_path(self, stage:str, fingerprint:str)->str:
+        return os.path.join(self.cache_dir, stage, f"{fingerprint}.yaml")
+
+    @staticmethod
+    def get_artifact_paths(artifact_dict:dict)->list:
+        paths = []
+        for value in artifact_dict.values():
+            if isinstance(value, dict):
+                paths.extend(StageCache.get_artifact_paths(value))
+            elif isinstance(value, str) and os.path.exists(value):
+                paths.append(value)
+        return paths
+
+    @staticmethod
+    def _from_dict(artifact_class, artifact_dict:dict):
+        values = {}
+        for field in fields(artifact_class):
+            value = artifact_dict[field.name]
+            if is_dataclass(field.type) and isinstance(value, dict):
+                value = StageCache._from_dict(field.type, value)
+            values[field.name] = value
+        return artifact_class(**values)
+
+    def get_artifact(self, stage:str, fingerprint:str):
+        """
+        return: artifact recorded for the fingerprint, None if there is none or its files are gone
+        """
+        try:
+            entry_file_path = self.get_entry_file_path(stage, fingerprint)
+            if not os.path.exists(entry_file_path):
+                return None
+            entry = read_yaml_file(entry_file_path)
+            missing_paths = [path for path in entry["paths"] if not os.path.exists(path)]
+            if len(missing_paths) > 0:
+                logging.info("Cached %s artifact is incomplete, missing %s", stage, tuple(missing_paths))
+                return None
+            artifact_class = getattr(artifact_entity, entry["artifact_type"])
+            return self._from_dict(artifact_class, entry["artifact"])
+        except Exception as e:
+            raise SensorException(e, sys)
+
+    def save_artifact(self, stage:str, fingerprint:str, artifact):
+        try:
+            # plain python values only, metrics are numpy scalars
+            artifact_dict = json.loads(json.dumps(asdict(artifact), default=float))
+            entry = {
+                "artifact_type": type(artifact).__name__,
+                "artifact": artifact_dict,
+                "paths": self.get_artifact_paths(artifact_dict),
+                "created_at": datetime.now().isoformat(),
+            }
+            entry_file_path = self.get_entry_file_path(stage, fingerprint)
+            tmp_file_path = f"{entry_file_path}.tmp"
+            write_yaml_file(tmp_file_path, entry)
+            os.replace(tmp_file_path, entry_file_path)
+        except Exception as e:
+            raise SensorException(e, sys)
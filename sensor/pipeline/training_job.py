@@ -0,0 +1,205 @@
+import multiprocessing
+import os, sys
+import threading
+import uuid
+from datetime import datetime
+
+import yaml
+
+from sensor.cloud_storage.upload_queue import upload_queue
+from sensor.constant.training_pipeline import TRAINING_JOB_DIR, TRAINING_JOB_LOCK_FILE_NAME
+from sensor.exception import SensorException
+from sensor.logger import logging, run_id_var
+from sensor.pipeline.training_pipeline import TrainPipeline
+from sensor.utils.main_utils import read_yaml_file
+
+
+class TrainingLock:
+    """
+    Lock file shared by every process on the host. The file holds the id of the
+    job owning it and the pid of the process running that job, so that the lock
+    of a worker which died without releasing it can be reclaimed.
+    """
+    def __init__(self, job_dir:str=TRAINING_JOB_DIR):
+        self.lock_file_path = os.path.join(job_dir, TRAINING_JOB_LOCK_FILE_NAME)
+        os.makedirs(job_dir, exist_ok=True)
+
+    def acquire(self, job_id:str)->bool:
+        try:
+            for _ in range(2):
+                try:
+                    fd = os.open(self.lock_file_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                except FileExistsError:
+                    if self._is_stale():
+                        logging.info("Removing stale training lock %s", self.lock_file_path)
+                        self.release()
+                        continue
+                    return False
+                with os.fdopen(fd, "w") as lock_file:
+                    yaml.dump({"job_id": job_id, "pid": os.getpid()}, lock_file)
+                return True
+            return False
+        except Exception as e:
+            raise SensorException(e,sys)
+
+    def set_owner_pid(self, job_id:str, pid:int)->bool:
+        """
+        Hand the lock of the job over to the process running it. The file is opened without
+        creating it, so a lock already released by a worker which failed fast is not recreated.
+        return: False if the job does not hold the lock anymore
+        """
+        try:
+            with open(self.lock_file_path, "r+") as lock_file:
+                if (yaml.safe_load(lock_file) or {}).get("job_id") != job_id:
+                    return False
+                lock_file.seek(0)
+                lock_file.truncate()
+                yaml.dump({"job_id": job_id, "pid": pid}, lock_file)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def get_owner(self)->dict:
+        try:
+            with open(self.lock_file_path) as lock_file:
+                return yaml.safe_load(lock_file) or {}
+        except FileNotFoundError:
+            return {}
+
+    def _is_stale(self)->bool:
+        pid = self.get_owner().get("pid")
+        if pid is None:
+            return False
+        # a finished worker of this process stays a zombie, and answers os.kill, until it is reaped
+        multiprocessing.active_children()
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return True
+        except PermissionError:
+            return False
+        return False
+
+    def release(self, job_id:str=None):
+        """
+        job_id: only release the lock if it is held by this job
+        """
+        try:
+            if job_id is not None and self.get_owner().get("job_id") != job_id:
+                return
+            os.remove(self.lock_file_path)
+        except FileNotFoundError:
+            pass
+
+
+class TrainingJobManager:
+    """
+    Runs the training pipeline as a background job in a separate worker process.
+    Job status and per-stage progress are kept in training_jobs/<job_id>.yaml so that
+    any process can report them.
+    """
+    def __init__(self, job_dir:str=TRAINING_JOB_DIR):
+        self.job_dir = job_dir
+        # stages running concurrently report their progress from several threads
+        self._status_lock = threading.Lock()
+        self._workers = {}
+        os.makedirs(self.job_dir, exist_ok=True)
+
+    def get_status_file_path(self, job_id:str)->str:
+        return os.path.join(self.job_dir, f"{job_id}.yaml")
+
+    def write_status(self, job_id:str, **status):
+        """
+        Update the job status file. The file is replaced atomically so readers never see a partial file
+        """
+        with self._status_lock:
+            file_path = self.get_status_file_path(job_id)
+            job_status = self.get_status(job_id) or {"job_id": job_id, "stages": {}}
+            job_status.update(status)
+            tmp_file_path = f"{file_path}.{os.getpid()}.tmp"
+            with open(tmp_file_path, "w") as status_file:
+                yaml.dump(job_status, status_file)
+            os.replace(tmp_file_path, file_path)
+
+    def get_status(self, job_id:str)->dict:
+        try:
+            # reap finished worker processes
+            multiprocessing.active_children()
+            file_path = self.get_status_file_path(job_id)
+            if not os.path.exists(file_path):
+                return None
+            return read_yaml_file(file_path)
+        except Exception as e:
+            raise SensorException(e,sys)
+
+    def submit(self, full_refresh:bool=False)->str:
+        """
+        Start a training job in a worker process
+        full_refresh: export the whole collection instead of the documents added since the last run
+        return: job id, None if a training job is already running
+        """
+        try:
+            job_id = uuid.uuid4().hex
+            lock = TrainingLock(self.job_dir)
+            if not lock.acquire(job_id):
+                logging.info("Training job rejected, job %s is running", lock.get_owner().get('job_id'))
+                return None
+            try:
+                self.write_status(job_id, status="queued", submitted_at=datetime.now().isoformat(),
+                                  full_refresh=full_refresh)
+                worker = multiprocessing.get_context("spawn").Process(
+                    target=run_training_job, args=(job_id, self.job_dir, full_refresh), name=f"training-job-{job_id}")
+                worker.start()
+                # the worker also takes the lock over when it starts, whichever write comes first
+                lock.set_owner_pid(job_id, worker.pid)
+            except Exception:
+                lock.release(job_id)
+                raise
+            self._workers[job_id] = worker
+            logging.info("Training job %s started in process %s", job_id, worker.pid)
+            return job_id
+        except Exception as e:
+            raise SensorException(e,sys)
+
+    def wait(self, job_id:str)->dict:
+        """
+        Wait for a job submitted by this manager to finish
+        return: its final status
+        """
+        try:
+            self._workers.pop(job_id).join()
+            return self.get_status(job_id)
+        except Exception as e:
+            raise SensorException(e,sys)
+
+
+def run_training_job(job_id:str, job_dir:str=TRAINING_JOB_DIR, full_refresh:bool=False):
+    """
+    Entry point of the training worker process
+    """
+    job_manager = TrainingJobManager(job_dir)
+    lock = TrainingLock(job_dir)
+    lock.set_owner_pid(job_id, os.getpid())
+    run_id_var.set(job_id)
+    stages = {}
+
+    def on_progress(stage:str, status:str):
+        stages[stage] = status
+        job_manager.write_status(job_id, current_stage=stage, stages=dict(stages))
+
+    try:
+        job_manager.write_status(job_id, status="running", started_at=datetime.now().isoformat(), pid=os.getpid())
+        train_pipeline = TrainPipeline(progress_callback=on_progress, full_refresh=full_refresh)
+        job_manager.write_status(job_id, artifact_dir=train_pipeline.training_pipeline_config.artifact_dir)
+        try:
+            train_pipeline.run_pipeline()
+        finally:
+            job_manager.write_status(job_id, timeline=train_pipeline.timeline)
+        job_manager.write_status(job_id, status="succeeded", finished_at=datetime.now().isoformat())
+    except Exception as e:
+        logging.info("Training job %s failed: %s", job_id, e)
+        job_manager.write_status(job_id, status="failed", error=str(e), finished_at=datetime.now().isoformat())
+    finally:
+        lock.release(job_id)
+    # the process has no upload worker of its own, the artifact uploads are finished before it exits
+    upload_queue.drain()
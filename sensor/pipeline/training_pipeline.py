@@ -1,4 +1,5 @@
-import sys
+import os, sys
+from datetime import datetime
 
 from sensor.entity.config_entity import *
 from sensor.entity.artifact_entity import *
@@ -10,24 +11,68 @@ from sensor.component.model_evaluation import ModelEvaluation
 from sensor.component.model_pusher import ModelPusher
 from sensor.exception import SensorException
 from sensor.constant.s3_bucket import *
-from sensor.constant.training_pipeline import SAVED_MODEL_DIR
-from sensor.logger import logging
-from sensor.utils.s3_utils import sync_artifact_dir_to_s3, sync_saved_model_dir_to_s3
+from sensor.constant.training_pipeline import (SAVED_MODEL_DIR, DATA_INGESTION_DIR_NAME, DATA_VALIDATION_DIR_NAME,
+    DATA_TRANSFORMATION_DIR_NAME, MODEL_TRAINER_DIR_NAME, MODEL_EVALUATION_DIR_NAME, MODEL_PUSHER_DIR_NAME,
+    DATA_DRIFT_STAGE_NAME, ARTIFACT_SYNC_STAGE_NAME, TRAINING_PIPELINE_MAX_WORKERS, TRAINING_PIPELINE_REPORT_FILE_NAME)
+from sensor.logger import logging, run_id_var, LazyVars
+from sensor.pipeline.dag_executor import DAGExecutor
+from sensor.pipeline.stage_cache import StageCache
+from sensor.utils.main_utils import write_yaml_file
+from sensor.utils.s3_utils import queue_artifact_dir_to_s3, queue_saved_model_dir_to_s3
 
 
 class TrainPipeline:
     is_pipeline_running=False
 
-    def __init__(self):
-        self.training_pipeline_config = TrainingPipelineConfig()
+    def __init__(self, progress_callback=None, full_refresh:bool=False):
+        """
+        progress_callback: optional callable(stage, status) notified when a stage starts, completes or fails
+        full_refresh: export the whole collection instead of the documents added since the last run
+        """
+        self.training_pipeline_config = TrainingPipelineConfig(timestamp=datetime.now(), full_refresh=full_refresh)
+        self.progress_callback = progress_callback
+        self.stage_cache = StageCache()
+        self.timeline = []
+
+    def report_progress(self, stage:str, status:str):
+        if self.progress_callback is not None:
+            self.progress_callback(stage, status)
+
+    def run_stage(self, stage:str, stage_function, *args):
+        """
+        Run one stage of the pipeline and report its progress
+        """
+        self.report_progress(stage, "running")
+        try:
+            artifact = stage_function(*args)
+        except Exception:
+            self.report_progress(stage, "failed")
+            raise
+        self.report_progress(stage, "completed")
+        return artifact
+
+    def run_cached_stage(self, stage:str, config, input_file_paths:list, stage_function, *args):
+        """
+        Run one stage of the pipeline unless a previous run already completed it with the same
+        input files and config, in which case the artifact of that run is reused
+        """
+        fingerprint = self.stage_cache.get_fingerprint(stage, config, input_file_paths)
+        artifact = self.stage_cache.get_artifact(stage, fingerprint)
+        if artifact is not None:
+            logging.info("Reusing %s artifact of a previous run: %s", stage, artifact)
+            self.report_progress(stage, "reused")
+            return artifact
+        artifact = self.run_stage(stage, stage_function, *args)
+        self.stage_cache.save_artifact(stage, fingerprint, artifact)
+        return artifact
 
     def start_data_ingestion(self)->DataIngestionArtifact:
         try:
             self.data_ingestion_config = DataIngestionConfig(training_pipeline_config=self.training_pipeline_config)
-            logging.info(f"\nData ingestion started with config:{self.data_ingestion_config.__dict__}")
+            logging.info("\nData ingestion started with config:%s", LazyVars(self.data_ingestion_config))
             data_ingestion = DataIngestion(data_ingestion_config=self.data_ingestion_config)
             data_ingestion_artifact = data_ingestion.initiate_data_ingestion()
-            logging.info(f"Data ingestion completed and artifact: {data_ingestion_artifact}\n")
+            logging.info("Data ingestion completed and artifact: %s\n", data_ingestion_artifact)
             return data_ingestion_artifact
         except  Exception as e:
             raise  SensorException(e,sys)
@@ -35,23 +80,34 @@ class TrainPipeline:
     def start_data_validaton(self,data_ingestion_artifact:DataIngestionArtifact)->DataValidationArtifact:
         try:
             data_validation_config = DataValidationConfig(training_pipeline_config=self.training_pipeline_config)
-            logging.info(f"\nData validation started with config:{data_validation_config.__dict__}")
+            logging.info("\nData validation started with config:%s", LazyVars(data_validation_config))
             data_validation = DataValidation(data_ingestion_artifact=data_ingestion_artifact,
             data_validation_config = data_validation_config)
             data_validation_artifact = data_validation.initiate_data_validation()
-            logging.info(f"Data validation completed and artifact: {data_validation_artifact}\n")
+            logging.info("Data validation completed and artifact: %s\n", data_validation_artifact)
             return data_validation_artifact
         except  Exception as e:
             raise  SensorException(e,sys)
 
+    def start_data_drift_detection(self,data_ingestion_artifact:DataIngestionArtifact)->DataDriftArtifact:
+        try:
+            data_validation_config = DataValidationConfig(training_pipeline_config=self.training_pipeline_config)
+            data_validation = DataValidation(data_ingestion_artifact=data_ingestion_artifact,
+            data_validation_config = data_validation_config)
+            data_drift_artifact = data_validation.initiate_drift_detection()
+            logging.info("Data drift detection completed and artifact: %s\n", data_drift_artifact)
+            return data_drift_artifact
+        except  Exception as e:
+            raise  SensorException(e,sys)
+
     def start_data_transformation(self,data_validation_artifact:DataValidationArtifact)->DataTransformationArtifact:
         try:
             data_transformation_config = DataTransformationConfig(training_pipeline_config=self.training_pipeline_config)
-            logging.info(f"\nData transformation started with config:{data_transformation_config.__dict__}")
+            logging.info("\nData transformation started with config:%s", LazyVars(data_transformation_config))
             data_transformation = DataTransformation(data_validation_artifact=data_validation_artifact,
             data_transformation_config=data_transformation_config)
             data_transformation_artifact =  data_transformation.initiate_data_transformation()
-            logging.info(f"Data transformation completed and artifact: {data_transformation_artifact}\n")
+            logging.info("Data transformation completed and artifact: %s\n", data_transformation_artifact)
             return data_transformation_artifact
         except  Exception as e:
             raise  SensorException(e,sys)
@@ -59,10 +115,10 @@ class TrainPipeline:
     def start_model_trainer(self,data_transformation_artifact:DataTransformationArtifact)->ModelTrainerArtifact: 
         try:
             model_trainer_config = ModelTrainerConfig(training_pipeline_config=self.training_pipeline_config)
-            logging.info(f"\nModel Training started with config:{model_trainer_config.__dict__}")
+            logging.info("\nModel Training started with config:%s", LazyVars(model_trainer_config))
             model_trainer = ModelTrainer(model_trainer_config, data_transformation_artifact)
             model_trainer_artifact = model_trainer.initiate_model_trainer()
-            logging.info(f"Model Training completed and artifact: {model_trainer_artifact}\n")
+            logging.info("Model Training completed and artifact: %s\n", model_trainer_artifact)
             return model_trainer_artifact
         except  Exception as e:
             raise  SensorException(e,sys)
@@ -70,47 +126,107 @@ class TrainPipeline:
     def start_model_evaluation(self,data_validation_artifact:DataValidationArtifact, model_trainer_artifact:ModelTrainerArtifact) -> ModelEvaluationArtifact:
         try:
             model_eval_config = ModelEvaluationConfig(self.training_pipeline_config)
-            logging.info(f"\nModel evaluation started with config:{model_eval_config.__dict__}")
+            logging.info("\nModel evaluation started with config:%s", LazyVars(model_eval_config))
             model_eval = ModelEvaluation(model_eval_config, data_validation_artifact, model_trainer_artifact)
             model_eval_artifact = model_eval.initiate_model_evaluation()
-            logging.info(f"Model evaluation completed and artifact: {model_eval_artifact}\n")
+            logging.info("Model evaluation completed and artifact: %s\n", model_eval_artifact)
             return model_eval_artifact
         except  Exception as e:
             raise  SensorException(e,sys)
 
-    def start_model_pusher(self,model_eval_artifact:ModelEvaluationArtifact):
+    def start_model_pusher(self,model_eval_artifact:ModelEvaluationArtifact, data_validation_artifact:DataValidationArtifact):
         try:
             model_pusher_config = ModelPusherConfig(training_pipeline_config=self.training_pipeline_config)
-            logging.info(f"\nModel pusher started with config:{model_pusher_config.__dict__}")
-            model_pusher = ModelPusher(model_pusher_config, model_eval_artifact)
+            logging.info("\nModel pusher started with config:%s", LazyVars(model_pusher_config))
+            model_pusher = ModelPusher(model_pusher_config, model_eval_artifact, data_validation_artifact)
             model_pusher_artifact = model_pusher.initiate_model_pusher()
-            logging.info(f"Model pusher completed and artifact: {model_pusher_artifact}\n")
+            logging.info("Model pusher completed and artifact: %s\n", model_pusher_artifact)
             return model_pusher_artifact
         except  Exception as e:
             raise  SensorException(e,sys)
     
+    def build_pipeline(self)->DAGExecutor:
+        """
+        Training stages and the stages they take their artifacts from
+        """
+        pipeline = DAGExecutor(max_workers=TRAINING_PIPELINE_MAX_WORKERS)
+        pipeline.add_stage(DATA_INGESTION_DIR_NAME, lambda: self.run_stage(DATA_INGESTION_DIR_NAME, self.start_data_ingestion))
+        # ingestion always runs as mongo db is the source of the data, the later stages are skipped
+        # when their inputs are identical to the ones of a previous run
+        pipeline.add_stage(DATA_VALIDATION_DIR_NAME, lambda data_ingestion_artifact: self.run_cached_stage(
+            DATA_VALIDATION_DIR_NAME, DataValidationConfig(self.training_pipeline_config),
+            [data_ingestion_artifact.train_file_path, data_ingestion_artifact.test_file_path],
+            self.start_data_validaton, data_ingestion_artifact), [DATA_INGESTION_DIR_NAME])
+        pipeline.add_stage(DATA_DRIFT_STAGE_NAME, lambda data_ingestion_artifact, data_validation_artifact: self.run_cached_stage(
+            DATA_DRIFT_STAGE_NAME, DataValidationConfig(self.training_pipeline_config),
+            [data_ingestion_artifact.train_file_path, data_ingestion_artifact.test_file_path],
+            self.start_data_drift_detection, data_ingestion_artifact), [DATA_INGESTION_DIR_NAME, DATA_VALIDATION_DIR_NAME])
+        pipeline.add_stage(DATA_TRANSFORMATION_DIR_NAME, lambda data_validation_artifact: self.run_cached_stage(
+            DATA_TRANSFORMATION_DIR_NAME, DataTransformationConfig(self.training_pipeline_config),
+            [data_validation_artifact.valid_train_file_path, data_validation_artifact.valid_test_file_path],
+            self.start_data_transformation, data_validation_artifact), [DATA_VALIDATION_DIR_NAME])
+        pipeline.add_stage(MODEL_TRAINER_DIR_NAME, lambda data_transformation_artifact: self.run_cached_stage(
+            MODEL_TRAINER_DIR_NAME, ModelTrainerConfig(self.training_pipeline_config),
+            [data_transformation_artifact.transformed_train_file_path,
+             data_transformation_artifact.transformed_train_label_file_path,
+             data_transformation_artifact.transformed_test_file_path,
+             data_transformation_artifact.transformed_test_label_file_path,
+             data_transformation_artifact.transformed_object_file_path],
+            self.start_model_trainer, data_transformation_artifact), [DATA_TRANSFORMATION_DIR_NAME])
+        # the later stages get the validation artifact with the drift status, detected next to the training
+        pipeline.add_stage(MODEL_EVALUATION_DIR_NAME, lambda data_validation_artifact, data_drift_artifact, model_trainer_artifact: self.run_stage(
+            MODEL_EVALUATION_DIR_NAME, self.start_model_evaluation,
+            DataValidation.with_drift_status(data_validation_artifact, data_drift_artifact), model_trainer_artifact),
+            [DATA_VALIDATION_DIR_NAME, DATA_DRIFT_STAGE_NAME, MODEL_TRAINER_DIR_NAME])
+        # artifacts of the run so far are uploaded while the model is evaluated
+        pipeline.add_stage(ARTIFACT_SYNC_STAGE_NAME, lambda model_trainer_artifact, data_drift_artifact: self.run_stage(
+            ARTIFACT_SYNC_STAGE_NAME, self.sync_artifact_dir), [MODEL_TRAINER_DIR_NAME, DATA_DRIFT_STAGE_NAME])
+        pipeline.add_stage(MODEL_PUSHER_DIR_NAME, self.push_accepted_model,
+                           [MODEL_EVALUATION_DIR_NAME, DATA_VALIDATION_DIR_NAME, DATA_DRIFT_STAGE_NAME])
+        return pipeline
+
+    def push_accepted_model(self, model_eval_artifact:ModelEvaluationArtifact, data_validation_artifact:DataValidationArtifact,
+                            data_drift_artifact:DataDriftArtifact):
+        if not model_eval_artifact.is_model_accepted:
+            raise Exception("Trained model is not better than the best model")
+        return self.run_stage(MODEL_PUSHER_DIR_NAME, self.start_model_pusher, model_eval_artifact,
+                              DataValidation.with_drift_status(data_validation_artifact, data_drift_artifact))
+
+    def sync_artifact_dir(self):
+        logging.info("Queue sync of artifact dir to S3")
+        queue_artifact_dir_to_s3(artifact_dir = self.training_pipeline_config.artifact_dir, time_stamp = self.training_pipeline_config.timestamp)
+
+    def write_report(self, status:str):
+        """
+        Run report with the timeline of the stages, written in the artifact dir
+        """
+        try:
+            report = {"status": status, "timeline": sorted(self.timeline, key=lambda stage: stage["started_at"])}
+            write_yaml_file(os.path.join(self.training_pipeline_config.artifact_dir, TRAINING_PIPELINE_REPORT_FILE_NAME), report)
+        except  Exception as e:
+            raise  SensorException(e,sys)
+
     def run_pipeline(self):
         try:
             TrainPipeline.is_pipeline_running=True
-            logging.info(f"\nTraining pipeline started")
-            data_ingestion_artifact:DataIngestionArtifact = self.start_data_ingestion()
-            data_validation_artifact:DataValidationArtifact=self.start_data_validaton(data_ingestion_artifact=data_ingestion_artifact)
-            data_transformation_artifact = self.start_data_transformation(data_validation_artifact=data_validation_artifact)
-            model_trainer_artifact = self.start_model_trainer(data_transformation_artifact)
-            model_eval_artifact = self.start_model_evaluation(data_validation_artifact, model_trainer_artifact)
-            if not model_eval_artifact.is_model_accepted:
-                raise Exception("Trained model is not better than the best model")
-            model_pusher_artifact = self.start_model_pusher(model_eval_artifact)
+            if run_id_var.get() is None:
+                run_id_var.set(str(self.training_pipeline_config.timestamp))
+            logging.info("\nTraining pipeline started")
+            pipeline = self.build_pipeline()
+            self.timeline = pipeline.timeline
+            try:
+                pipeline.run()
+            except Exception:
+                self.write_report("failed")
+                raise
+            self.write_report("completed")
             TrainPipeline.is_pipeline_running=False
-            logging.info("Sync artifact dir to S3")
-            sync_artifact_dir_to_s3(artifact_dir = self.training_pipeline_config.artifact_dir, time_stamp = self.training_pipeline_config.timestamp)
-            logging.info("Sync saved model dir to S3")
-            sync_saved_model_dir_to_s3()
-            logging.info(f"\nTraining pipeline completed")
+            self.sync_artifact_dir()
+            logging.info("Queue sync of saved model dir to S3")
+            queue_saved_model_dir_to_s3()
+            logging.info("\nTraining pipeline completed")
         except  Exception as e:
-            logging.info(f"\nTraining pipeline interrupted due to exception")
-            logging.info("Sync artifact dir to S3")
-            sync_artifact_dir_to_s3(artifact_dir = self.training_pipeline_config.artifact_dir, time_stamp = self.training_pipeline_config.timestamp)
+            logging.info("\nTraining pipeline interrupted due to exception")
+            self.sync_artifact_dir()
             TrainPipeline.is_pipeline_running=False
             raise  SensorException(e,sys)
-
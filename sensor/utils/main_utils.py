@@ -5,6 +5,7 @@ from sensor.logger import logging
 import os,sys
 import numpy as np
 import dill
+import hashlib
 
 def read_yaml_file(file_path: str) -> dict:
     try:
@@ -42,13 +43,16 @@ def save_numpy_array_data(file_path: str, array: np.array):
         raise SensorException(e, sys) from e
 
 
-def load_numpy_array_data(file_path: str) -> np.array:
+def load_numpy_array_data(file_path: str, mmap_mode: str = None) -> np.array:
     """
     load numpy array data from file
     file_path: str location of file to load
+    mmap_mode: "r" to get a read only memory-mapped view instead of reading the file in memory
     return: np.array data loaded
     """
     try:
+        if mmap_mode is not None:
+            return np.load(file_path, mmap_mode=mmap_mode)
         with open(file_path, "rb") as file_obj:
             return np.load(file_obj)
     except Exception as e:
@@ -60,7 +64,7 @@ def save_object(file_path: str, obj: object) -> None:
         os.makedirs(os.path.dirname(file_path), exist_ok=True)
         with open(file_path, "wb") as file_obj:
             dill.dump(obj, file_obj)
-        logging.info(f"Model successfully saved at {file_path}")
+        logging.info("Model successfully saved at %s", file_path)
     except Exception as e:
         raise SensorException(e, sys) from e
 
@@ -72,4 +76,35 @@ def load_object(file_path: str, ) -> object:
         with open(file_path, "rb") as file_obj:
             return dill.load(file_obj)
     except Exception as e:
-        raise SensorException(e, sys) from e
\ No newline at end of file
+        raise SensorException(e, sys) from e
+
+def get_file_hash(file_path: str) -> str:
+    """
+    sha256 hex digest of the content of a file
+    """
+    try:
+        file_hash = hashlib.sha256()
+        with open(file_path, "rb") as file_obj:
+            for block in iter(lambda: file_obj.read(1024 * 1024), b""):
+                file_hash.update(block)
+        return file_hash.hexdigest()
+    except Exception as e:
+        raise SensorException(e, sys) from e
+
+def get_path_hash(path: str) -> str:
+    """
+    sha256 hex digest of a file, or of the relative paths and content of every file of a directory
+    """
+    try:
+        if not os.path.isdir(path):
+            return get_file_hash(path)
+        dir_hash = hashlib.sha256()
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for file_name in sorted(files):
+                file_path = os.path.join(root, file_name)
+                dir_hash.update(os.path.relpath(file_path, path).encode())
+                dir_hash.update(get_file_hash(file_path).encode())
+        return dir_hash.hexdigest()
+    except Exception as e:
+        raise SensorException(e, sys) from e
@@ -6,6 +6,7 @@ from sensor.constant.training_pipeline import SAVED_MODEL_DIR, ARTIFACT_DIR
 from sensor.constant.s3_bucket import TRAINING_BUCKET_NAME, PREDICTION_BUCKET_NAME
 from sensor.constant.prediction_pipeline import PREDICTION_OUTPUT_FOLDER
 from sensor.cloud_storage.s3_syncer import *
+from sensor.cloud_storage.upload_queue import upload_queue
 
 # Training Pipeline
 def sync_artifact_dir_to_s3(artifact_dir, time_stamp):
@@ -22,6 +23,23 @@ def sync_saved_model_dir_to_s3():
     except Exception as e:
         raise SensorException(e,sys)
 
+def queue_artifact_dir_to_s3(artifact_dir, time_stamp):
+    """
+    Upload the artifact dir in the background, return: its S3 url
+    """
+    try:
+        aws_bucket_url = f"s3://{TRAINING_BUCKET_NAME}/{ARTIFACT_DIR}/{time_stamp}"
+        return upload_queue.enqueue(folder = artifact_dir, aws_bucket_url=aws_bucket_url)
+    except Exception as e:
+        raise SensorException(e,sys)
+
+def queue_saved_model_dir_to_s3():
+    try:
+        aws_bucket_url = f"s3://{TRAINING_BUCKET_NAME}/{SAVED_MODEL_DIR}"
+        return upload_queue.enqueue(folder = SAVED_MODEL_DIR, aws_bucket_url=aws_bucket_url)
+    except Exception as e:
+        raise SensorException(e,sys)
+
 # Prediction Pipeline
 def sync_saved_model_dir_from_s3():
         try:
@@ -33,7 +51,7 @@ def sync_saved_model_dir_from_s3():
 def sync_artifact_dir_from_s3():
         try:
             aws_bucket_url = f"s3://{TRAINING_BUCKET_NAME}/{ARTIFACT_DIR}"
-            sync_folder_from_s3(folder = SAVED_MODEL_DIR,aws_bucket_url=aws_bucket_url)
+            sync_folder_from_s3(folder = ARTIFACT_DIR,aws_bucket_url=aws_bucket_url)
         except Exception as e:
             raise SensorException(e,sys)
 
@@ -44,6 +62,16 @@ def sync_prediction_artifact_dir_to_s3(prediction_artifact_dir, time_stamp):
         except Exception as e:
             raise SensorException(e,sys)
 
+def queue_prediction_artifact_dir_to_s3(prediction_artifact_dir, time_stamp):
+    """
+    Upload the prediction artifact dir in the background, return: its S3 url
+    """
+    try:
+        aws_bucket_url = f"s3://{PREDICTION_BUCKET_NAME}/{ARTIFACT_DIR}/{time_stamp}"
+        return upload_queue.enqueue(folder = prediction_artifact_dir, aws_bucket_url=aws_bucket_url)
+    except Exception as e:
+        raise SensorException(e,sys)
+
 def get_predicted_s3_filepath(time_stamp, file_name):
     try:
             aws_bucket_url = f"s3://{PREDICTION_BUCKET_NAME}/{ARTIFACT_DIR}/{time_stamp}/{PREDICTION_OUTPUT_FOLDER}/{file_name}"
@@ -0,0 +1,48 @@
+import time
+
+import numpy as np
+import pytest
+
+pytest.importorskip("xgboost")
+pytest.importorskip("sklearn")
+
+from sensor.ml.model.hyperparameter_search import SuccessiveHalvingSearch
+
+
+@pytest.fixture
+def train_files(tmp_path):
+    rng = np.random.default_rng(0)
+    x = rng.normal(size=(400, 5)).astype(np.float32)
+    y = (x[:, 0] + rng.normal(scale=0.5, size=400) > 0).astype(np.int8)
+    train_file_path, train_label_file_path = str(tmp_path / "train.npy"), str(tmp_path / "train_labels.npy")
+    np.save(train_file_path, x)
+    np.save(train_label_file_path, y)
+    return train_file_path, train_label_file_path, np.arange(300), np.arange(300, 400)
+
+
+def get_search(time_budget_seconds):
+    return SuccessiveHalvingSearch({"max_depth": [2, 3, 4], "learning_rate": [0.1, 0.3]}, n_configs=9,
+                                   min_estimators=5, max_estimators=45, eta=3, n_threads=1, n_workers=2,
+                                   time_budget_seconds=time_budget_seconds, random_state=0)
+
+
+def test_search_returns_best_trial(train_files):
+    search = get_search(time_budget_seconds=None)
+    best_trial = search.search(*train_files)
+    assert best_trial is not None
+    assert best_trial["valid_logloss"] == min(trial["valid_logloss"] for trial in search.leaderboard
+                                              if trial["rung"] == best_trial["rung"])
+
+
+def test_search_stops_within_time_budget(train_files):
+    search = get_search(time_budget_seconds=0.5)
+    start = time.monotonic()
+    search.search(*train_files)
+    # spawning the workers alone takes a while, the search must not wait for the trials left running
+    assert time.monotonic() - start < 30
+
+
+def test_search_without_budget_runs_no_trial(train_files):
+    search = get_search(time_budget_seconds=0)
+    assert search.search(*train_files) is None
+    assert search.leaderboard == []
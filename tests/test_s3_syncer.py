@@ -0,0 +1,156 @@
+import hashlib
+import os
+import shutil
+
+import pytest
+
+pytest.importorskip("boto3")
+
+from sensor.cloud_storage.s3_syncer import S3Sync
+
+
+class FilesystemS3Client:
+    """
+    S3 stand-in keeping the objects of bucket/key under a local directory and counting calls
+    """
+    def __init__(self, root_dir):
+        self.root_dir = root_dir
+        self.calls = {"upload_file": 0, "download_file": 0, "head_object": 0, "list_objects_v2": 0}
+
+    def get_object_path(self, bucket, key):
+        return os.path.join(self.root_dir, bucket, *key.split("/"))
+
+    def get_etag(self, bucket, key):
+        with open(self.get_object_path(bucket, key), "rb") as object_file:
+            return f'"{hashlib.md5(object_file.read()).hexdigest()}"'
+
+    def put_object(self, Bucket, Key, Body):
+        object_path = self.get_object_path(Bucket, Key)
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        with open(object_path, "wb") as object_file:
+            object_file.write(Body)
+
+    def upload_file(self, Filename, Bucket, Key, Config=None):
+        self.calls["upload_file"] += 1
+        object_path = self.get_object_path(Bucket, Key)
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        shutil.copyfile(Filename, object_path)
+
+    def download_file(self, Bucket, Key, Filename, Config=None):
+        self.calls["download_file"] += 1
+        shutil.copyfile(self.get_object_path(Bucket, Key), Filename)
+
+    def head_object(self, Bucket, Key):
+        self.calls["head_object"] += 1
+        return {"ETag": self.get_etag(Bucket, Key), "ContentLength": os.path.getsize(self.get_object_path(Bucket, Key))}
+
+    def get_paginator(self, operation_name):
+        assert operation_name == "list_objects_v2"
+        client = self
+
+        class Paginator:
+            def paginate(self, Bucket, Prefix=""):
+                client.calls["list_objects_v2"] += 1
+                bucket_dir = os.path.join(client.root_dir, Bucket)
+                contents = []
+                for dir_path, _, file_names in os.walk(bucket_dir):
+                    for file_name in file_names:
+                        key = os.path.relpath(os.path.join(dir_path, file_name), bucket_dir).replace(os.sep, "/")
+                        if key.startswith(Prefix):
+                            contents.append({"Key": key, "Size": os.path.getsize(os.path.join(dir_path, file_name)),
+                                             "ETag": client.get_etag(Bucket, key)})
+                yield {"Contents": sorted(contents, key=lambda item: item["Key"])}
+
+        return Paginator()
+
+
+def write_file(file_path, content):
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, "w") as local_file:
+        local_file.write(content)
+
+
+@pytest.fixture
+def client(tmp_path):
+    return FilesystemS3Client(str(tmp_path / "s3"))
+
+
+@pytest.fixture
+def syncer(tmp_path, client):
+    return S3Sync(client=client, manifest_dir=str(tmp_path / "manifest"), max_workers=2)
+
+
+def test_upload_skips_unchanged_files(tmp_path, client, syncer):
+    folder = str(tmp_path / "artifact")
+    write_file(os.path.join(folder, "report.yaml"), "status: ok")
+    write_file(os.path.join(folder, "model", "model.pkl"), "weights")
+
+    assert syncer.sync_folder_to_s3(folder, "s3://bucket/artifact/1") == 2
+    assert client.calls["upload_file"] == 2
+    with open(client.get_object_path("bucket", "artifact/1/model/model.pkl")) as object_file:
+        assert object_file.read() == "weights"
+
+    assert syncer.sync_folder_to_s3(folder, "s3://bucket/artifact/1") == 0
+    assert client.calls["upload_file"] == 2
+    assert client.calls["list_objects_v2"] == 0
+
+    write_file(os.path.join(folder, "report.yaml"), "status: failed")
+    assert syncer.sync_folder_to_s3(folder, "s3://bucket/artifact/1") == 1
+    assert client.calls["upload_file"] == 3
+
+
+def test_download_skips_unchanged_objects(tmp_path, client, syncer):
+    client.put_object(Bucket="bucket", Key="saved_models/1/model.pkl", Body=b"v1")
+    client.put_object(Bucket="bucket", Key="saved_models/1/drift_baseline.npz", Body=b"baseline")
+    folder = str(tmp_path / "saved_models")
+
+    assert syncer.sync_folder_from_s3(folder, "s3://bucket/saved_models") == 2
+    with open(os.path.join(folder, "1", "model.pkl")) as local_file:
+        assert local_file.read() == "v1"
+
+    assert syncer.sync_folder_from_s3(folder, "s3://bucket/saved_models") == 0
+    assert client.calls["download_file"] == 2
+
+    client.put_object(Bucket="bucket", Key="saved_models/1/model.pkl", Body=b"v2")
+    client.put_object(Bucket="bucket", Key="saved_models/2/model.pkl", Body=b"new")
+    assert syncer.sync_folder_from_s3(folder, "s3://bucket/saved_models") == 2
+    with open(os.path.join(folder, "1", "model.pkl")) as local_file:
+        assert local_file.read() == "v2"
+
+
+def test_uploaded_files_are_not_downloaded_again(tmp_path, client, syncer):
+    folder = str(tmp_path / "saved_models")
+    write_file(os.path.join(folder, "1", "model.pkl"), "weights")
+
+    syncer.sync_folder_to_s3(folder, "s3://bucket/saved_models")
+    assert syncer.sync_folder_from_s3(folder, "s3://bucket/saved_models") == 0
+    assert client.calls["download_file"] == 0
+
+
+def test_unreadable_manifest_is_rebuilt(tmp_path, client, syncer):
+    folder = str(tmp_path / "artifact")
+    write_file(os.path.join(folder, "report.yaml"), "status: ok")
+    manifest_file_path = syncer.get_manifest_file_path(folder, "s3://bucket/artifact")
+    write_file(manifest_file_path, "{not json")
+
+    assert syncer.sync_folder_to_s3(folder, "s3://bucket/artifact") == 1
+    assert syncer.sync_folder_to_s3(folder, "s3://bucket/artifact") == 0
+
+
+def test_failed_transfers_are_raised_after_recording_the_others(tmp_path, client, syncer):
+    folder = str(tmp_path / "artifact")
+    write_file(os.path.join(folder, "good.yaml"), "ok")
+    write_file(os.path.join(folder, "bad.yaml"), "ko")
+    upload_file = client.upload_file
+
+    def failing_upload_file(Filename, Bucket, Key, Config=None):
+        if Key.endswith("bad.yaml"):
+            raise OSError("connection reset")
+        upload_file(Filename, Bucket, Key, Config)
+
+    client.upload_file = failing_upload_file
+    with pytest.raises(Exception, match="bad.yaml"):
+        syncer.sync_folder_to_s3(folder, "s3://bucket/artifact")
+
+    client.upload_file = upload_file
+    assert syncer.sync_folder_to_s3(folder, "s3://bucket/artifact") == 1
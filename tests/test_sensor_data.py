@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("pandas")
+pytest.importorskip("pymongo")
+
+from sensor.data_access.sensor_data import SensorData
+
+SCHEMA_CONFIG = {
+    "columns": [{"class": "category"}, {"aa_000": "int"}, {"ab_000": "float"}],
+    "drop_columns": ["ab_000"],
+}
+
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def sort(self, key, direction):
+        return FakeCursor(sorted(self.documents, key=lambda document: document[key], reverse=direction < 0))
+
+    def __iter__(self):
+        return iter(self.documents)
+
+
+class FakeCollection:
+    """
+    Collection stand-in serving the documents of a list, with the projection applied
+    """
+    def __init__(self, documents):
+        self.documents = documents
+
+    def count_documents(self, query):
+        return len(self.documents)
+
+    def estimated_document_count(self):
+        return len(self.documents)
+
+    def find(self, query, projection, batch_size=None):
+        excluded = [name for name, value in projection.items() if value == 0]
+        return FakeCursor([{name: value for name, value in document.items() if name not in excluded}
+                           for document in self.documents])
+
+
+def get_sensor_data(documents):
+    sensor_data = SensorData.__new__(SensorData)
+    sensor_data._schema_config = SCHEMA_CONFIG
+    sensor_data.get_collection = lambda collection_name, database_name=None: FakeCollection(documents)
+    return sensor_data
+
+
+def test_non_numeric_values_are_read_as_nan():
+    documents = [
+        {"_id": 1, "class": "neg", "aa_000": 10, "ab_000": 1},
+        {"_id": 2, "class": "pos", "aa_000": "na", "ab_000": 1},
+        {"_id": 3, "class": "neg", "aa_000": "n/a", "ab_000": 1},
+        {"_id": 4, "class": "neg", "aa_000": "12.5", "ab_000": 1},
+        {"_id": 5, "class": "pos", "ab_000": 1},
+    ]
+    dataframe = get_sensor_data(documents).export_collection_as_dataframe("sensor", batch_size=2, sort_by_id=True)
+
+    assert list(dataframe.columns) == ["class", "aa_000"]
+    assert dataframe["class"].tolist() == ["neg", "pos", "neg", "neg", "pos"]
+    assert dataframe["aa_000"].dtype == np.float64
+    np.testing.assert_array_equal(dataframe["aa_000"].to_numpy(), [10.0, np.nan, np.nan, 12.5, np.nan])
+
+
+def test_fields_missing_from_the_schema_are_kept():
+    documents = [{"_id": 1, "class": "neg", "aa_000": 1}, {"_id": 2, "class": "pos", "aa_000": 2, "extra": "x"}]
+    dataframe = get_sensor_data(documents).export_collection_as_dataframe("sensor", batch_size=1)
+
+    assert list(dataframe.columns) == ["class", "aa_000", "extra"]
+    assert dataframe["extra"].isna().tolist() == [True, False]